@@ -61,7 +61,8 @@ if __name__ == "__main__":
     model.inputs_from_df(inp)
     model.parameters_from_df(true_par)
     model.specify_outputs(['y'])
-    ideal = model.simulate(com_points=inp.index.size - 1)
+    model.set_output_grid(inp.index.values)
+    ideal = model.simulate()
     # ideal.to_csv(os.path.join('examples', 'lin', 'resources', 'ideal.csv'))
 
     # Grid search ==============================================
@@ -89,7 +90,7 @@ if __name__ == "__main__":
             par['b'] = bi
 
             model.parameters_from_df(par)
-            yi = model.simulate(com_points=inp.index.size - 1)
+            yi = model.simulate()
             yi['ideal'] = ideal['y']
             rmse.loc[ai, bi] = ((yi['ideal'] - yi['y']) ** 2).mean()
 
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import hashlib
+import json
+import io
+import os
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+class EvalCache(object):
+    """
+    LRU cache of evaluations (simulation result and error)
+    keyed by quantized parameter vectors.
+
+    A single instance can be shared by all estimation methods
+    working on the same data (inputs, ideal solution,
+    known parameters and cost function), e.g. GA and PS
+    in one learning period.
+
+    Optionally, evaluations are also saved in a persistent
+    ``DiskCache`` (``store``), under a ``context`` identifying
+    the data (see ``get_context()``). Evaluations missing
+    in memory are then looked up on disk.
+    """
+
+    def __init__(self, max_size=100., precision=10, store=None,
+                 context=None):
+        """
+        :param float max_size: Memory bound in MB (results and errors),
+                               0 disables the in-memory cache
+        :param int precision: Number of significant digits used
+                              to quantize parameters
+        :param DiskCache store: Persistent cache, optional
+        :param str context: Data digest used as the namespace
+                            in ``store`` (required if ``store`` is given)
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.max_bytes = int(max_size * 1024 ** 2)
+        self.precision = int(precision)
+
+        self.entries = OrderedDict()  # key -> (result, error, nbytes)
+        self.nbytes = 0
+
+        # Persistent cache
+        assert store is None or context is not None, \
+            'Context is required to use the persistent cache'
+        self.store = store
+        self.context = context
+
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0  # Included in hits
+        self.misses = 0
+
+    def key(self, names, values):
+        """
+        Returns cache key for the parameter vector.
+        Parameter order does not matter.
+
+        :param names: sequence of strings, parameter names
+        :param values: sequence of floats, parameter values
+        :return: tuple
+        """
+        fmt = '{:.' + str(self.precision) + 'g}'
+        return tuple(sorted(
+            (n, float(fmt.format(v))) for n, v in zip(names, values)
+        ))
+
+    def get(self, names, values):
+        """
+        Returns cached ``(result, error)`` or ``None``.
+        The error dictionary is a copy. The result must
+        not be modified by the caller.
+
+        :param names: sequence of strings, parameter names
+        :param values: sequence of floats, parameter values
+        :return: tuple(DataFrame, dict) or None
+        """
+        key = self.key(names, values)
+        entry = self.entries.pop(key, None)
+
+        if entry is not None:
+            # Reinsert as the most recently used entry
+            # (OrderedDict.move_to_end() is not available in Python 2)
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0], dict(entry[1])
+
+        if self.store is not None:
+            stored = self.store.get(self.context, key)
+            if stored is not None:
+                result, error = stored
+                self._add(key, result, error)
+                self.hits += 1
+                self.disk_hits += 1
+                return result, dict(error)
+
+        self.misses += 1
+        return None
+
+    def put(self, names, values, result, error):
+        """
+        Saves evaluation in the cache. The least recently used
+        entries are evicted if the memory bound is exceeded.
+
+        :param names: sequence of strings, parameter names
+        :param values: sequence of floats, parameter values
+        :param result: DataFrame, simulation result
+        :param error: dict, error returned by ``calc_err()``
+        :return: None
+        """
+        key = self.key(names, values)
+        self._add(key, result, error)
+        if self.store is not None:
+            self.store.put(self.context, key, result, error)
+
+    def _add(self, key, result, error):
+        """
+        Adds entry to the in-memory LRU cache.
+        """
+        if self.max_bytes <= 0:
+            return
+
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[2]
+
+        nbytes = EvalCache._get_nbytes(result, error)
+        self.entries[key] = (result, dict(error), nbytes)
+        self.nbytes += nbytes
+
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.nbytes -= evicted
+
+    def clear(self):
+        """
+        Removes all entries (counters are kept).
+
+        :return: None
+        """
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+    def get_stats(self):
+        """
+        Returns cache statistics.
+
+        :return: dict with keys 'hits', 'disk_hits', 'misses', 'entries',
+                 'size_mb'
+        """
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'size_mb': self.nbytes / 1024. ** 2
+        }
+
+    @staticmethod
+    def _get_nbytes(result, error):
+        nbytes = 64 * (len(error) + 1)  # Rough overhead of dict and key
+        if result is not None:
+            nbytes += int(result.memory_usage(index=True).sum())
+        return nbytes
+
+    def __str__(self):
+        stats = self.get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total > 0 else 0.
+        return 'EvalCache (hits={} ({} from disk), misses={}, ' \
+               'hit ratio={:.1%}, entries={}, size={:.2f} MB)'.format(
+                   stats['hits'], stats['disk_hits'], stats['misses'],
+                   ratio, stats['entries'], stats['size_mb'])
+
+
+class DiskCache(object):
+    """
+    Persistent evaluation cache stored in a SQLite database.
+
+    Evaluations are saved under a ``context`` (digest of the FMU,
+    data and options, see ``get_context()``) and a parameter key
+    (``EvalCache.key()``). The database works in the WAL mode,
+    so it can be read and written by many processes at the same time.
+    Each process opens its own connection.
+    """
+
+    def __init__(self, path, store_results=True, timeout=60.):
+        """
+        :param str path: Path to the database file (created if missing)
+        :param bool store_results: If True, simulation results are saved
+                                   along with errors. Otherwise, results
+                                   of evaluations loaded from disk are None.
+        :param float timeout: Seconds to wait for a locked database
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.path = path
+        self.store_results = store_results
+        self.timeout = timeout
+
+        self.conn = None
+        self.pid = None
+
+        # Create table
+        self._connect()
+
+    def get(self, context, key):
+        """
+        Returns ``(result, error)`` or None if not found.
+
+        :param str context: Data digest
+        :param tuple key: Parameter key
+        :return: tuple(DataFrame or None, dict) or None
+        """
+        row = self._connect().execute(
+            'SELECT error, result FROM evals WHERE context=? AND key=?',
+            (context, DiskCache._key_2_str(key))).fetchone()
+        if row is None:
+            return None
+        error = json.loads(row[0])
+        result = DiskCache._bytes_2_df(row[1]) if row[1] is not None \
+            else None
+        return result, error
+
+    def put(self, context, key, result, error):
+        """
+        Saves evaluation.
+
+        :param str context: Data digest
+        :param tuple key: Parameter key
+        :param DataFrame result: Simulation result
+        :param dict error: Error returned by ``calc_err()``
+        :return: None
+        """
+        blob = None
+        if self.store_results and result is not None:
+            blob = sqlite3.Binary(DiskCache._df_2_bytes(result))
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO evals (context, key, error, result) '
+                'VALUES (?, ?, ?, ?)',
+                (context, DiskCache._key_2_str(key),
+                 json.dumps({k: float(v) for k, v in error.items()}), blob))
+
+    def close(self):
+        if self.conn is not None and self.pid == os.getpid():
+            self.conn.close()
+        self.conn = None
+        self.pid = None
+
+    def _connect(self):
+        """
+        Returns connection opened in the current process.
+        """
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, timeout=self.timeout)
+            self.pid = os.getpid()
+            with self.conn:
+                self.conn.execute('PRAGMA journal_mode=WAL')
+                self.conn.execute(
+                    'CREATE TABLE IF NOT EXISTS evals ('
+                    'context TEXT NOT NULL, key TEXT NOT NULL, '
+                    'error TEXT NOT NULL, result BLOB, '
+                    'PRIMARY KEY (context, key))')
+        return self.conn
+
+    def __getstate__(self):
+        # Connections are not shared between processes
+        state = self.__dict__.copy()
+        state['conn'] = None
+        state['pid'] = None
+        return state
+
+    @staticmethod
+    def _key_2_str(key):
+        return json.dumps(key)
+
+    @staticmethod
+    def _df_2_bytes(df):
+        buf = io.BytesIO()
+        np.savez(buf, index=df.index.values.astype(np.float64),
+                 values=df.values.astype(np.float64),
+                 columns=np.array([str(c) for c in df.columns]),
+                 index_name=np.array([str(df.index.name)]))
+        return buf.getvalue()
+
+    @staticmethod
+    def _bytes_2_df(blob):
+        data = np.load(io.BytesIO(blob), allow_pickle=False)
+        df = pd.DataFrame(data['values'], columns=list(data['columns']),
+                          index=data['index'])
+        df.index.name = str(data['index_name'][0])
+        return df
+
+
+def get_context(fmu_path, inp, ideal, known, fmi_opts=None, ftype='RMSE'):
+    """
+    Returns a digest identifying evaluations of the FMU on the given data.
+    Used as the namespace in ``DiskCache``.
+
+    :param str fmu_path: Path to the FMU
+    :param DataFrame inp: Inputs
+    :param DataFrame ideal: Ideal solution
+    :param dict known: Known parameters
+    :param dict fmi_opts: FMI options
+    :param str ftype: Cost function type
+    :return: str
+    """
+    h = hashlib.sha1()
+    h.update(_file_digest(fmu_path).encode())
+    for df in (inp, ideal):
+        h.update(json.dumps([str(c) for c in df.columns]).encode())
+        h.update(np.ascontiguousarray(df.index.values,
+                                      dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(df.values, dtype=np.float64).tobytes())
+    h.update(json.dumps({k: float(v) for k, v in known.items()},
+                        sort_keys=True).encode())
+    h.update(json.dumps(fmi_opts, sort_keys=True, default=str).encode())
+    h.update(str(ftype).encode())
+    return h.hexdigest()
+
+
+# File digests (path, size, mtime) -> sha1
+_FILE_DIGESTS = dict()
+
+
+def _file_digest(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if key not in _FILE_DIGESTS:
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 ** 2), b''):
+                h.update(chunk)
+        _FILE_DIGESTS[key] = h.hexdigest()
+    return _FILE_DIGESTS[key]
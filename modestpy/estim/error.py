@@ -12,7 +12,6 @@ from __future__ import division
 from __future__ import print_function
 
 import logging
-import pandas as pd
 import numpy as np
 
 
@@ -29,79 +28,429 @@ def calc_err(result, ideal, forgetting=False, ftype='RMSE'):
     since UKF needs some time to converge and the path it takes
     to converge should not be taken into account.
 
+    Use ``ErrorContext`` directly to evaluate many results
+    against the same ``ideal``.
+
     :param result: DataFrame
     :param ideal: DataFrame
     :param forgetting: bool, if True, the older the error the lower weight
     :param string ftype: Cost function type, currently 'RMSE' or 'NRMSE'
     :return: dictionary
     """
-    logger = logging.getLogger("error")
+    return ErrorContext(ideal, forgetting=forgetting, ftype=ftype).calc(result)
+
+
+def calc_err_batch(values, time, ideal, forgetting=False, ftype='RMSE'):
+    """
+    Returns errors of many simulation results given as a 3D array
+    ``[n_candidates, n_times, n_outputs]`` (outputs ordered as
+    the columns of ``ideal``, times given by ``time``).
 
-    for v in ideal.columns:
-        assert v in result.columns, \
-            'Columns in ideal and model solution not matching: {} vs. {}' \
-            .format(ideal.columns, result.columns)
+    :param values: 3D numpy array
+    :param time: 1D numpy array, result time stamps
+    :param ideal: DataFrame
+    :param forgetting: bool, if True, the older the error the lower weight
+    :param string ftype: Cost function type, currently 'RMSE' or 'NRMSE'
+    :return: tuple(1D numpy array [n_candidates] with total errors,
+             2D numpy array [n_candidates, n_outputs] with partial errors)
+    """
+    ctx = ErrorContext(ideal, forgetting=forgetting, ftype=ftype)
+    return ctx.calc_batch(values, time)
 
-    # Get original variable names
-    variables = list(ideal.columns)
 
-    # Rename columns
-    ideal = ideal.rename(columns=lambda x: x + '_ideal')
-    result = result.rename(columns=lambda x: x + '_model')
+def _interp_index(positions, size):
+    """
+    Returns interpolation indices (lower and upper item
+    of ``positions``) and fractions for rows ``0 ... size - 1``,
+    linear in the row number (rows outside ``positions``
+    get the first or the last item).
 
-    # Concatenate and interpolate
-    comp = pd.concat([ideal, result], sort=False)
-    comp = comp.sort_index().interpolate().bfill()
+    :param positions: 1D int array, sorted row numbers with values
+    :param int size: Number of rows
+    :return: tuple(1D int array, 1D int array, 1D float array)
+    """
+    if positions.size < 2:
+        # Constant
+        zeros = np.zeros(size, dtype=int)
+        return zeros, zeros, np.zeros(size)
+    rows = np.arange(size)
+    lower = np.searchsorted(positions, rows, side='right') - 1
+    lower = np.clip(lower, 0, positions.size - 2)
+    upper = lower + 1
+    frac = (rows - positions[lower]) / (positions[upper] - positions[lower])
+    return lower, upper, np.clip(frac, 0., 1.)
 
-    if forgetting:
-        forget_weights = np.linspace(0., 1., len(comp.index))
-    else:
-        forget_weights = None
 
-    # Calculate error
-    error = dict()
-    for v in variables:
-        comp[v + '_se'] = np.square(comp[v + '_ideal'] - comp[v + '_model'])
+class ErrorContext(object):
+    """
+    Data precomputed for a given ideal solution, used to calculate
+    errors of many simulation results (see ``calc_err()``).
 
-        if forgetting:
-            # Cost function multiplied by a linear function
-            # (0 for the oldest timestep, 1 for the newest)
-            comp[v + '_se'] = comp[v + '_se'] * forget_weights
+    The ideal and result rows are merged and sorted by time
+    (rows with equal time stamps in the order of ``numpy.argsort()``,
+    as ``DataFrame.sort_index()`` does), the missing ideal
+    and result values of each row are interpolated linearly
+    in the row number and the squared errors are averaged over
+    all rows. The merge with the last result grid (row indices,
+    interpolation fractions, ideal values, forgetting weights
+    and normalization factors) is cached, so each evaluation
+    is a single vectorized pass.
+    """
 
-        mse = comp[v + '_se'].mean()  # Mean square error
-        rmse = mse ** 0.5  # Root mean square error
+    FTYPES = ('RMSE', 'NRMSE')
 
-        ideal_mean = comp[v + '_ideal'].abs().mean()
+    def __init__(self, ideal, forgetting=False, ftype='RMSE'):
+        """
+        :param ideal: DataFrame, ideal solution (index = time)
+        :param forgetting: bool, if True, the older the error
+                           the lower weight
+        :param string ftype: Cost function type, 'RMSE' or 'NRMSE'
+        """
+        self.logger = logging.getLogger(type(self).__name__)
 
-        if ideal_mean != 0.:
-            nrmse = rmse / ideal_mean  # Normalized root mean square error
-        else:
-            msg = "Ideal solution for variable '{}' is null, " \
-                  "so the error cannot be normalized.".format(v)
-            logger.error(msg)
-            raise ZeroDivisionError(msg)
-
-        # Choose error function type
-        if ftype == 'NRMSE':
-            error[v] = nrmse
-        elif ftype == 'RMSE':
-            error[v] = rmse
-        else:
+        if ftype not in ErrorContext.FTYPES:
             raise ValueError('Cost function type unknown: {}'.format(ftype))
 
-        logger.debug('Calculated partial error ({}) = {}'
-                     .format(ftype, error[v]))
+        self.variables = list(ideal.columns)
+        assert 'tot' not in self.variables, \
+            "'tot' is not an allowed name for output variables..."
+
+        self.ftype = ftype
+        self.forgetting = forgetting
+        self.time = np.asarray(ideal.index.values, dtype=np.float64)
+        self.ideal = np.asarray(ideal[self.variables].values,
+                                dtype=np.float64)
+
+        for v, mean in zip(self.variables, np.abs(self.ideal).mean(axis=0)):
+            if mean == 0.:
+                msg = "Ideal solution for variable '{}' is null, " \
+                      "so the error cannot be normalized.".format(v)
+                self.logger.error(msg)
+                raise ZeroDivisionError(msg)
+
+        # Merge with the last result grid
+        self.merge_grid = None
+        self.merge = None
+
+    def calc(self, result):
+        """
+        Returns a dictionary with errors of each variable
+        and the total error (key 'tot').
+
+        :param result: DataFrame, simulation result (index = time)
+        :return: dict
+        """
+        for v in self.variables:
+            assert v in result.columns, \
+                'Columns in ideal and model solution not matching: ' \
+                '{} vs. {}'.format(self.variables, list(result.columns))
+
+        values = np.asarray(result[self.variables].values, dtype=np.float64)
+        time = np.asarray(result.index.values, dtype=np.float64)
+        _, partial = self.calc_batch(values[np.newaxis], time)
+        error = self.get_error_dicts(partial)[0]
+
+        self.logger.debug('Calculated total error ({}) = {}'
+                          .format(self.ftype, error['tot']))
+        return error
+
+    def calc_array(self, values):
+        """
+        Returns a dictionary with errors for the model outputs given
+        at the ideal time stamps (2D array [n_times, n_variables],
+        columns ordered as ``variables``).
+
+        :param values: 2D numpy array
+        :return: dict
+        """
+        _, partial = self.calc_batch(values[np.newaxis])
+        return self.get_error_dicts(partial)[0]
+
+    def calc_batch(self, values, time=None):
+        """
+        Returns errors of many simulation results in one vectorized
+        pass. The results are given as a 3D array
+        ``[n_candidates, n_times, n_variables]`` (columns ordered
+        as ``variables``), at ``time`` (default: ideal time stamps).
+
+        :param values: 3D numpy array
+        :param time: 1D numpy array, result time stamps, optional
+        :return: tuple(1D numpy array [n_candidates] with total errors,
+                 2D numpy array [n_candidates, n_variables]
+                 with partial errors)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if time is None:
+            time = self.time
+        time = np.asarray(time, dtype=np.float64)
+        assert values.ndim == 3 and values.shape[1] == time.size and \
+            values.shape[2] == len(self.variables), \
+            'Result shape {} not matching [n_candidates, {}, {}]' \
+            .format(values.shape, time.size, len(self.variables))
+
+        (lower, upper, frac), ideal, weights, scale = self.get_merge(time)
+
+        # Square error [n_candidates, n_variables, n_rows], row axis
+        # contiguous, so that the rounding of the sum does not depend
+        # on the number of candidates
+        values = values.transpose(0, 2, 1)
+        se = np.take(values, lower, axis=2)
+        se *= 1. - frac
+        se += np.take(values, upper, axis=2) * frac
+        se -= ideal
+        np.square(se, out=se)
+        if weights is not None:
+            se *= weights
+        partial = np.sqrt(se.mean(axis=2)) / scale
+        return partial.sum(axis=1), partial
+
+    def get_error_dicts(self, partial):
+        """
+        Converts partial errors returned by ``calc_batch()``
+        to dictionaries (as returned by ``calc()``).
+
+        :param partial: 2D numpy array [n_candidates, n_variables]
+        :return: list of dicts
+        """
+        errors = list()
+        for row in partial:
+            error = dict(zip(self.variables, row.tolist()))
+            error['tot'] = float(row.sum())
+            errors.append(error)
+        return errors
+
+    def get_merge(self, time):
+        """
+        Returns the rows of the ideal grid merged with the result
+        grid ``time`` (see the class description). The last merge
+        is reused if ``time`` does not change.
+
+        :param time: 1D numpy array, result time stamps (sorted)
+        :return: tuple(interpolation index of the result values
+                 (lower result row, upper result row, fraction),
+                 2D numpy array [n_variables, n_rows] with ideal values,
+                 1D numpy array [n_rows] with forgetting weights
+                 or None, 1D numpy array [n_variables] with
+                 normalization factors)
+        """
+        if self.merge_grid is not None and \
+                time.size == self.merge_grid.size and \
+                np.array_equal(time, self.merge_grid):
+            return self.merge
 
-    # Calculate total error (sum of partial errors)
-    assert 'tot' not in error, "'tot' is not an allowed name " \
-                               "for output variables..."
-    error['tot'] = 0
-    for v in variables:
-        error['tot'] += error[v]
+        n = self.time.size
+        order = np.argsort(np.concatenate([self.time, time]))
+        size = order.size
+        from_result = order >= n
 
-    logger.debug('Calculated total error ({}) = {}'.format(ftype,
-                                                           error['tot']))
+        # Ideal values of all rows
+        ideal_rows = order[~from_result]
+        lower, upper, frac = _interp_index(np.flatnonzero(~from_result),
+                                           size)
+        frac = frac[:, np.newaxis]
+        ideal = self.ideal[ideal_rows[lower]] * (1. - frac) + \
+            self.ideal[ideal_rows[upper]] * frac
 
-    return error
+        # Interpolation index of the result values
+        result_rows = order[from_result] - n
+        lower, upper, frac = _interp_index(np.flatnonzero(from_result),
+                                           size)
+        index = (result_rows[lower], result_rows[upper], frac)
 
+        # Forgetting weights (0 for the oldest row, 1 for the newest)
+        weights = None
+        if self.forgetting:
+            weights = np.linspace(0., 1., size)
+
+        # Normalization factors
+        scale = np.ones(len(self.variables))
+        if self.ftype == 'NRMSE':
+            scale = np.abs(ideal).mean(axis=0)
+
+        self.merge_grid = time.copy()
+        self.merge = (index, ideal.T.copy(), weights, scale)
+        return self.merge
+
+    def get_monitor(self, threshold, chunk=None):
+        """
+        Returns ``ErrorMonitor`` aborting simulations whose
+        total error is certainly higher than ``threshold``.
+
+        :param float threshold: Error threshold
+        :param int chunk: Number of result samples between checks,
+                          default ``ErrorMonitor.CHECKS`` checks
+                          per simulation
+        :return: ErrorMonitor
+        """
+        return ErrorMonitor(self, threshold, chunk)
+
+    def get_prefix_monitor(self, fraction):
+        """
+        Returns ``ErrorMonitor`` stopping simulations after
+        ``fraction`` of the ideal time span (the prefix error
+        is returned by ``ErrorMonitor.get_prefix_error()``).
+
+        :param float fraction: Fraction of the time span (0-1)
+        :return: ErrorMonitor
+        """
+        assert 0. < fraction <= 1., 'fraction must be in (0, 1]'
+        start, end = self.time[0], self.time[-1]
+        return ErrorMonitor(self, horizon=start + fraction * (end - start))
+
+
+class ErrorMonitor(object):
+    """
+    Running lower bound of the error of a result being simulated,
+    used to abort simulations which are certainly worse than
+    ``threshold`` (incremental evaluation).
+
+    The monitor is called by the simulator after each output sample
+    (see ``fmi.model.Model.simulate()``). Every ``chunk`` samples
+    the squared errors of the merged rows (see ``ErrorContext``)
+    already covered by the result are accumulated. Since the remaining
+    squared errors are not negative, the error calculated from
+    the accumulated sum and the total number of rows is a lower bound
+    of the final error. The simulation is aborted when the bound
+    exceeds ``threshold``.
+
+    The error of an aborted simulation (``get_error()``) is
+    extrapolated from the simulated part. It is never lower than
+    the bound (so it is higher than ``threshold``). Such errors
+    must not be cached, callers check ``aborted``.
+
+    If ``horizon`` is given, the simulation is stopped at the first
+    output sample not earlier than ``horizon`` and the error of the
+    simulated prefix is returned by ``get_prefix_error()``
+    (low-fidelity evaluation).
+    """
+
+    # Default number of checks per simulation
+    CHECKS = 20
+
+    def __init__(self, ctx, threshold=None, chunk=None, horizon=None):
+        """
+        :param ErrorContext ctx: Error context
+        :param float threshold: Error threshold, optional
+        :param int chunk: Number of result samples between checks,
+                          if None, ``CHECKS`` checks per simulation
+        :param float horizon: Time at which the simulation is stopped,
+                              optional
+        """
+        assert chunk is None or chunk >= 1, \
+            'chunk must be a positive integer'
+        self.ctx = ctx
+        self.threshold = float(threshold) if threshold is not None \
+            else None
+        self.chunk = chunk
+        self.horizon = horizon
+
+        # Set in the first call (result grid needed)
+        self.grid = None
+        self.index = None
+        self.ideal = None
+        self.weights = None
+        self.scale = None
+        self.needed = None  # Last result sample needed by merged rows
+
+        self.sse = np.zeros(len(ctx.variables))  # Weighted sum of sq. err.
+        self.done = 0  # Number of merged rows accumulated
+        self.checked = 0  # Number of result samples at the last check
+        self.bound = 0.
+        self.aborted = False  # Bound exceeded threshold
+        self.truncated = False  # Horizon reached
+
+    def __call__(self, grid, values, n):
+        """
+        Updates the bound with the first ``n`` rows of ``values``
+        given at ``grid`` (all result time stamps).
+
+        :param grid: 1D numpy array, result time stamps
+        :param values: 2D numpy array [n_result_times, n_variables]
+        :param int n: Number of simulated rows
+        :return: bool, True if the simulation should be aborted
+        """
+        if self.grid is None:
+            self.grid = grid
+            index, self.ideal, weights, self.scale = self.ctx.get_merge(grid)
+            self.weights = weights if weights is not None \
+                else np.ones(self.ideal.shape[1])
+            # Result rows with zero weight are not used (they may
+            # be not simulated yet)
+            lower, upper, frac = index
+            lower = np.where(frac < 1., lower, upper)
+            upper = np.where(frac > 0., upper, lower)
+            self.index = (lower, upper, frac)
+            self.needed = np.maximum.accumulate(np.maximum(lower, upper))
+            if self.chunk is None:
+                self.chunk = max(1, grid.size // ErrorMonitor.CHECKS)
+
+        if self.horizon is not None and grid[n - 1] >= self.horizon:
+            self._update(values, n)
+            self.truncated = True
+            return True
+
+        if self.threshold is None or n - self.checked < self.chunk:
+            return False
+        self.checked = n
+
+        self._update(values, n)
+        self.aborted = self.bound > self.threshold
+        return self.aborted
+
+    def _update(self, values, n):
+        """
+        Accumulates squared errors of the merged rows covered
+        by the first ``n`` rows of ``values`` and updates the bound.
+        """
+        stop = int(np.searchsorted(self.needed, n - 1, side='right'))
+        if stop > self.done:
+            lower, upper, frac = [x[self.done:stop] for x in self.index]
+            frac = frac[:, np.newaxis]
+            model = values[lower] * (1. - frac) + values[upper] * frac
+            se = np.square(self.ideal[:, self.done:stop].T - model)
+            self.sse += (se * self.weights[self.done:stop, np.newaxis]) \
+                .sum(axis=0)
+            self.done = stop
+
+        self.bound = float((np.sqrt(self.sse / self.weights.size) /
+                            self.scale).sum())
+
+    def get_error(self):
+        """
+        Returns the pessimistic error of the aborted simulation
+        (dictionary as returned by ``ErrorContext.calc()``).
+
+        :return: dict
+        """
+        assert self.aborted, 'Simulation was not aborted'
+        n = self.weights.size
+        seen = self.weights[:self.done].sum()
+        if seen > 0.:
+            mse = self.sse / seen * self.weights.sum() / n
+        else:
+            mse = self.sse / n
+        partial = np.sqrt(np.maximum(mse, self.sse / n)) / self.scale
+
+        error = dict(zip(self.ctx.variables, partial.tolist()))
+        error['tot'] = float(partial.sum())
+        return error
+
+    def get_prefix_error(self):
+        """
+        Returns the error of the simulated prefix (truncated
+        simulation, see ``horizon``) as a dictionary
+        (as returned by ``ErrorContext.calc()``).
+
+        :return: dict
+        """
+        assert self.truncated, 'Simulation was not truncated'
+        seen = self.weights[:self.done].sum()
+        if seen > 0.:
+            mse = self.sse / seen
+        else:
+            mse = np.zeros(len(self.ctx.variables))
+        partial = np.sqrt(mse) / self.scale
 
+        error = dict(zip(self.ctx.variables, partial.tolist()))
+        error['tot'] = float(partial.sum())
+        return error
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from modestpy.estim.model import Model
+from modestpy.estim.error import ErrorContext
+from modestpy.estim.cache import EvalCache
+from modestpy.estim.pool import EvalPool
+from modestpy.estim.trajectory import Trajectory
+from modestpy.estim.ga import fidelity
+
+
+class Evaluator(object):
+    """
+    Evaluates batches of parameter sets proposed by estimation
+    methods (see ``estim.optimizer``) and by the GA populations.
+
+    The evaluator owns the model instance, the worker pool
+    and the evaluation cache, and keeps the history of all
+    points passed to ``evaluate()``. Each batch is evaluated
+    in one pass: cached points are taken from the cache,
+    duplicates are simulated once and the remaining points
+    are simulated serially (``simulate()``) or in the worker
+    processes.
+    """
+
+    def __init__(self, fmu_path, inp, known, ideal, space, ftype='RMSE',
+                 fmi_opts=None, cache=None, workers=1, max_evals=None):
+        """
+        :param fmu_path: string, path to the FMU
+        :param inp: DataFrame, inputs, index in seconds
+        :param known: dict, known parameters (name: value)
+        :param ideal: DataFrame, ideal solution
+        :param ParameterSpace space: Estimated parameters
+        :param string ftype: Cost function type, 'RMSE' or 'NRMSE'
+        :param dict fmi_opts: FMI options
+        :param EvalCache cache: Evaluation cache, can be shared with other
+                                methods using the same data. If None,
+                                a private cache is used.
+        :param int workers: Number of worker processes (1 = serial)
+        :param int max_evals: Maximum number of evaluated points
+                              (cache hits included), optional
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        assert inp.index.equals(ideal.index), \
+            'inp and ideal indexes are not matching'
+
+        self.space = space
+        self.names = space.names
+        self.ideal = ideal
+        self.inputs = inp
+        self.outputs = [var for var in ideal]
+        self.max_evals = max_evals
+
+        # Known parameters to DataFrame
+        known_df = pd.DataFrame()
+        for key in known:
+            assert known[key] is not None, \
+                'None is not allowed in known parameters ' \
+                '(parameter {})'.format(key)
+            known_df[key] = [known[key]]
+
+        # Model
+        self.model = Model(fmu_path, fmi_opts)
+        self.model.set_input(inp)
+        self.model.set_param(known_df)
+        self.model.set_outputs(self.outputs)
+        # Outputs at the ideal time stamps
+        self.model.set_output_grid(ideal.index.values)
+
+        self.err_ctx = ErrorContext(ideal, ftype=ftype)
+        self.cache = cache if cache is not None else EvalCache()
+
+        # Worker pool
+        self.pool = None
+        if workers is not None and workers > 1:
+            self.logger.info('Evaluating parameter sets in {} processes'
+                             .format(workers))
+            self.pool = EvalPool(fmu_path, inp, known_df, ideal,
+                                 ftype=ftype, opts=fmi_opts, workers=workers)
+
+        # Bookkeeping
+        self.history = Trajectory(self.names)
+        self.n_evals = 0  # Evaluated points (cache hits included)
+        self.best_x = None
+        self.best_err = np.inf
+        self.best_res = None
+
+    def evaluate(self, X, threshold=None, method=None):
+        """
+        Returns total errors of parameter sets ``X``.
+
+        If ``threshold`` is given, simulations are aborted as soon
+        as their error certainly exceeds ``threshold`` (their errors
+        are pessimistic and are not cached).
+
+        :param X: 2D array [k, n_params] (ordered as ``space.names``)
+        :param float threshold: Error threshold, optional
+        :param str method: Method name saved in the history, optional
+        :return: 1D numpy array [k]
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        k = X.shape[0]
+        errors = np.empty(k)
+        if k == 0:
+            return errors
+
+        results, error_dicts, aborted, _ = self.evaluate_batch(X, threshold)
+        for i, x in enumerate(X):
+            errors[i] = error_dicts[i]['tot']
+            if not aborted[i]:
+                self._update_best(x, errors[i], results[i])
+
+        self.history.append(len(self.history), X, errors, method=method)
+        self.n_evals += k
+        return errors
+
+    def evaluate_batch(self, X, threshold=None, rungs=None):
+        """
+        Evaluates parameter sets ``X`` and returns their results
+        and error dicts (used by ``evaluate()`` and by the GA
+        populations). Cached points are taken from the cache,
+        duplicates are simulated once. Results of the points
+        evaluated in the worker processes are None.
+
+        With ``rungs``, uncached points are first evaluated
+        on prefixes of the learning period and only the best ones
+        are simulated over the full period (see ``ga.fidelity``).
+        The eliminated points have no result and no error (None).
+
+        :param X: 2D array [k, n_params] (ordered as ``space.names``)
+        :param float threshold: Error threshold, optional
+        :param rungs: list of (fraction, ratio) tuples, optional
+        :return: tuple(list of DataFrames, list of dicts,
+                 1D bool array - True if aborted, list of
+                 (row indices, fraction, prefix errors) of the points
+                 eliminated at each rung)
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        k = X.shape[0]
+        results = [None] * k
+        error_dicts = [None] * k
+        aborted = np.zeros(k, dtype=bool)
+
+        pending = OrderedDict()  # cache key -> row indices
+        for i, x in enumerate(X):
+            cached = self.cache.get(self.names, x)
+            if cached is not None:
+                results[i] = cached[0]
+                error_dicts[i] = dict(cached[1])
+            else:
+                key = self.cache.key(self.names, x)
+                pending.setdefault(key, list()).append(i)
+
+        groups = list(pending.values())
+        rows = X[[idx[0] for idx in groups]]
+
+        eliminated = list()
+        if rungs and groups:
+            def evaluate(j, fraction):
+                return self.evaluate_prefix(rows[j], fraction)
+            promoted, rejected = fidelity.successive_halving(
+                np.arange(len(groups)), rungs, evaluate)
+            for j, fraction, prefix in rejected:
+                idx = [i for m in j for i in groups[m]]
+                prefix = [e for m, e in zip(j, prefix) for _ in groups[m]]
+                eliminated.append((np.array(idx, dtype=int), fraction,
+                                   np.array(prefix, dtype=np.float64)))
+        else:
+            promoted = np.arange(len(groups))
+
+        if promoted.size > 0:
+            if self.pool is not None:
+                errors, done = self.pool.evaluate(self.names, rows[promoted],
+                                                  threshold)
+                simulated = [None] * promoted.size
+            else:
+                simulated, errors, done = self.simulate(rows[promoted],
+                                                        threshold)
+            for j, result, error, abort in zip(promoted, simulated,
+                                               errors, done):
+                if not abort:
+                    self.cache.put(self.names, rows[j], result, error)
+                for i in groups[j]:
+                    results[i] = result
+                    error_dicts[i] = dict(error)
+                    aborted[i] = abort
+
+        return results, error_dicts, aborted, eliminated
+
+    def evaluate_prefix(self, X, fraction):
+        """
+        Returns errors of parameter sets ``X`` evaluated on the prefix
+        of the learning period (``fraction`` of the time span).
+        Prefix errors are not cached.
+
+        :param X: 2D array [k, n_params] (ordered as ``space.names``)
+        :param float fraction: Prefix length (0-1)
+        :return: 1D numpy array [k]
+        """
+        if self.pool is not None:
+            errors, _ = self.pool.evaluate(self.names, X, fraction=fraction)
+            return np.array([e['tot'] for e in errors])
+
+        monitors = [self.err_ctx.get_prefix_monitor(fraction) for _ in X]
+        out = self.model.simulate_batch(self.names, X, monitors=monitors)
+        grid = self.model.get_output_grid()
+        errors = np.empty(len(monitors))
+        for i, monitor in enumerate(monitors):
+            if monitor.truncated:
+                errors[i] = monitor.get_prefix_error()['tot']
+            else:
+                # Horizon at the end of the period
+                errors[i] = self.err_ctx.calc_batch(out[i:i + 1], grid)[0][0]
+        return errors
+
+    def get_result(self, x):
+        """
+        Returns simulation result of the parameter set ``x``.
+        Points evaluated in the worker processes have no result
+        stored, so they are simulated again.
+
+        :param x: 1D array [n_params]
+        :return: DataFrame
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if self.best_x is not None and self.best_res is not None \
+                and np.array_equal(x, self.best_x):
+            return self.best_res
+        cached = self.cache.get(self.names, x)
+        if cached is not None and cached[0] is not None:
+            return cached[0]
+        self.model.set_param_values(self.names, x)
+        return self.model.simulate()
+
+    def exhausted(self):
+        """
+        :return: bool, True if the evaluation budget is used up
+        """
+        return self.max_evals is not None and self.n_evals >= self.max_evals
+
+    def get_history(self):
+        """
+        Returns all evaluated points (one iteration per batch).
+
+        :return: DataFrame
+        """
+        return self.history.to_df()
+
+    def close(self):
+        """
+        Stops the worker processes (if any).
+
+        :return: None
+        """
+        if self.pool is not None:
+            self.pool.close()
+
+    def simulate(self, rows, threshold=None):
+        """
+        Simulates parameter sets in this process and returns results
+        and errors (the cache is not used). Aborted simulations
+        have no result (None).
+
+        :param rows: 2D numpy array [n, n_params]
+        :param float threshold: Error threshold, optional
+        :return: tuple(list of DataFrames, list of dicts,
+                 1D bool array - True if aborted)
+        """
+        monitors = None
+        if threshold is not None:
+            monitors = [self.err_ctx.get_monitor(threshold) for _ in rows]
+        out = self.model.simulate_batch(self.names, rows, monitors=monitors)
+        grid = self.model.get_output_grid()
+        _, partial = self.err_ctx.calc_batch(out, grid)
+        index = pd.Index(grid, name='time')
+        results = [pd.DataFrame(out[i], index=index, columns=self.outputs)
+                   for i in range(out.shape[0])]
+        errors = self.err_ctx.get_error_dicts(partial)
+        aborted = np.zeros(len(errors), dtype=bool)
+        if monitors is not None:
+            for i, monitor in enumerate(monitors):
+                if monitor.aborted:
+                    results[i] = None
+                    errors[i] = monitor.get_error()
+                    aborted[i] = True
+        return results, errors, aborted
+
+    def _update_best(self, x, err, result):
+        if err < self.best_err:
+            self.best_x = np.array(x, dtype=np.float64)
+            self.best_err = float(err)
+            self.best_res = result
@@ -12,10 +12,11 @@ from __future__ import division
 from __future__ import print_function
 
 from modestpy.estim.ga.population import Population
+import copy
 import random
 import logging
 
-# Constants controlling the evolution
+# Default constants controlling the evolution (see EvolutionConfig)
 UNIFORM_RATE = 0.5  # affects crossover
 MUT_RATE = 0.10  # standard mutation rate
 MUT_RATE_INC = 0.33  # increased mutation rate when population diversity is low
@@ -29,59 +30,106 @@ ELITISM = True  # if True, saves the fittest individual
 VERBOSE = True
 
 
-def evolve(pop):
+class EvolutionConfig(object):
+    """
+    Settings of the evolution operators, passed to ``evolve()``
+    (and to the array engine, see ``array_algorithm``).
+    Each ``GA`` instance has its own configuration, so GA instances
+    running in the same process do not affect each other.
+    Defaults are taken from the module constants.
+    """
+
+    def __init__(self, uniform_rate=UNIFORM_RATE, mut_rate=MUT_RATE,
+                 mut_rate_inc=MUT_RATE_INC, inc_mut_prop=INC_MUT_PROP,
+                 max_change=MAX_CHANGE, tournament_size=TOURNAMENT_SIZE,
+                 diversity_lim=DIVERSITY_LIM, elitism=ELITISM):
+        """
+        :param float uniform_rate: Uniformity rate (crossover)
+        :param float mut_rate: Standard mutation rate
+        :param float mut_rate_inc: Increased mutation rate, used when
+                                   the population diversity is low
+        :param float inc_mut_prop: Proportion of the population
+                                   undergoing slight mutation when
+                                   the population diversity is low
+        :param float max_change: Maximum change of a gene in slight
+                                 mutation [%]
+        :param int tournament_size: Number of individuals
+                                    in the tournament
+        :param float diversity_lim: Maximum share of identical
+                                    individuals in a diverse population
+        :param bool elitism: If True, the fittest individual
+                             is saved in the next generation
+        """
+        self.uniform_rate = uniform_rate
+        self.mut_rate = mut_rate
+        self.mut_rate_inc = mut_rate_inc
+        self.inc_mut_prop = inc_mut_prop
+        self.max_change = max_change
+        self.tournament_size = int(tournament_size)
+        self.diversity_lim = diversity_lim
+        self.elitism = elitism
+
+    def __repr__(self):
+        return 'EvolutionConfig({})'.format(', '.join(
+            '{}={}'.format(k, v) for k, v in sorted(self.__dict__.items())))
+
+
+def evolve(pop, config=None):
     """
     Evolves the population.
 
     :param pop: Population
+    :param EvolutionConfig config: Evolution settings
+                                   (defaults if None)
     :return: Population
     """
     logger = logging.getLogger("ga.algorithm.evolve")
 
-    new_pop = Population(fmu_path=pop.fmu_path,
+    if config is None:
+        config = EvolutionConfig()
+
+    new_pop = Population(evaluator=pop.evaluator,
                          pop_size=pop.size(),
-                         inp=pop.inputs,
-                         known=pop.known_pars,
-                         est=pop.get_estpars(),
-                         ideal=pop.ideal,
-                         init=False)
+                         init=False,
+                         early_abort=pop.early_abort,
+                         rungs=pop.rungs)
 
     elite_offset = 0
-    if ELITISM:
+    if config.elitism:
         new_pop.add_individual(pop.get_fittest())
         elite_offset = 1
 
     # Crossover
     for i in range(elite_offset, new_pop.size()):
-        ind1 = tournament_selection(pop, TOURNAMENT_SIZE)
-        ind2 = tournament_selection(pop, TOURNAMENT_SIZE)
-        child = crossover(ind1, ind2, UNIFORM_RATE)
+        ind1 = tournament_selection(pop, config.tournament_size)
+        ind2 = tournament_selection(pop, config.tournament_size)
+        child = crossover(ind1, ind2, config.uniform_rate)
         new_pop.add_individual(child)
         logger.debug('Crossover: ({}) x ({}) -> ({})'
                      .format(ind1, ind2, child))
 
     # Mutation
     # Check population diversity
-    if is_population_diverse(new_pop, DIVERSITY_LIM):
+    if is_population_diverse(new_pop, config.diversity_lim):
         # Low mutation rate, completely random new values
         logger.debug("Population diversity is OK -> standard mutation")
         for i in range(elite_offset, new_pop.size()):
-            mutation(new_pop.individuals[i], MUT_RATE)
+            mutation(new_pop.individuals[i], config.mut_rate)
     else:
         # Population is not diverse
         logger.debug("Population diversity is LOW -> increased mutation")
         for i in range(elite_offset, new_pop.size()):
-            if random.random() < INC_MUT_PROP:
+            if random.random() < config.inc_mut_prop:
                 # Increased mutation rate, slightly changed values
                 slight_mutation(new_pop.individuals[i],
-                                MUT_RATE_INC,
-                                MAX_CHANGE)
+                                config.mut_rate_inc,
+                                config.max_change)
             else:
                 # Increased mutation rate, completely random new values
-                mutation(new_pop.individuals[i], MUT_RATE_INC)
+                mutation(new_pop.individuals[i], config.mut_rate_inc)
 
     # Calculate
-    new_pop.calculate()
+    new_pop.calculate(threshold=pop.get_abort_threshold())
 
     # Return
     return new_pop
@@ -194,16 +242,18 @@ def slight_mutation(ind, mut_rate, max_change):
 
 
 def tournament_selection(pop, tournament_size):
-    # Create tournament population
-    t_pop = Population(pop.fmu_path, tournament_size, pop.inputs,
-                       pop.known_pars, pop.get_estpars(), pop.ideal,
-                       init=False)
     # For each place in the tournament get a random individual
+    winner = None
     for i in range(tournament_size):
         rand_index = random.randint(0, pop.size()-1)
-        t_pop.individuals.append(pop.individuals[rand_index])
-
-    return t_pop.get_fittest()
+        ind = pop.individuals[rand_index]
+        # Individuals evaluated only on a prefix are compared
+        # by their ranking errors (see Population.calculate())
+        if winner is None or \
+                ind.get_ranking_error() < winner.get_ranking_error():
+            winner = ind
+
+    return copy.copy(winner)
 
 
 def info(txt):
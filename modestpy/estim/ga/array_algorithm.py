@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import numpy as np
+from modestpy.estim.ga import algorithm
+
+
+def evolve(pop, config=None):
+    """
+    Evolves the array population (``ArrayPopulation``). Same operators
+    and settings as ``algorithm.evolve()`` (tournament selection,
+    uniform crossover, standard and slight mutation, elitism),
+    applied to the whole gene array at once.
+
+    Random numbers are drawn from ``numpy.random``.
+
+    :param pop: ArrayPopulation
+    :param EvolutionConfig config: Evolution settings
+                                   (defaults if None)
+    :return: ArrayPopulation
+    """
+    genes = evolve_genes(pop.genes, pop.ranking, config)
+
+    # Calculate
+    new_pop = pop.spawn(genes)
+    new_pop.calculate(threshold=pop.get_abort_threshold())
+
+    # Return
+    return new_pop
+
+
+def evolve_genes(genes, errors, config=None):
+    """
+    Returns genes of the next generation (see ``evolve()``).
+
+    :param genes: 2D numpy array [n, n_params], genes (0-1)
+    :param errors: 1D numpy array [n], errors of the individuals
+    :param EvolutionConfig config: Evolution settings
+                                   (defaults if None)
+    :return: 2D numpy array [n, n_params]
+    """
+    if config is None:
+        config = algorithm.EvolutionConfig()
+
+    n = genes.shape[0]
+    new_genes = np.empty_like(genes)
+
+    elite_offset = 0
+    if config.elitism:
+        new_genes[0] = genes[int(np.argmin(errors))]
+        elite_offset = 1
+    m = n - elite_offset
+
+    # Selection
+    parents1 = tournament_selection(errors, m, config.tournament_size)
+    parents2 = tournament_selection(errors, m, config.tournament_size)
+
+    # Crossover
+    children = crossover(genes[parents1], genes[parents2],
+                         config.uniform_rate)
+    new_genes[elite_offset:] = children
+
+    # Mutation
+    # Check population diversity
+    diverse = is_population_diverse(new_genes, config.diversity_lim)
+    mutate(children, diverse, config)
+    new_genes[elite_offset:] = children
+
+    return new_genes
+
+
+def mutate(children, diverse, config):
+    """
+    Mutates ``children`` in place. Standard mutation is used
+    if the population is diverse, otherwise the increased
+    mutation rate is used (slight mutation for a share
+    ``config.inc_mut_prop`` of the children).
+
+    :param children: 2D numpy array, genes of children
+    :param diverse: bool, result of ``is_population_diverse()``
+    :param EvolutionConfig config: Evolution settings
+    :return: 2D numpy array (``children``)
+    """
+    logger = logging.getLogger("ga.array_algorithm.evolve")
+
+    if diverse:
+        # Low mutation rate, completely random new values
+        logger.debug("Population diversity is OK -> standard mutation")
+        mutation(children, config.mut_rate)
+    else:
+        # Population is not diverse
+        logger.debug("Population diversity is LOW -> increased mutation")
+        slight = np.random.random_sample(children.shape[0]) < \
+            config.inc_mut_prop
+        children[slight] = slight_mutation(children[slight],
+                                           config.mut_rate_inc,
+                                           config.max_change)
+        children[~slight] = mutation(children[~slight], config.mut_rate_inc)
+    return children
+
+
+def tournament_selection(errors, count, tournament_size):
+    """
+    Runs ``count`` tournaments. Each tournament draws
+    ``tournament_size`` individuals (with replacement)
+    and the fittest one wins.
+
+    :param errors: 1D numpy array, errors of the individuals
+    :param count: int, number of tournaments
+    :param tournament_size: int
+    :return: 1D numpy array, indices of the winners
+    """
+    draws = np.random.randint(0, errors.size, size=(count, tournament_size))
+    best = np.argmin(errors[draws], axis=1)
+    return draws[np.arange(count), best]
+
+
+def crossover(genes1, genes2, uniformity):
+    """
+    Uniform crossover. Each child takes a gene from parent 1
+    with probability ``uniformity``, otherwise from parent 2.
+
+    :param genes1: 2D numpy array, genes of parents 1
+    :param genes2: 2D numpy array, genes of parents 2
+    :param uniformity: float, uniformity rate
+    :return: 2D numpy array, genes of children
+    """
+    mask = np.random.random_sample(genes1.shape) <= uniformity
+    return np.where(mask, genes1, genes2)
+
+
+def mutation(genes, mut_rate):
+    """
+    Standard mutation. Genes are replaced with random values
+    with probability ``mut_rate``. Mutates ``genes`` in place.
+
+    :param genes: 2D numpy array
+    :param mut_rate: float, mutation rate
+    :return: 2D numpy array (``genes``)
+    """
+    mask = np.random.random_sample(genes.shape) < mut_rate
+    genes[mask] = np.random.random_sample(np.count_nonzero(mask))
+    return genes
+
+
+def slight_mutation(genes, mut_rate, max_change):
+    """
+    Slight mutation. Genes are changed by at most ``max_change``
+    percent with probability ``mut_rate``. Mutates ``genes`` in place.
+
+    :param genes: 2D numpy array
+    :param mut_rate: float, mutation rate
+    :param max_change: float (0-100), maximum allowed percentage
+                       change of genes
+    :return: 2D numpy array (``genes``)
+    """
+    mask = np.random.random_sample(genes.shape) < mut_rate
+    change = np.random.uniform(-1., 1., np.count_nonzero(mask))
+    genes[mask] = np.clip(genes[mask] + change * max_change / 100., 0., 1.)
+    return genes
+
+
+def is_population_diverse(genes, diversity_lim):
+    """
+    Check if the population is diverse. Returns False if the share
+    of identical individuals in the population is higher than
+    ``diversity_lim``.
+
+    :param genes: 2D numpy array
+    :param diversity_lim: float (0-1), minimum share of identical individuals
+                          defining non-diverse population
+    :return: boolean
+    """
+    _, counts = np.unique(genes, axis=0, return_counts=True)
+    return float(counts.max()) / float(genes.shape[0]) <= diversity_lim
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import copy
+import numpy as np
+import pandas as pd
+from modestpy.estim.ga.individual import Individual
+from modestpy.estim.ga import fidelity
+
+
+class ArrayPopulation(object):
+    """
+    Population stored as a 2D array of genes [pop_size, n_params]
+    (values 0-1, columns ordered as ``space.names``) and a vector
+    of errors.
+    Used by the array GA engine (see ``array_algorithm.evolve()``).
+
+    Provides the same interface as ``Population`` used by ``GA``.
+    """
+
+    def __init__(self, evaluator, pop_size, init=True, init_pop=None,
+                 early_abort=False, rungs=None):
+        """
+        :param Evaluator evaluator: Evaluator of the parameter sets
+                                    (model, cache and worker pool)
+        :param pop_size: int
+        :param init: bool
+        :param DataFrame init_pop: Initial population, DataFrame with initial
+                                   guesses for estimated parameters
+                                   (random genes if None)
+        :param bool early_abort: If True, simulations of the offspring
+                                 are aborted when their error certainly
+                                 exceeds ``get_abort_threshold()``
+        :param rungs: list of (fraction, ratio) tuples, low-fidelity
+                      rungs (see ``ga.fidelity``), optional
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.evaluator = evaluator
+        self.pop_size = pop_size
+        self.inputs = evaluator.inputs
+        self.space = evaluator.space
+        self.outputs = evaluator.outputs
+        self.ideal = evaluator.ideal
+        self.ftype = evaluator.err_ctx.ftype
+        self.model = evaluator.model
+        self.cache = evaluator.cache
+        self.pool = evaluator.pool
+        self.early_abort = early_abort
+        self.rungs = fidelity.check_rungs(rungs) if rungs else None
+
+        # Parameter names (aligned with gene columns)
+        self.names = self.space.names
+
+        # Genes, errors and results of the individuals
+        # (full-fidelity errors, see get_fidelity())
+        self.genes = np.zeros((pop_size, len(self.space)))
+        self.errors = np.full(pop_size, np.inf)
+        self.error_dicts = [None] * pop_size
+        self.results = [None] * pop_size
+        # True if the simulation was aborted (error not cached)
+        self.aborted = np.zeros(pop_size, dtype=bool)
+        # Errors used by the selection, equal to ``errors``
+        # except for individuals eliminated at a low-fidelity rung
+        self.ranking = np.full(pop_size, np.inf)
+
+        # Fidelity of the errors (see get_fidelity())
+        self.fidelity = np.ones(pop_size)
+        self.measured = None
+
+        if init:
+            self._initialize(init_pop)
+            self.calculate()
+
+    def spawn(self, genes):
+        """
+        Returns a new (not calculated) population with ``genes``,
+        sharing the model, cache and pool with this population.
+
+        :param genes: 2D numpy array [pop_size, n_params]
+        :return: ArrayPopulation
+        """
+        new_pop = copy.copy(self)
+        new_pop.genes = genes
+        new_pop.errors = np.full(genes.shape[0], np.inf)
+        new_pop.error_dicts = [None] * genes.shape[0]
+        new_pop.results = [None] * genes.shape[0]
+        new_pop.aborted = np.zeros(genes.shape[0], dtype=bool)
+        new_pop.ranking = np.full(genes.shape[0], np.inf)
+        new_pop.fidelity = np.ones(genes.shape[0])
+        new_pop.measured = None
+        return new_pop
+
+    def replace(self, i, genes, result, error, aborted=False):
+        """
+        Replaces the individual ``i`` with an evaluated individual
+        (used by the steady-state evolution).
+
+        :param int i: Index of the replaced individual
+        :param genes: 1D numpy array [n_params]
+        :param result: DataFrame or None
+        :param dict error: Error dict
+        :param bool aborted: True if the simulation was aborted
+        :return: None
+        """
+        self.genes[i] = genes
+        self.results[i] = result
+        self.error_dicts[i] = dict(error)
+        self.errors[i] = error['tot']
+        self.ranking[i] = error['tot']
+        self.aborted[i] = aborted
+
+    def get_values(self):
+        """
+        Returns parameter values of all individuals.
+
+        :return: 2D numpy array [pop_size, n_params]
+        """
+        return self.space.decode(self.genes)
+
+    def calculate(self, threshold=None):
+        """
+        Calculates errors of all individuals with the evaluator
+        (see ``Evaluator.evaluate_batch()``). Simulations certainly
+        worse than ``threshold`` (if given) are aborted.
+
+        With ``rungs``, uncached individuals are first evaluated
+        on prefixes of the learning period and only the best ones
+        are simulated over the full period (see ``ga.fidelity``).
+        The eliminated individuals have no error (``errors`` is inf,
+        error dict is None), they are ranked in the selection
+        by ``ranking``.
+
+        :param threshold: float, error threshold, optional
+        :return: None
+        """
+        n = self.genes.shape[0]
+        self.results, self.error_dicts, self.aborted, eliminated = \
+            self.evaluator.evaluate_batch(self.get_values(), threshold,
+                                          self.rungs)
+        self.errors = np.array([e['tot'] if e is not None else np.inf
+                                for e in self.error_dicts])
+        self.ranking = self.errors.copy()
+        self.fidelity = np.ones(n)
+        self.measured = None
+
+        if eliminated:
+            self.measured = self.errors.copy()
+            full = self.errors[np.isfinite(self.errors)]
+            for rows, fraction, prefix, ranking in \
+                    fidelity.get_ranking_errors(full, eliminated):
+                self.ranking[rows] = ranking
+                self.measured[rows] = prefix
+                self.fidelity[rows] = fraction
+
+    def get_fidelity(self):
+        """
+        Returns fidelity (prefix fraction, 1 = full period) and error
+        measured at this fidelity for each individual, or None if
+        all individuals were evaluated over the full period.
+
+        :return: tuple(1D numpy array, 1D numpy array) or None
+        """
+        if self.measured is None:
+            return None
+        return self.fidelity.copy(), self.measured.copy()
+
+    def size(self):
+        return self.pop_size
+
+    def get_abort_threshold(self):
+        """
+        Returns the error threshold used to abort simulations
+        of the offspring (the worst full-fidelity error in this
+        population) or None if ``early_abort`` is disabled.
+
+        :return: float or None
+        """
+        if not self.early_abort:
+            return None
+        return float(self.errors[self.fidelity == 1.].max())
+
+    def get_fittest_index(self):
+        """
+        Index of the fittest individual (the first one if many),
+        only full-fidelity errors are compared.
+
+        :return: int
+        """
+        return int(np.argmin(self.errors))
+
+    def get_fittest(self):
+        """
+        Returns the fittest individual as an ``Individual`` instance.
+
+        :return: Individual
+        """
+        i = self.get_fittest_index()
+        ind = Individual(space=self.space, population=self,
+                         genes=dict(zip(self.names, self.genes[i])),
+                         ftype=self.ftype)
+        ind.error = dict(self.error_dicts[i])
+        ind.result = self.results[i]
+        return ind
+
+    def get_fittest_error(self):
+        return float(self.errors[self.get_fittest_index()])
+
+    def get_population_errors(self):
+        return self.errors.tolist()
+
+    def get_fittest_estimates(self):
+        i = self.get_fittest_index()
+        return pd.DataFrame([self.get_values()[i]], columns=self.names)
+
+    def get_all_estimates_and_errors(self):
+        all_estim = pd.DataFrame(self.get_values(), columns=self.names,
+                                 index=np.zeros(self.genes.shape[0],
+                                                dtype=int))
+        all_estim['_error_'] = self.errors
+        all_estim['individual'] = np.arange(1, self.genes.shape[0] + 1)
+        return all_estim
+
+    def get_space(self):
+        """Returns ParameterSpace"""
+        return self.space
+
+    def _initialize(self, init_pop=None):
+        self.logger.debug('Initialize population with init_pop=\n{}'
+                          .format(init_pop))
+        if init_pop is not None:
+            assert len(init_pop.index) == self.pop_size, \
+                "Population size does not match initial guess {} != {}" \
+                .format(init_pop.index.size, self.pop_size)
+            values = np.array(init_pop[list(self.names)].values,
+                              dtype=np.float64)
+            self.genes = self.space.encode(values)
+            assert np.all((self.genes >= 0.) & (self.genes <= 1.)), \
+                'Initial guess outside the bounds'
+        else:
+            self.genes = np.random.random_sample((self.pop_size,
+                                                  len(self.names)))
+
+    def __str__(self):
+        s = repr(self)
+        s += '\n'
+        s += 'Number of individuals: ' + str(self.genes.shape[0]) + '\n'
+        values = self.get_values()
+        for i in range(values.shape[0]):
+            s += 'Individual (' + ', '.join(
+                '{}={:.3f}'.format(n, v)
+                for n, v in zip(self.names, values[i])) + \
+                '), err={:.4f} \n'.format(self.errors[i])
+        s += '-' * 110 + '\n'
+        s += 'Fittest: ' + str(self.get_fittest()) + '\n'
+        s += '-' * 110 + '\n'
+        return s
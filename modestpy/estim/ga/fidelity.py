@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger('ga.fidelity')
+
+
+def check_rungs(rungs):
+    """
+    Validates fidelity rungs and returns them as a list of tuples.
+
+    :param rungs: sequence of (fraction, ratio) pairs
+    :return: list of tuples
+    """
+    rungs = [(float(f), float(r)) for f, r in rungs]
+    prev = 0.
+    for fraction, ratio in rungs:
+        assert prev < fraction < 1., \
+            'Rung fractions must be increasing and lower than 1'
+        assert 0. < ratio <= 1., 'Promotion ratios must be in (0, 1]'
+        prev = fraction
+    return rungs
+
+
+def successive_halving(pending, rungs, evaluate):
+    """
+    Runs the low-fidelity rungs for candidates ``pending``
+    (successive halving).
+
+    Candidates are first scored on a prefix of the learning period
+    (low fidelity). Only the best fraction of them is promoted
+    to the next rung (longer prefix) and finally to the full-length
+    simulation. Each rung is a tuple ``(fraction, ratio)``, where
+    ``fraction`` is the prefix length as a fraction of the learning
+    period and ``ratio`` is the share of candidates promoted
+    to the next rung, e.g. ``[(0.25, 0.5), (0.5, 0.5)]``.
+
+    :param pending: 1D int array, indices of candidates to be evaluated
+    :param rungs: list of (fraction, ratio) tuples
+    :param evaluate: callable ``evaluate(indices, fraction)`` returning
+                     1D array with prefix errors
+    :return: tuple(1D int array with indices promoted to the full
+             evaluation, list of (indices, fraction, errors) of the
+             candidates eliminated at each rung)
+    """
+    promoted = np.asarray(pending, dtype=int)
+    eliminated = list()
+    for fraction, ratio in rungs:
+        if promoted.size == 0:
+            break
+        errors = evaluate(promoted, fraction)
+        keep = max(1, int(math.ceil(ratio * promoted.size)))
+        order = np.argsort(errors, kind='stable')
+        eliminated.append((promoted[order[keep:]], fraction,
+                           errors[order[keep:]]))
+        logger.debug('Rung {:.2f}: {} of {} candidates promoted'
+                     .format(fraction, keep, promoted.size))
+        promoted = promoted[np.sort(order[:keep])]
+    return promoted, eliminated
+
+
+def get_ranking_errors(full_errors, eliminated):
+    """
+    Returns ranking errors of the eliminated candidates.
+    Candidates eliminated at rung ``k`` are ranked below all
+    candidates evaluated at higher fidelity (their prefix error
+    is added to the worst error at higher fidelity), and their
+    order within the rung is kept.
+
+    :param full_errors: 1D array, errors of fully evaluated candidates
+    :param eliminated: list returned by ``successive_halving()``
+    :return: list of (indices, fraction, prefix errors, ranking errors)
+    """
+    base = float(np.max(full_errors)) if len(full_errors) > 0 else 0.
+    ranked = list()
+    for indices, fraction, errors in reversed(eliminated):
+        if indices.size == 0:
+            continue
+        ranking = base + errors
+        base = float(np.max(ranking))
+        ranked.append((indices, fraction, errors, ranking))
+    return ranked
+
@@ -19,9 +19,14 @@ import numpy as np
 import matplotlib.pyplot as plt
 import pyDOE as doe
 from modestpy.estim.ga import algorithm
+from modestpy.estim.ga import array_algorithm
+from modestpy.estim.ga import steady_state
 import modestpy.estim.plots as plots
-from modestpy.estim.estpar import EstPar
+from modestpy.estim.space import ParameterSpace
 from modestpy.estim.ga.population import Population
+from modestpy.estim.ga.array_population import ArrayPopulation
+from modestpy.estim.evaluator import Evaluator
+from modestpy.estim.trajectory import Trajectory
 
 
 class GA(object):
@@ -40,11 +45,20 @@ class GA(object):
     ITER = '_iter_'
     ERR = '_error_'
 
+    # Available engines
+    ENGINES = ('object', 'array')
+
+    # Replacement policies of the steady-state GA
+    REPLACEMENTS = steady_state.REPLACEMENTS
+
     def __init__(self, fmu_path, inp, known, est, ideal,
                  maxiter=100, tol=0.001, look_back=10,
                  pop_size=40, uniformity=0.5, mut=0.05, mut_inc=0.3,
                  trm_size=6, fmi_opts=None,
-                 ftype='RMSE', init_pop=None, lhs=False):
+                 ftype='RMSE', init_pop=None, lhs=False, cache=None,
+                 workers=1, engine='object', history_dir=None,
+                 early_abort=False, fidelity=None, steady_state=False,
+                 replacement='worst', config=None):
         """
         The population can be initialized in various ways:
         - if `init_pop` is None, one individual is initialized using
@@ -57,7 +71,8 @@ class GA(object):
         :param inp: DataFrame, columns with input timeseries, index in seconds
         :param known: Dictionary, key=parameter_name, value=value
         :param est: Dictionary, key=parameter_name, value=tuple
-                    (guess value, lo limit, hi limit), guess can be None
+                    (guess value, lo limit, hi limit[, scale]), guess
+                    can be None, scale is 'linear' (default) or 'log'
         :param ideal: DataFrame, ideal solution to be compared with model
                       outputs (variable names must match)
         :param maxiter: int, maximum number of generations
@@ -88,6 +103,55 @@ class GA(object):
         :param bool lhs: If True, init_pop and initial guess in est are
                          neglected, and the population is chosen using
                          Lating Hypercube Sampling.
+        :param EvalCache cache: Evaluation cache, can be shared with other
+                                methods using the same data. If None,
+                                a private cache is used.
+        :param int workers: Number of worker processes used to evaluate
+                            individuals. Each worker holds its own FMU
+                            instance and copies of the data. Results
+                            do not depend on the number of workers.
+        :param str engine: GA engine, 'object' (population of
+                           ``Individual`` objects) or 'array' (population
+                           stored as a gene array, vectorized operators,
+                           random numbers drawn from ``numpy.random``)
+        :param str history_dir: If given, the history of all individuals
+                                is periodically moved to files in this
+                                directory (for very long runs)
+        :param bool early_abort: If True, simulations of the offspring
+                                 are aborted as soon as their error
+                                 certainly exceeds the worst error
+                                 of the parent population. Aborted
+                                 individuals get pessimistic errors
+                                 extrapolated from the simulated part.
+        :param fidelity: list of (fraction, ratio) tuples, multi-fidelity
+                         evaluation (successive halving). All new
+                         individuals are first evaluated on the first
+                         ``fraction`` of the learning period and the best
+                         ``ratio`` of them is promoted to the next rung,
+                         e.g. ``[(0.25, 0.5), (0.5, 0.5)]``. Individuals
+                         promoted from the last rung are evaluated over
+                         the full period. The fidelity of each error
+                         is recorded in ``all_estim_and_err``.
+                         If None, all individuals are evaluated over
+                         the full period.
+        :param bool steady_state: If True, the population evolves without
+                                  generations (see ``ga.steady_state``).
+                                  A child is bred as soon as a worker is
+                                  free and replaces an individual when
+                                  evaluated, so the workers do not wait
+                                  for the slowest simulation. Uses the
+                                  array population (``engine`` is
+                                  ignored), ``fidelity`` is not supported.
+                                  ``maxiter`` and ``look_back`` are
+                                  counted in generation equivalents
+                                  of ``pop_size`` evaluations.
+        :param str replacement: Steady-state GA only, individual replaced
+                                by a better child: 'worst' or
+                                'tournament' (loser of a tournament)
+        :param EvolutionConfig config: Evolution settings, optional.
+                                       If given, ``uniformity``, ``mut``,
+                                       ``mut_inc`` and ``trm_size``
+                                       are not used.
         """
         self.logger = logging.getLogger(type(self).__name__)
         self.logger.info('GA constructor invoked')
@@ -95,11 +159,28 @@ class GA(object):
         assert inp.index.equals(ideal.index), \
             'inp and ideal indexes are not matching'
 
-        # Evolution parameters
-        algorithm.UNIFORM_RATE = uniformity
-        algorithm.MUT_RATE = mut
-        algorithm.MUT_RATE_INC = mut_inc
-        algorithm.TOURNAMENT_SIZE = int(trm_size)
+        # Evolution parameters (other settings can be changed
+        # in self.config before estimate())
+        if config is None:
+            config = algorithm.EvolutionConfig(uniform_rate=uniformity,
+                                               mut_rate=mut,
+                                               mut_rate_inc=mut_inc,
+                                               tournament_size=trm_size)
+        self.config = config
+
+        assert engine in GA.ENGINES, \
+            "Unknown GA engine '{}', use one of {}".format(engine, GA.ENGINES)
+        self.engine = engine
+
+        if steady_state:
+            assert fidelity is None, \
+                'Multi-fidelity evaluation is not supported ' \
+                'by the steady-state GA'
+            assert replacement in GA.REPLACEMENTS, \
+                "Unknown replacement '{}', use one of {}" \
+                .format(replacement, GA.REPLACEMENTS)
+        self.steady_state = steady_state
+        self.replacement = replacement
 
         self.max_generations = maxiter
         self.tol = tol
@@ -108,20 +189,17 @@ class GA(object):
         # History of fittest errors from each generation (list of floats)
         self.fittest_errors = list()
 
-        # History of all estimates and errors from all individuals
-        self.all_estim_and_err = pd.DataFrame()
-
-        # Initiliaze EstPar objects
-        estpars = list()
-        for key in sorted(est.keys()):
+        # Estimated parameters (genes ordered by name)
+        self.space = ParameterSpace.from_est(est, sort=True)
+        for key, value in zip(self.space.names, self.space.init):
             self.logger.info(
                 'Add {} (initial guess={}) to estimated parameters'
-                .format(key, est[key][0])
+                .format(key, value)
                 )
-            estpars.append(EstPar(name=key,
-                                  value=est[key][0],
-                                  lo=est[key][1],
-                                  hi=est[key][2]))
+
+        # History of all estimates and errors from all individuals
+        self.trajectory = Trajectory(self.space.names,
+                                     spill_dir=history_dir)
 
         # Put known into DataFrame
         known_df = pd.DataFrame()
@@ -135,8 +213,7 @@ class GA(object):
         # If LHS initialization, init_pop is disregarded
         if lhs:
             self.logger.info('LHS initialization')
-            init_pop = GA._lhs_init(par_names=[p.name for p in estpars],
-                                    bounds=[(p.lo, p.hi) for p in estpars],
+            init_pop = GA._lhs_init(space=self.space,
                                     samples=pop_size,
                                     criterion='c')
             self.logger.debug('Current population:\n{}'.format(str(init_pop)))
@@ -147,7 +224,7 @@ class GA(object):
                 'No initial population provided, one individual will be based '
                 'on the initial guess and the other will be random'
                 )
-            init_pop = pd.DataFrame({k: [est[k][0]] for k in est})
+            init_pop = self.space.to_df(self.space.init)
             self.logger.debug('Current population:\n{}'.format(str(init_pop)))
 
         # Take individuals from init_pop and add random individuals
@@ -160,25 +237,31 @@ class GA(object):
             if missing > 0:
                 self.logger.debug('Add missing individuals (random)...')
                 while missing > 0:
-                    init_pop = init_pop.append({
-                        key: random.random() * (est[key][2] - est[key][1])
-                        + est[key][1] for key in sorted(est.keys())
-                    }, ignore_index=True)
+                    values = self.space.decode(
+                        [random.random() for _ in self.space.names])
+                    init_pop = init_pop.append(
+                        dict(zip(self.space.names, values)),
+                        ignore_index=True)
                     missing -= 1
             self.logger.debug('Current population:\n{}'.format(str(init_pop)))
 
+        # Evaluator of the individuals (model, cache and worker pool)
+        self.evaluator = Evaluator(fmu_path, inp, known, ideal, self.space,
+                                   ftype=ftype, fmi_opts=fmi_opts,
+                                   cache=cache, workers=workers)
+
         # Initialize population
         self.logger.debug('Instantiate Population ')
-        self.pop = Population(fmu_path=fmu_path,
-                              pop_size=pop_size,
-                              inp=inp,
-                              known=known_df,
-                              est=estpars,
-                              ideal=ideal,
-                              init=True,
-                              opts=fmi_opts,
-                              ftype=ftype,
-                              init_pop=init_pop)
+        if engine == 'array' or steady_state:
+            pop_class = ArrayPopulation
+        else:
+            pop_class = Population
+        self.pop = pop_class(evaluator=self.evaluator,
+                             pop_size=pop_size,
+                             init=True,
+                             init_pop=init_pop,
+                             early_abort=early_abort,
+                             rungs=fidelity)
 
     def estimate(self):
         """
@@ -187,11 +270,17 @@ class GA(object):
 
         :return: DataFrame
         """
-        self.evolution()
+        try:
+            self.evolution()
+        finally:
+            self.evaluator.close()
         return self.get_estimates()
 
     def evolution(self):
 
+        if self.steady_state:
+            return self._steady_state_evolution()
+
         gen_count = 1
         err_decreasing = True
 
@@ -208,7 +297,10 @@ class GA(object):
         while (gen_count <= self.max_generations) and err_decreasing:
 
             # Evolve
-            self.pop = algorithm.evolve(self.pop)
+            if self.engine == 'array':
+                self.pop = array_algorithm.evolve(self.pop, self.config)
+            else:
+                self.pop = algorithm.evolve(self.pop, self.config)
 
             # Update results
             self._update_res(gen_count)
@@ -243,6 +335,59 @@ class GA(object):
         # Return
         return self.pop.get_fittest()
 
+    def _steady_state_evolution(self):
+        """
+        Steady-state evolution (see ``ga.steady_state``). The population
+        is saved after every ``pop_size`` evaluations (generation
+        equivalent), the error decrease is checked after each
+        evaluation over the last ``look_back * pop_size`` evaluations.
+        """
+        pop_size = self.pop.size()
+        max_evals = (self.max_generations - 1) * pop_size
+        look_back = self.look_back * pop_size
+
+        # Fittest error after each evaluation
+        fittest = [self.pop.get_fittest_error()]
+
+        # Generation 1 (initialized population)
+        self.logger.info('Generation 1')
+        self.logger.info(str(self.pop))
+        self._update_res(1)
+
+        def callback(pop, n_evals):
+            fittest.append(pop.get_fittest_error())
+            if n_evals % pop_size == 0:
+                self._update_res(n_evals // pop_size + 1)
+                self.logger.info('Generation {} ({} evaluations)'
+                                 .format(n_evals // pop_size + 1, n_evals))
+                self.logger.info(str(pop))
+
+            # Look back
+            if len(fittest) > look_back:
+                err_decrease = fittest[-look_back] - fittest[-1]
+                if err_decrease < self.tol:
+                    self.logger.info(
+                        'Error decrease smaller than tol: {0:.5f} < {1:.5f}'
+                        .format(err_decrease, self.tol))
+                    self.logger.info('Stopping evolution...')
+                    return True
+            return False
+
+        n_evals = steady_state.evolve(self.pop, max_evals,
+                                      replacement=self.replacement,
+                                      callback=callback,
+                                      config=self.config)
+        # Last (incomplete) generation equivalent
+        if n_evals % pop_size != 0:
+            self._update_res(n_evals // pop_size + 2)
+
+        # Print summary
+        self.logger.info('Number of evaluations: {}'.format(n_evals))
+        self.logger.info('FITTEST PARAMETERS:\n{}'
+                         .format(self.get_estimates()))
+
+        return self.pop.get_fittest()
+
     def get_estimates(self, as_dict=False):
         """
         Gets estimated parameters of the best (fittest) individual.
@@ -264,13 +409,36 @@ class GA(object):
         """
         return self.fittest_errors
 
+    def get_cache(self):
+        """
+        :return: EvalCache used by this instance
+        """
+        return self.pop.cache
+
     def get_sim_res(self):
         """
         Gets simulation result of the best individual.
 
         :return: DataFrame
         """
-        return self.pop.get_fittest().result.copy()
+        return self.pop.get_fittest().get_result().copy()
+
+    @property
+    def all_estim_and_err(self):
+        """
+        All estimates and errors from all individuals
+        (columns: parameters, '_error_', 'individual', '_iter_'
+        and '_fidelity_' if multi-fidelity evaluation is used).
+
+        :return: DataFrame
+        """
+        df = self.trajectory.to_df()
+        columns = [GA.ERR, Trajectory.INDIV, GA.ITER]
+        if self.trajectory.has_fidelity:
+            columns.append(Trajectory.FIDEL)
+        df = df[self.trajectory.par_names + columns]
+        df.index = np.zeros(len(df.index), dtype=int)
+        return df
 
     def get_full_solution_trajectory(self):
         """
@@ -281,14 +449,7 @@ class GA(object):
 
         :return: DataFrame
         """
-        df = self.all_estim_and_err.copy()
-        summary = pd.DataFrame()
-        for i in range(1, df[GA.ITER].max() + 1):
-            summary = summary.append(self._get_best_from_gen(i))
-
-        summary[GA.ITER] = summary[GA.ITER].astype(int)
-        summary = summary.set_index(GA.ITER)
-
+        summary = self.trajectory.get_best_df()
         summary[GA.METHOD] = GA.NAME
 
         return summary
@@ -370,10 +531,7 @@ class GA(object):
         :return: Axes
         """
         estimates = self.all_estim_and_err
-        pars = list(estimates.columns)
-        pars.remove('individual')
-        pars.remove(GA.ITER)
-        pars.remove(GA.ERR)
+        pars = list(self.trajectory.par_names)
         assert len(pars) > 0, 'No parameters found'
 
         fig, axes = plt.subplots(nrows=len(pars), sharex=True, squeeze=False)
@@ -410,42 +568,19 @@ class GA(object):
         return axes
 
     def _update_res(self, gen_count):
-        # Save estimates
-        generation_estimates = self.pop.get_all_estimates_and_errors()
-        generation_estimates[GA.ITER] = gen_count
-        self.all_estim_and_err = pd.concat([self.all_estim_and_err,
-                                           generation_estimates])
+        # Save estimates (with errors measured at lower fidelity,
+        # if multi-fidelity evaluation is used)
+        fidelity = self.pop.get_fidelity()
+        if fidelity is None:
+            self.trajectory.append(gen_count, self.pop.get_values(),
+                                   self.pop.get_population_errors())
+        else:
+            self.trajectory.append(gen_count, self.pop.get_values(),
+                                   fidelity[1], fidelity=fidelity[0])
 
         # Append error lists
         self.fittest_errors.append(self.pop.get_fittest_error())
 
-    def _get_best_from_gen(self, generation):
-        """
-        Gets fittest individuals (parameter sets) from the chosen generation.
-
-        :param generation: int (generation number)
-        :return: DataFrame
-        """
-        df = self.all_estim_and_err.copy()
-        df.index = df[GA.ITER]
-        # Select individuals with minimum error from the chosen individuals
-        fittest = (
-            df.loc[df[GA.ERR] == df.loc[generation][GA.ERR].min()]
-            .loc[generation]
-        )
-        # Check how many individuals found
-        if isinstance(fittest, pd.DataFrame):
-            # More than 1 found...
-            # Get the first one
-            fittest = fittest.iloc[0]
-        elif isinstance(fittest, pd.Series):
-            # Only 1 found...
-            pass
-        # Drop column 'individual'
-        fittest = fittest.drop('individual')
-
-        return fittest
-
     def _get_n_param(self):
         """
         Returns number of estimated parameters
@@ -455,32 +590,18 @@ class GA(object):
         return len(self.get_estimates())
 
     @staticmethod
-    def _lhs_init(par_names, bounds, samples, criterion='c'):
+    def _lhs_init(space, samples, criterion='c'):
         """
-        Returns LHS samples.
+        Returns LHS samples (drawn in the normalized space).
 
-        :param par_names: List of parameter names
-        :type par_names: list(str)
-        :param bounds: List of lower/upper bounds,
-                       must be of the same length as par_names
-        :type bounds: list(tuple(float, float))
+        :param ParameterSpace space: Estimated parameters
         :param int samples: Number of samples
         :param str criterion: A string that tells lhs how to sample the
                               points. See docs for pyDOE.lhs().
         :return: DataFrame
         """
-        lhs = doe.lhs(len(par_names), samples=samples, criterion='c')
-        par_vals = {}
-        for par, i in zip(par_names, range(len(par_names))):
-            par_min = bounds[i][0]
-            par_max = bounds[i][1]
-            par_vals[par] = lhs[:, i] * (par_max - par_min) + par_min
-
-        # Convert dict(str: np.ndarray) to pd.DataFrame
-        par_df = pd.DataFrame(columns=par_names, index=np.arange(samples))
-        for i in range(samples):
-            for p in par_names:
-                par_df.loc[i, p] = par_vals[p][i]
+        lhs = doe.lhs(len(space), samples=samples, criterion='c')
+        par_df = space.to_df(space.decode(lhs))
 
         logger = logging.getLogger(GA.__name__)
         logger.info('Initial guess based on LHS:\n{}'.format(par_df))
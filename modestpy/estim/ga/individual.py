@@ -13,30 +13,25 @@ from __future__ import print_function
 
 import logging
 import random
-import pandas as pd
 import numpy as np
 import copy
-from modestpy.estim.error import calc_err
 
 
 class Individual(object):
 
-    COM_POINTS = 500
-
-    def __init__(self, est_objects, population, genes=None,
-                 use_init_guess=False, ftype='NRMSE'):
+    def __init__(self, space, population, genes=None, values=None,
+                 ftype='NRMSE'):
         """
-        Individual can be initialized using `genes` OR initial guess
-        in `est_objects` (genes are inferred from parameters and vice versa).
+        Individual can be initialized using `genes` OR parameter
+        `values` (genes are inferred from parameters and vice versa).
         Otherwise, random genes are assumed.
 
-        :param est_objects: List of EstPar objects with estimated parameters
-        :type est_objects: list(EstPar)
+        :param ParameterSpace space: Estimated parameters
         :param Population population: Population instance
-        :param genes: Genes (can be also inferred from `parameters`)
+        :param genes: Genes (can be also inferred from `values`)
         :type genes: dict(str: float)
-        :param bool use_init_guess: If True, use initial guess from
-                                    `est_objects`
+        :param values: 1D array-like, parameter values (ordered as
+                       ``space.names``), e.g. the initial guess
         :param str ftype: Cost function type, 'RMSE' or 'NRMSE'
         """
 
@@ -52,28 +47,22 @@ class Individual(object):
         # Cost function type
         self.ftype = ftype
 
-        # Adjust COM_POINTS
-        # CVODE solver complains without "-1"
-        Individual.COM_POINTS = len(self.ideal) - 1
-
-        # Deep copy EstPar instances to avoid sharing between individuals
-        self.est_par_objects = copy.deepcopy(est_objects)
+        # Parameter space shared across the population
+        self.space = space
 
         # Generate genes
-        if not genes and not use_init_guess:
+        if not genes and values is None:
             # Generate random genes
-            est_names = Individual._get_names(self.est_par_objects)
-            self.genes = Individual._random_genes(est_names)
-        elif genes and not use_init_guess:
+            self.genes = Individual._random_genes(space.names)
+        elif genes and values is None:
             # Use provided genes
             self.genes = copy.deepcopy(genes)
-        elif use_init_guess and not genes:
+        elif values is not None and not genes:
             # Infer genes from parameters
-            self.genes = dict()
-            for p in self.est_par_objects:
-                self.genes[p.name] = (p.value - p.lo) / (p.hi - p.lo)
-                assert self.genes[p.name] >= 0. and self.genes[p.name] <= 1., \
-                    'Initial guess outside the bounds'
+            genes = space.encode(values)
+            assert np.all((genes >= 0.) & (genes <= 1.)), \
+                'Initial guess outside the bounds'
+            self.genes = dict(zip(space.names, genes.tolist()))
         else:
             msg = 'Either genes or parameters have to be None'
             self.logger.error(msg)
@@ -85,29 +74,41 @@ class Individual(object):
         # Individual result
         self.result = None
         self.error = None
+        # Selection error of individuals eliminated at a low-fidelity
+        # rung (they have no error, see Population.calculate())
+        self.ranking = None
 
     # Main methods ------------------------------
-    def calculate(self):
-        # Just in case, individual result and error
-        # are cleared before simulation
-        self.reset()
-        # Important to set estimated parameters just before simulation,
-        # because all individuals share the same model instance
-        self.model.set_param(self.est_par_df)
-        # Simulation
-        self.result = self.model.simulate(Individual.COM_POINTS)
-        # Make sure the returned result is not empty
-        assert self.result.empty is False, \
-            'Empty result returned from simulation... (?)'
-        # Calculate error
-        self.logger.debug("Calculating error ({}) in individual {}"
-                          .format(self.ftype, self.genes))
-        self.error = calc_err(self.result, self.ideal, ftype=self.ftype)
+    def get_result(self):
+        """
+        Returns simulation result. Individuals evaluated in worker
+        processes (or loaded from the persistent cache) have no result
+        stored, so the model is simulated again on request.
+
+        :return: DataFrame
+        """
+        if self.result is None:
+            self.model.set_param_values(self.est_par_names,
+                                        self.est_par_values)
+            self.result = self.model.simulate()
+        return self.result
 
     def reset(self):
         self.result = None
         self.error = None
-        self.est_par_objects = copy.deepcopy(self.est_par_objects)
+        self.ranking = None
+
+    def get_ranking_error(self):
+        """
+        Returns the error used by the selection (total error,
+        or ranking error if the individual was evaluated only
+        on a prefix of the learning period).
+
+        :return: float
+        """
+        if self.error is None:
+            return self.ranking
+        return self.error['tot']
 
     def set_gene(self, name, value):
         self.genes[name] = value
@@ -124,9 +125,7 @@ class Individual(object):
         :param as_dict: boolean (True to get dictionary instead DataFrame)
         :return: DataFrame with estimated parameters
         """
-        df = pd.DataFrame()
-        for par in self.est_par_objects:
-            df[par.name] = np.array([par.value])
+        df = self.space.to_df(self.est_par_values)
         if as_dict:
             return df.to_dict()
         else:
@@ -134,37 +133,21 @@ class Individual(object):
 
     def get_estimates_and_error(self):
         estimates = self.get_estimates()
-        estimates['_error_'] = self.error['tot']
+        estimates['_error_'] = self.error['tot'] \
+            if self.error is not None else np.inf
         return estimates
 
     def get_clone(self):
-        clone = Individual(self.est_par_objects, self.population,
+        clone = Individual(self.space, self.population,
                            self.genes, ftype=self.ftype)
         return clone
 
     # Private methods ---------------------------
     def _update_parameters(self):
-        # Calculate parameter values
-        self.est_par_objects = self._calc_parameters(self.genes)
-        # Convert estimated parameters to dataframe
-        self.est_par_df = Individual._est_pars_2_df(self.est_par_objects)
-
-    @staticmethod
-    def _est_pars_2_df(est_pars):
-        df = pd.DataFrame()
-        for p in est_pars:
-            df[p.name] = np.array([p.value])
-        return df
-
-    def _calc_parameters(self, genes):
-        """
-        Calculates parameters based on genes and limits.
-        :return: None
-        """
-        for par in self.est_par_objects:
-            gene = genes[par.name]
-            par.value = par.lo + gene * (par.hi - par.lo)
-        return self.est_par_objects
+        # Names and values passed to the model
+        self.est_par_names = self.space.names
+        self.est_par_values = self.space.decode(
+            [self.genes[p] for p in self.space.names])
 
     @staticmethod
     def _random_genes(par_names):
@@ -180,18 +163,11 @@ class Individual(object):
             genes[par] = g
         return genes
 
-    @staticmethod
-    def _get_names(est_params):
-        names = list()
-        for par in est_params:
-            names.append(par.name)
-        return names
-
     # Overriden methods --------------------------
     def __str__(self):
         s = 'Individual ('
-        for par in self.est_par_objects:
-            s += par.name + '={0:.3f}'.format(par.value)
+        for name, value in zip(self.est_par_names, self.est_par_values):
+            s += name + '={0:.3f}'.format(value)
             s += ', '
         # Delete trailing comma
         s = s[:-2]
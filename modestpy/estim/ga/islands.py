@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import multiprocessing
+import random
+import traceback
+import numpy as np
+import pandas as pd
+from modestpy.estim.ga import array_algorithm
+from modestpy.estim.ga.algorithm import EvolutionConfig
+from modestpy.estim.ga.array_population import ArrayPopulation
+from modestpy.estim.ga.ga import GA
+from modestpy.estim.evaluator import Evaluator
+from modestpy.estim.space import ParameterSpace
+from modestpy.estim.trajectory import Trajectory
+
+
+class IslandError(Exception):
+    """Exception raised in an island process."""
+    pass
+
+
+class Island(object):
+    """
+    Sub-population of the island model. Wraps a serial ``GA``
+    instance with the array population (own FMU instance).
+
+    The island has its own random state (seeded with ``seed``).
+    The GA draws random numbers from the global generators,
+    so the island state is swapped with the global state
+    while the island is initialized or evolved. The results
+    do not depend on the process running the island.
+    """
+
+    def __init__(self, ga_class, args, kwargs, migrants, seed):
+        """
+        :param ga_class: GA class
+        :param args: tuple, positional arguments of ``ga_class``
+        :param kwargs: dict, keyword arguments of ``ga_class``
+                       (including 'config', evolution settings)
+        :param int migrants: Number of emigrants per migration
+        :param int seed: Random number seed of the island
+        """
+        self.migrants = migrants
+        self.generation = 1
+        self.state = (random.Random(seed).getstate(),
+                      np.random.RandomState(seed).get_state())
+        self._swap_state()
+        try:
+            self.ga = ga_class(*args, **kwargs)
+        finally:
+            self._swap_state()
+
+    def snapshot(self):
+        """
+        :return: tuple (generation, values, errors) of the population
+        """
+        pop = self.ga.pop
+        return self.generation, pop.get_values(), pop.errors.copy()
+
+    def evolve(self, generations, immigrants=None):
+        """
+        Inserts ``immigrants`` and evolves the population
+        by ``generations`` generations.
+
+        :param int generations: Number of generations
+        :param immigrants: tuple (values, error dicts, aborted)
+                           or None
+        :return: tuple (list of snapshots, emigrants)
+        """
+        if immigrants is not None:
+            self.immigrate(*immigrants)
+        snapshots = list()
+        self._swap_state()
+        try:
+            for _ in range(generations):
+                self.ga.pop = array_algorithm.evolve(self.ga.pop,
+                                                     self.ga.config)
+                self.generation += 1
+                snapshots.append(self.snapshot())
+        finally:
+            self._swap_state()
+        return snapshots, self.emigrate()
+
+    def emigrate(self):
+        """
+        Returns copies of the fittest individuals.
+
+        :return: tuple (2D numpy array of values, list of error dicts,
+                 1D bool array - True if the error is not final)
+        """
+        pop = self.ga.pop
+        idx = np.argsort(pop.errors, kind='mergesort')[:self.migrants]
+        return pop.get_values()[idx], \
+            [dict(pop.error_dicts[i]) for i in idx], pop.aborted[idx]
+
+    def immigrate(self, values, error_dicts, aborted):
+        """
+        Each immigrant replaces the worst individual if it is better
+        (immigrants are not simulated again).
+
+        :param values: 2D numpy array [n, n_params]
+        :param error_dicts: list of error dicts
+        :param aborted: 1D bool array, True if the error is not final
+        :return: None
+        """
+        pop = self.ga.pop
+        genes = pop.space.encode(values)
+        for g, error, abort in zip(genes, error_dicts, aborted):
+            i = int(np.argmax(pop.errors))
+            if error['tot'] < pop.errors[i]:
+                pop.replace(i, g, None, error, abort)
+
+    def get_population(self):
+        """
+        :return: tuple (2D numpy array of values, list of error dicts,
+                 1D bool array - True if the error is not final)
+        """
+        pop = self.ga.pop
+        return pop.get_values(), [dict(e) for e in pop.error_dicts], \
+            pop.aborted.copy()
+
+    def close(self):
+        """
+        Frees the FMU instance.
+
+        :return: None
+        """
+        self.ga.pop.model.model.free()
+
+    def _swap_state(self):
+        """
+        Swaps the global random states with the island states
+        (called before and after the island draws random numbers).
+        """
+        state = (random.getstate(), np.random.get_state())
+        random.setstate(self.state[0])
+        np.random.set_state(self.state[1])
+        self.state = state
+
+
+def _run_island(conn, ga_class, args, kwargs, seed, migrants):
+    """
+    Island process. Commands received from ``conn``:
+    (generations, immigrants) - evolve, reply with snapshots
+    and emigrants; None - reply with the final population and exit.
+    Exceptions are sent back as ``IslandError``.
+    """
+    island = None
+    try:
+        island = Island(ga_class, args, kwargs, migrants, seed)
+        conn.send(island.snapshot())
+        while True:
+            cmd = conn.recv()
+            if cmd is None:
+                break
+            conn.send(island.evolve(*cmd))
+        conn.send(island.get_population())
+    except Exception:
+        conn.send(IslandError(traceback.format_exc()))
+    finally:
+        if island is not None:
+            island.close()
+        conn.close()
+
+
+class IslandModel(object):
+    """
+    Island model of the GA. Sub-populations (``Island``) evolve
+    independently, each in its own process with its own FMU
+    instance. After each ``evolve()`` call the fittest
+    individuals of each island migrate to the next island
+    in a ring (island k -> island k + 1), where they replace
+    the worst individuals in the following ``evolve()``.
+
+    If the current process cannot start child processes
+    (e.g. it is a worker of a pool), islands run in this process,
+    one after another. Each island keeps its own random state,
+    so the results are the same as with island processes.
+    """
+
+    def __init__(self, ga_class, args, kwargs, seeds, migrants=1):
+        """
+        :param ga_class: GA class
+        :param args: tuple, positional arguments of ``ga_class``
+        :param kwargs: dict, keyword arguments of ``ga_class``
+                       (serial GA with the array engine, evolution
+                       settings of all islands in 'config')
+        :param seeds: list of ints, random number seeds
+                      of the islands (one per island)
+        :param int migrants: Number of migrating individuals per island
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.n = len(seeds)
+        self.emigrants = [None] * self.n
+        self.conns = list()
+        self.procs = list()
+        self.islands = list()
+
+        if multiprocessing.current_process().daemon:
+            self.logger.info('Running {} islands in this process'
+                             .format(self.n))
+            self.islands = [Island(ga_class, args, kwargs, migrants, s)
+                            for s in seeds]
+            self.initial = [island.snapshot() for island in self.islands]
+        else:
+            self.logger.info('Starting {} island processes'.format(self.n))
+            try:
+                for s in seeds:
+                    conn, child_conn = multiprocessing.Pipe()
+                    proc = multiprocessing.Process(
+                        target=_run_island,
+                        args=(child_conn, ga_class, args, kwargs, s,
+                              migrants))
+                    proc.daemon = True
+                    proc.start()
+                    child_conn.close()
+                    self.conns.append(conn)
+                    self.procs.append(proc)
+                self.initial = self._recv_all()
+            except Exception:
+                self.close()
+                raise
+
+    def evolve(self, generations):
+        """
+        Evolves all islands by ``generations`` generations
+        (with immigrants from the previous migration).
+
+        :param int generations: Number of generations
+        :return: list (per island) of lists of snapshots
+                 (generation, values, errors)
+        """
+        immigrants = [self.emigrants[k - 1] for k in range(self.n)]
+        if self.islands:
+            replies = [island.evolve(generations, imm)
+                       for island, imm in zip(self.islands, immigrants)]
+        else:
+            for conn, imm in zip(self.conns, immigrants):
+                conn.send((generations, imm))
+            replies = self._recv_all()
+        self.emigrants = [r[1] for r in replies]
+        return [r[0] for r in replies]
+
+    def stop(self):
+        """
+        Stops the islands and returns their final populations.
+
+        :return: list of tuples (values, error dicts, aborted)
+        """
+        if self.islands:
+            populations = [island.get_population()
+                           for island in self.islands]
+        else:
+            for conn in self.conns:
+                conn.send(None)
+            populations = self._recv_all()
+        self.close()
+        return populations
+
+    def close(self):
+        """
+        Frees the islands (processes are joined or terminated).
+
+        :return: None
+        """
+        for island in self.islands:
+            island.close()
+        self.islands = list()
+        for conn in self.conns:
+            conn.close()
+        for proc in self.procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        self.conns = list()
+        self.procs = list()
+
+    def _recv_all(self):
+        replies = list()
+        for k, conn in enumerate(self.conns):
+            try:
+                reply = conn.recv()
+            except EOFError:
+                raise IslandError('Island {} terminated unexpectedly'
+                                  .format(k + 1))
+            if isinstance(reply, IslandError):
+                raise IslandError('Island {} failed:\n{}'
+                                  .format(k + 1, reply))
+            replies.append(reply)
+        return replies
+
+
+class IslandGA(GA):
+    """
+    Island model of the GA. Runs ``islands`` serial GAs with the array
+    population (``IslandModel``), each with ``pop_size`` individuals,
+    evolving in its own process (own FMU instance, serial evaluation,
+    own random seed drawn from ``numpy.random``). The best individuals
+    migrate along a ring of islands.
+
+    Results are accessed as in ``GA``. The fittest error
+    of a generation is the lowest error of all islands and the
+    population of this instance gets the final individuals
+    of all islands.
+    """
+
+    ISLAND = '_island_'
+
+    # Options of the island model (not accepted by GA)
+    OPTIONS = ('islands', 'migration', 'migrants')
+
+    def __init__(self, fmu_path, inp, known, est, ideal, islands=2,
+                 migration=5, migrants=1, maxiter=100, tol=0.001,
+                 look_back=10, pop_size=40, uniformity=0.5, mut=0.05,
+                 mut_inc=0.3, trm_size=6, fmi_opts=None, ftype='RMSE',
+                 cache=None, history_dir=None, **kwargs):
+        """
+        The populations are created by the islands, so ``GA.__init__``
+        is not called.
+
+        :param int islands: Number of islands
+        :param int migration: Number of generations between migrations
+                              (``look_back`` is also checked
+                              at migrations only)
+        :param int migrants: Number of individuals migrating
+                             from each island
+        :param EvalCache cache: Evaluation cache of the final population
+                                (islands use private caches)
+        :param str history_dir: See ``GA``, used by this instance only
+        :param kwargs: Other options of the island GAs (see ``GA``),
+                       'workers' and 'engine' are not used,
+                       steady-state evolution and multi-fidelity
+                       evaluation are not supported
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+        self.logger.info('IslandGA constructor invoked')
+
+        assert inp.index.equals(ideal.index), \
+            'inp and ideal indexes are not matching'
+        assert islands >= 1, 'Number of islands must be at least 1'
+        assert migration >= 1, 'Migration interval must be at least 1'
+        assert 1 <= migrants <= pop_size, \
+            'Number of migrants must be between 1 and pop_size'
+        assert not kwargs.get('steady_state', False), \
+            'Steady-state evolution is not supported by the island model'
+        assert kwargs.get('fidelity') is None, \
+            'Multi-fidelity evaluation is not supported by the island model'
+
+        # Evolution parameters of all islands (other settings
+        # can be changed in self.config before estimate())
+        self.config = EvolutionConfig(uniform_rate=uniformity,
+                                      mut_rate=mut,
+                                      mut_rate_inc=mut_inc,
+                                      tournament_size=trm_size)
+
+        self.islands = int(islands)
+        self.migration = int(migration)
+        self.migrants = int(migrants)
+        self.max_generations = maxiter
+        self.tol = tol
+        self.look_back = look_back
+
+        # History of fittest errors from each generation (list of floats)
+        self.fittest_errors = list()
+
+        # Estimated parameters (genes ordered by name)
+        self.space = ParameterSpace.from_est(est, sort=True)
+
+        # History of all estimates and errors from all islands
+        # (individuals of all islands are numbered consecutively)
+        self.trajectory = Trajectory(self.space.names,
+                                     spill_dir=history_dir)
+        self.island_trajectories = [Trajectory(self.space.names)
+                                    for _ in range(self.islands)]
+
+        # Serial GA of each island
+        self.island_args = (fmu_path, inp, known, est, ideal)
+        self.island_kwargs = dict(kwargs, maxiter=maxiter, tol=tol,
+                                  look_back=look_back, pop_size=pop_size,
+                                  fmi_opts=fmi_opts, ftype=ftype,
+                                  workers=1, engine='array')
+        self.island_seeds = np.random.randint(0, 2**31 - 1,
+                                              size=self.islands).tolist()
+        self.logger.info('Island model: {} islands, {} individuals each'
+                         .format(self.islands, pop_size))
+
+        # Final individuals of all islands (see evolution())
+        self.evaluator = Evaluator(fmu_path, inp, known, ideal, self.space,
+                                   ftype=ftype, fmi_opts=fmi_opts,
+                                   cache=cache)
+        self.pop = ArrayPopulation(evaluator=self.evaluator,
+                                   pop_size=self.islands * pop_size,
+                                   init=False)
+
+    def evolution(self):
+        """
+        The islands evolve ``migration`` generations between migrations.
+        """
+        model = IslandModel(GA, self.island_args,
+                            dict(self.island_kwargs, config=self.config),
+                            self.island_seeds, self.migrants)
+        try:
+            # Generation 1 (initialized populations)
+            self._update_islands([[snapshot] for snapshot in model.initial])
+            self.logger.info('Generation 1: fittest error = {}'
+                             .format(self.fittest_errors[-1]))
+            gen_count = 1
+
+            while gen_count < self.max_generations:
+                generations = min(self.migration,
+                                  self.max_generations - gen_count)
+                self._update_islands(model.evolve(generations))
+                gen_count += generations
+                self.logger.info('Generation {}: fittest error = {}'
+                                 .format(gen_count, self.fittest_errors[-1]))
+
+                # Look back
+                if len(self.fittest_errors) > self.look_back:
+                    err_past = self.fittest_errors[-self.look_back]
+                    err_now = self.fittest_errors[-1]
+                    err_decrease = err_past - err_now
+                    if err_decrease < self.tol:
+                        self.logger.info(
+                            'Error decrease smaller than tol: '
+                            '{0:.5f} < {1:.5f}'.format(err_decrease, self.tol))
+                        self.logger.info('Stopping evolution...')
+                        break
+
+            populations = model.stop()
+        finally:
+            model.close()
+
+        # Final individuals of all islands
+        i = 0
+        for values, error_dicts, aborted in populations:
+            for x, error, abort in zip(values, error_dicts, aborted):
+                if not abort:
+                    self.pop.cache.put(self.space.names, x, None, error)
+                self.pop.replace(i, self.space.encode(x), None, error, abort)
+                i += 1
+
+        # Print summary
+        self.logger.info('FITTEST PARAMETERS:\n{}'
+                         .format(self.get_estimates()))
+
+        return self.pop.get_fittest()
+
+    def _update_islands(self, snapshots):
+        """
+        Saves the populations of all islands.
+
+        :param snapshots: list (per island) of lists of tuples
+                          (generation, values, errors)
+        """
+        for generation in zip(*snapshots):
+            fittest = np.inf
+            for k, (gen_count, values, errors) in enumerate(generation):
+                n = errors.size
+                self.island_trajectories[k].append(gen_count, values, errors)
+                self.trajectory.append(gen_count, values, errors,
+                                       individuals=np.arange(k * n + 1,
+                                                             (k + 1) * n + 1))
+                fittest = min(fittest, float(errors.min()))
+            self.fittest_errors.append(fittest)
+
+    @property
+    def all_estim_and_err(self):
+        """
+        All estimates and errors from all individuals of all islands
+        (see ``GA.all_estim_and_err``), with the island number
+        in column '_island_'.
+
+        :return: DataFrame
+        """
+        df = super(IslandGA, self).all_estim_and_err
+        island_size = self.pop.size() // self.islands
+        df[IslandGA.ISLAND] = (df[Trajectory.INDIV] - 1) // island_size + 1
+        return df
+
+    def get_full_solution_trajectory(self, islands=False):
+        """
+        Returns the fittest individual of all islands for each
+        generation (see ``GA.get_full_solution_trajectory()``).
+        If ``islands`` is True, the trajectories of all islands
+        are returned instead (one after another, island number
+        in column '_island_').
+
+        :param bool islands: If True, returns per-island trajectories
+        :return: DataFrame
+        """
+        if not islands:
+            return super(IslandGA, self).get_full_solution_trajectory()
+
+        summaries = list()
+        for k, trajectory in enumerate(self.island_trajectories):
+            summary = trajectory.get_best_df()
+            summary[GA.METHOD] = GA.NAME
+            summary[IslandGA.ISLAND] = k + 1
+            summaries.append(summary)
+        return pd.concat(summaries)
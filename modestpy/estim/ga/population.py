@@ -13,27 +13,29 @@ from __future__ import print_function
 
 import logging
 from modestpy.estim.ga.individual import Individual
-from modestpy.estim.model import Model
+from modestpy.estim.ga import fidelity
 import pandas as pd
+import numpy as np
 import copy
 
 
 class Population(object):
 
-    def __init__(self, fmu_path, pop_size, inp, known, est, ideal,
-                 init=True, opts=None, ftype='NRMSE', init_pop=None):
+    def __init__(self, evaluator, pop_size, init=True, init_pop=None,
+                 early_abort=False, rungs=None):
         """
-        :param fmu_path: string
+        :param Evaluator evaluator: Evaluator of the individuals
+                                    (model, cache and worker pool),
+                                    shared by offspring populations
         :param pop_size: int
-        :param inp: DataFrame
-        :param known: DataFrame
-        :param est: List of EstPar objects
-        :param ideal: DataFrame
         :param init: bool
-        :param dict opts: Additional FMI options to be passed to the simulator
-        :param string ftype: Cost function type. Currently 'NRMSE' or 'RMSE'.
         :param DataFrame init_pop: Initial population, DataFrame with initial
                                    guesses for estimated parameters
+        :param bool early_abort: If True, simulations of the offspring
+                                 are aborted when their error certainly
+                                 exceeds ``get_abort_threshold()``
+        :param rungs: list of (fraction, ratio) tuples, low-fidelity
+                      rungs (see ``ga.fidelity``), optional
         """
         self.logger = logging.getLogger(type(self).__name__)
 
@@ -41,47 +43,107 @@ class Population(object):
         self.individuals = list()
 
         # Assign attributes
-        self.fmu_path = fmu_path
+        self.evaluator = evaluator
         self.pop_size = pop_size
-        self.inputs = inp
-        self.known_pars = known
-        self.estpar = est
-        self.outputs = [var for var in ideal]
-        self.ideal = ideal
-        self.ftype = ftype
-
-        # Instantiate model
-        self.model = None
+        self.inputs = evaluator.inputs
+        self.space = evaluator.space
+        self.outputs = evaluator.outputs
+        self.ideal = evaluator.ideal
+        self.ftype = evaluator.err_ctx.ftype
+        self.model = evaluator.model
+        self.cache = evaluator.cache
+        self.pool = evaluator.pool
+        self.early_abort = early_abort
+        self.rungs = fidelity.check_rungs(rungs) if rungs else None
+
+        # Fidelity of the errors (see get_fidelity())
+        self.fidelity = None
+        self.measured = None
 
         if init:
-            # Instiate individuals before initialization
-            self.instantiate_model(opts=opts)
             self._initialize(init_pop)
             self.calculate()
 
-    def instantiate_model(self, opts):
-        self.model = Model(self.fmu_path)
-        self.model.set_input(self.inputs)
-        self.model.set_param(self.known_pars)
-        self.model.set_outputs(self.outputs)
-
     def add_individual(self, indiv):
         assert isinstance(indiv, Individual), \
             'Only Individual instances allowed...'
         indiv.reset()
         self.individuals.append(indiv)
 
-    def calculate(self):
-        for i in self.individuals:
-            i.calculate()
+    def calculate(self, threshold=None):
+        """
+        Calculates errors of all individuals with the evaluator
+        (see ``Evaluator.evaluate_batch()``). Simulations certainly
+        worse than ``threshold`` (if given) are aborted.
+
+        With ``rungs``, uncached individuals are first evaluated
+        on prefixes of the learning period and only the best ones
+        are simulated over the full period (see ``ga.fidelity``).
+        The eliminated individuals have no error (None), they are
+        ranked in the selection by ``Individual.ranking``.
+
+        :param threshold: float, error threshold, optional
+        :return: None
+        """
+        self.fidelity = np.ones(len(self.individuals))
+        self.measured = None
+
+        results, errors, _, eliminated = self.evaluator.evaluate_batch(
+            self.get_values(), threshold, self.rungs)
+        for ind, result, error in zip(self.individuals, results, errors):
+            ind.reset()
+            ind.result = result
+            ind.error = error
+
+        if eliminated:
+            self.measured = np.array([i.error['tot'] if i.error is not None
+                                      else np.nan for i in self.individuals])
+            full = [i.error['tot'] for i in self.individuals
+                    if i.error is not None]
+            for rows, fraction, prefix, ranking in \
+                    fidelity.get_ranking_errors(full, eliminated):
+                for j, n in enumerate(rows):
+                    self.individuals[n].ranking = ranking[j]
+                    self.measured[n] = prefix[j]
+                    self.fidelity[n] = fraction
+
+    def get_fidelity(self):
+        """
+        Returns fidelity (prefix fraction, 1 = full period) and error
+        measured at this fidelity for each individual, or None if
+        all individuals were evaluated over the full period.
+
+        :return: tuple(1D numpy array, 1D numpy array) or None
+        """
+        if self.measured is None:
+            return None
+        return self.fidelity.copy(), self.measured.copy()
+
+    def get_abort_threshold(self):
+        """
+        Returns the error threshold used to abort simulations
+        of the offspring of this population (the worst
+        full-fidelity error,
+        offspring worse than all parents are unlikely to be selected)
+        or None if ``early_abort`` is disabled.
+
+        :return: float or None
+        """
+        if not self.early_abort:
+            return None
+        return max(i.error['tot'] for i in self.individuals
+                   if i.error is not None)
 
     def size(self):
         return self.pop_size
 
     def get_fittest(self):
-        fittest = self.individuals[0]
+        # Individuals evaluated only on a prefix are skipped
+        fittest = None
         for ind in self.individuals:
-            if ind.error['tot'] < fittest.error['tot']:
+            if ind.error is not None and \
+                    (fittest is None or
+                     ind.error['tot'] < fittest.error['tot']):
                 fittest = ind
         fittest = copy.copy(fittest)
         return fittest
@@ -92,9 +154,17 @@ class Population(object):
     def get_population_errors(self):
         err = list()
         for i in self.individuals:
-            err.append(i.error['tot'])
+            err.append(i.error['tot'] if i.error is not None else np.inf)
         return err
 
+    def get_values(self):
+        """
+        Returns parameter values of all individuals.
+
+        :return: 2D numpy array [pop_size, n_params]
+        """
+        return np.array([i.est_par_values for i in self.individuals])
+
     def get_fittest_estimates(self):
         return self.get_fittest().get_estimates()
 
@@ -108,9 +178,9 @@ class Population(object):
             i += 1
         return all_estim
 
-    def get_estpars(self):
-        """Returns EstPar list"""
-        return self.estpar
+    def get_space(self):
+        """Returns ParameterSpace"""
+        return self.space
 
     def _initialize(self, init_pop=None):
         self.logger.debug('Initialize population with init_pop=\n{}'
@@ -128,21 +198,17 @@ class Population(object):
             init_guess = False
 
         for i in range(self.pop_size):
-            # --------------------------------------------------> BUG HERE
+            values = None
             if init_guess:
-                # Update value in EstPar objects with the next initial guess
-                for n in range(len(self.estpar)):
-                    self.estpar[n].value = \
-                        init_pop.loc[i, self.estpar[n].name]
-                    self.logger.debug(
-                        'Individual #{} <- {}'
-                        .format(i, self.estpar[n]))
+                # Next initial guess
+                values = np.array(init_pop.loc[i, list(self.space.names)]
+                                  .values, dtype=np.float64)
+                self.logger.debug('Individual #{} <- {}'.format(i, values))
 
             self.add_individual(
-                Individual(est_objects=self.estpar, population=self,
-                           ftype=self.ftype, use_init_guess=init_guess)
+                Individual(space=self.space, population=self,
+                           ftype=self.ftype, values=values)
                 )
-            # <-------------------------------------------------- BUG HERE
 
     def __str__(self):
         fittest = self.get_fittest()
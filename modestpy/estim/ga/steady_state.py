@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import logging
+import numpy as np
+from modestpy.estim.ga import algorithm
+from modestpy.estim.ga import array_algorithm
+
+logger = logging.getLogger('ga.steady_state')
+
+# Replacement policies
+WORST = 'worst'
+TOURNAMENT = 'tournament'
+REPLACEMENTS = (WORST, TOURNAMENT)
+
+
+def evolve(pop, max_evals, replacement=WORST, callback=None, config=None):
+    """
+    Steady-state evolution of the array population
+    (``ArrayPopulation``), evolved in place.
+
+    There is no generation barrier. A child is bred as soon as
+    a worker is free and, when its error is known, it replaces
+    the worst individual ('worst') or the loser of a tournament
+    ('tournament') if it is better. Up to ``pool.workers``
+    children are evaluated at the same time (one at a time
+    without a pool), so the workers do not wait for the slowest
+    simulation of a generation. Individuals are replaced only
+    by better ones, so the fittest individual is preserved.
+
+    Children are bred with the operators of ``array_algorithm``.
+    Cached children are not simulated. Children still evaluated
+    when the evolution stops are waited for and only cached.
+
+    :param pop: ArrayPopulation (calculated)
+    :param int max_evals: Maximum number of evaluated children
+    :param str replacement: 'worst' or 'tournament'
+    :param callback: function(pop, n_evals) called after each
+                     evaluation, evolution stops if it returns True
+    :param EvolutionConfig config: Evolution settings
+                                   (defaults if None)
+    :return: int, number of evaluated children
+    """
+    assert replacement in REPLACEMENTS, \
+        "Unknown replacement '{}', use one of {}" \
+        .format(replacement, REPLACEMENTS)
+    if config is None:
+        config = algorithm.EvolutionConfig()
+
+    workers = pop.pool.workers if pop.pool is not None else 1
+    running = dict()  # tag -> (genes, values) of children in the pool
+    ready = list()  # Evaluated children, see _wait()
+    tags = itertools.count()
+    n_evals = 0
+
+    while n_evals < max_evals:
+        # Keep all workers busy
+        while len(running) + len(ready) < workers and \
+                n_evals + len(running) + len(ready) < max_evals:
+            child = breed(pop.genes, pop.ranking, config)
+            _submit(pop, child, next(tags), running, ready)
+
+        genes, values, result, error, aborted, simulated = \
+            _wait(pop, running, ready)
+        n_evals += 1
+        if simulated and not aborted:
+            pop.cache.put(pop.names, values, result, error)
+
+        i = _replace(pop, genes, result, error, aborted, replacement,
+                     config.tournament_size)
+        if i is not None:
+            logger.debug('Individual {} replaced, err={:.4f}'
+                         .format(i, error['tot']))
+
+        if callback is not None and callback(pop, n_evals):
+            break
+
+    # Children still running are not inserted, but cached
+    while running:
+        genes, values, result, error, aborted, simulated = \
+            _wait(pop, running, list())
+        if not aborted:
+            pop.cache.put(pop.names, values, result, error)
+
+    return n_evals
+
+
+def breed(genes, errors, config):
+    """
+    Returns genes of one child of the population (tournament
+    selection, uniform crossover and mutation, with the same
+    operators as ``array_algorithm.evolve()``).
+
+    :param genes: 2D numpy array [n, n_params], genes (0-1)
+    :param errors: 1D numpy array [n], errors of the individuals
+    :param EvolutionConfig config: Evolution settings
+    :return: 1D numpy array [n_params]
+    """
+    parents = array_algorithm.tournament_selection(
+        errors, 2, config.tournament_size)
+    child = array_algorithm.crossover(genes[parents[:1]],
+                                      genes[parents[1:]],
+                                      config.uniform_rate)
+    diverse = array_algorithm.is_population_diverse(genes,
+                                                    config.diversity_lim)
+    return array_algorithm.mutate(child, diverse, config)[0]
+
+
+def _submit(pop, genes, tag, running, ready):
+    """
+    Starts the evaluation of a child. Cached children and children
+    evaluated without a pool are evaluated immediately (appended
+    to ``ready``), the others are submitted to the pool (added
+    to ``running``). Simulations certainly worse than the worst
+    individual are aborted if ``early_abort`` is enabled (such
+    children are never inserted).
+
+    :param genes: 1D numpy array, genes of the child
+    :param int tag: Unique tag of the child
+    :param dict running: tag -> (genes, values)
+    :param list ready: list of evaluated children (see ``_wait()``)
+    :return: None
+    """
+    values = pop.space.decode(genes)
+    cached = pop.cache.get(pop.names, values)
+    if cached is not None:
+        ready.append((genes, values) + cached + (False, False))
+        return
+
+    threshold = pop.get_abort_threshold()
+    if pop.pool is None:
+        results, errors, aborted = pop.evaluator.simulate(
+            values[np.newaxis], threshold)
+        ready.append((genes, values, results[0], errors[0], aborted[0],
+                      True))
+        return
+
+    pop.pool.submit(pop.names, values[np.newaxis], threshold, tag)
+    running[tag] = (genes, values)
+
+
+def _wait(pop, running, ready):
+    """
+    Returns the first child in ``ready`` or waits for any child
+    in ``running`` to be evaluated by the pool (exceptions raised
+    in the workers are raised here).
+
+    :return: tuple (genes, values, result, error, aborted, simulated)
+    """
+    if ready:
+        return ready.pop(0)
+    tag, (errors, aborted) = pop.pool.wait()
+    genes, values = running.pop(tag)
+    return genes, values, None, errors[0], aborted[0], True
+
+
+def _replace(pop, genes, result, error, aborted, replacement,
+             tournament_size):
+    """
+    Replaces the worst individual or the loser of a tournament
+    with the child if the child is better.
+
+    :return: int, index of the replaced individual or None
+    """
+    if replacement == WORST:
+        i = int(np.argmax(pop.errors))
+    else:
+        draws = np.random.randint(0, pop.errors.size,
+                                  size=tournament_size)
+        i = int(draws[np.argmax(pop.errors[draws])])
+
+    if error['tot'] < pop.errors[i]:
+        pop.replace(i, genes, result, error, aborted)
+        return i
+    return None
@@ -13,8 +13,10 @@ from __future__ import print_function
 
 import os
 import logging
+import numpy as np
 
 from modestpy.fmi.model import Model as FmiModel
+from modestpy.fmi.pool import ModelPool
 
 # PyFmi log level (controls the amount of information saved to the log file)
 # (watch out for the file writing overhead)
@@ -33,11 +35,21 @@ VERBOSE = True
 
 class Model(object):
     """ Model for static parameter estimation """
-    def __init__(self, fmu_path, opts=None):
+    def __init__(self, fmu_path, opts=None, workers=None):
+        """
+        :param fmu_path: string, path to the FMU
+        :param opts: dict, FMI options
+        :param workers: int, number of worker processes used
+                        in ``simulate_batch()`` (None = no pool)
+        """
         self.logger = logging.getLogger(type(self).__name__)
 
         self.model = FmiModel(fmu_path, opts=opts)
 
+        # Worker pool (started on the first batch)
+        self.workers = workers
+        self.pool = None
+
         # # Log level
         # try:
         #     self.model.model.set_log_level(FMI_WARNING)
@@ -56,6 +68,7 @@ class Model(object):
         :return: None
         """
         self.model.inputs_from_df(df, exclude)
+        self.close_pool()
 
     def set_param(self, df):
         """ Sets parameters. It is possible to set only a subset of model parameters.
@@ -65,6 +78,28 @@ class Model(object):
         """
         self.model.parameters_from_df(df)
 
+    def set_param_values(self, names, values):
+        """ Sets parameters given as a sequence of names and an array
+        of values. Faster than ``set_param()``, no DataFrame is needed.
+
+        :param names: tuple/list of strings
+        :param values: 1D array-like
+        :return: None
+        """
+        self.model.parameters_from_array(names, values)
+
+    def set_checkpoint(self, time, parameters=()):
+        """ Enables FMU state checkpointing at ``time``. Simulations
+        restart from the saved state as long as only ``parameters``
+        change (see ``modestpy.fmi.model.Model.set_checkpoint()``).
+
+        :param time: float, checkpoint time in seconds
+        :param parameters: list of strings, tunable parameters
+                           estimated after the checkpoint
+        :return: None
+        """
+        self.model.set_checkpoint(time, parameters)
+
     def set_outputs(self, outputs):
         """ Sets output variables.
 
@@ -72,12 +107,65 @@ class Model(object):
         :return: None
         """
         self.model.specify_outputs(outputs)
+        self.close_pool()
 
-    def simulate(self, com_points=None):
-        # TODO: com_points should be adjusted to the number of samples
+    def set_output_grid(self, grid):
+        """ Sets output time points, e.g. the index of the ideal
+        solution (or a decimated version of it). Used in simulations
+        without ``com_points``.
+
+        :param grid: 1D array-like, time points in seconds
+        :return: None
+        """
+        self.model.set_output_grid(grid)
+        self.close_pool()
+
+    def simulate(self, com_points=None, monitor=None):
         self.sim_count += 1
         self.info('Simulation count = ' + str(self.sim_count))
-        return self.model.simulate(com_points=com_points)
+        return self.model.simulate(com_points=com_points, monitor=monitor)
+
+    def simulate_batch(self, names, params, com_points=None, monitors=None):
+        """ Simulates the model for each row of ``params``.
+        Uses the worker pool if ``workers`` was given
+        (and no ``monitors`` are used).
+
+        :param names: tuple/list of strings, parameter names
+        :param params: 2D array [n_candidates, n_params]
+        :param com_points: float, output interval
+                           (output grid is used if None)
+        :param monitors: list of ErrorMonitor (one per row), optional
+        :return: 3D numpy array [n_candidates, n_times, n_outputs]
+        """
+        params = np.atleast_2d(params)
+        self.sim_count += params.shape[0]
+        self.info('Simulation count = ' + str(self.sim_count))
+        if monitors is not None:
+            # Monitors are called in this process
+            return self.model.simulate_batch(names, params, com_points,
+                                             monitors=monitors)
+        if self.workers and self.workers > 1 and self.pool is None:
+            self.pool = ModelPool(self.model, self.workers)
+        return self.model.simulate_batch(names, params, com_points,
+                                         pool=self.pool)
+
+    def get_output_grid(self, com_points=None):
+        """ Returns output time points of ``simulate_batch()``.
+
+        :param com_points: float, output interval
+                           (output grid is used if None)
+        :return: 1D numpy array
+        """
+        return self.model.get_output_grid(com_points)
+
+    def close_pool(self):
+        """ Stops the worker pool (if started).
+
+        :return: None
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
 
     def info(self, txt):
         class_name = self.__class__.__name__
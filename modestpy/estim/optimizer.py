@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import os
+import numpy as np
+import pandas as pd
+from modestpy.estim.evaluator import Evaluator
+from modestpy.estim.space import ParameterSpace
+from modestpy.estim.trajectory import Trajectory
+import modestpy.estim.plots as plots
+import modestpy.utilities.figures as figures
+
+
+class Optimizer(object):
+    """
+    Base class of ask/tell optimization strategies.
+
+    A strategy proposes parameter sets with ``ask()`` and receives
+    their errors with ``tell()``. It does not simulate the model,
+    the evaluation (batching, worker pool, caching) is done by
+    ``estim.evaluator.Evaluator`` (see ``minimize()``).
+    The iterates are saved in ``self.trajectory``.
+
+    Subclasses are accepted by ``Estimation.method_dict`` (method
+    options are passed to the constructor as keyword arguments).
+    Strategies working in the normalized space use ``space.encode()``
+    and ``space.decode()``.
+    """
+
+    NAME = 'OPT'
+
+    def __init__(self, space):
+        """
+        :param ParameterSpace space: Estimated parameters,
+                                     ``space.init`` is the initial guess
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.space = space
+        self.names = space.names
+        self.x0 = space.init.copy()
+
+        # Best point told so far
+        self.best_x = self.x0.copy()
+        self.best_err = np.inf
+
+        # Iterates
+        self.trajectory = Trajectory(self.names)
+
+    def ask(self):
+        """
+        Returns parameter sets to be evaluated next.
+        An empty array means the strategy has nothing to ask.
+
+        :return: 2D numpy array [k, n_params]
+        """
+        raise NotImplementedError
+
+    def tell(self, X, errors):
+        """
+        Passes the errors of parameter sets returned by ``ask()``.
+
+        :param X: 2D numpy array [k, n_params]
+        :param errors: 1D numpy array [k]
+        :return: None
+        """
+        raise NotImplementedError
+
+    def done(self):
+        """
+        :return: bool, True if the stopping criterion is met
+        """
+        return False
+
+    def get_threshold(self):
+        """
+        Returns the error threshold above which the evaluation
+        of the last asked points can be aborted, or None.
+
+        :return: float or None
+        """
+        return None
+
+    def get_estimates(self):
+        """
+        :return: 1D numpy array, final estimates
+        """
+        return self.best_x.copy()
+
+    def close(self):
+        """
+        Releases resources held by the strategy.
+
+        :return: None
+        """
+        pass
+
+    def _update_best(self, X, errors):
+        """
+        Updates the best point with the told points (the first
+        one is taken if many have the same error).
+        """
+        i = int(np.argmin(errors))
+        if errors[i] < self.best_err:
+            self.best_x = np.array(X[i], dtype=np.float64)
+            self.best_err = float(errors[i])
+
+
+def minimize(optimizer, evaluator):
+    """
+    Runs the ask/tell loop of ``optimizer`` until the strategy
+    is done or the evaluation budget is used up.
+
+    :param Optimizer optimizer: Strategy
+    :param Evaluator evaluator: Evaluator
+    :return: 1D numpy array, final estimates
+    """
+    try:
+        while not optimizer.done() and not evaluator.exhausted():
+            X = optimizer.ask()
+            if len(X) == 0:
+                break
+            errors = evaluator.evaluate(X, optimizer.get_threshold(),
+                                        method=optimizer.NAME)
+            optimizer.tell(X, errors)
+    finally:
+        optimizer.close()
+    return optimizer.get_estimates()
+
+
+class OptimizerMethod(object):
+    """
+    Estimation method running an ask/tell strategy
+    (``Optimizer`` subclass) with its own ``Evaluator``.
+    Provides the interface of the methods in ``estim``
+    (estimates, trajectory, errors and plots).
+    """
+    # Ploting settings
+    FIG_DPI = 150
+    FIG_SIZE = (10, 6)
+
+    METHOD = '_method_'
+    ITER = '_iter_'
+    ERR = '_error_'
+
+    def __init__(self, fmu_path, inp, known, est, ideal, optimizer,
+                 fmi_opts=None, ftype='RMSE', cache=None, workers=1,
+                 max_evals=None, **opts):
+        """
+        :param fmu_path: string, absolute path to the FMU
+        :param inp: DataFrame, columns with input timeseries, index in seconds
+        :param known: Dictionary, key=parameter_name, value=value
+        :param est: Dictionary, key=parameter_name, value=tuple
+                    (guess value, lo limit, hi limit[, scale]), guess
+                    can be None, scale is 'linear' (default) or 'log'
+        :param ideal: DataFrame, ideal solution to be compared
+                      with model outputs (variable names must match)
+        :param optimizer: Optimizer subclass
+        :param dict fmi_opts: Additional FMI options
+        :param string ftype: Cost function type. Currently 'NRMSE' or 'RMSE'
+        :param EvalCache cache: Evaluation cache, can be shared with other
+                                methods using the same data. If None,
+                                a private cache is used.
+        :param int workers: Number of worker processes used to evaluate
+                            the asked parameter sets
+        :param int max_evals: Maximum number of evaluations, optional
+        :param opts: Options passed to ``optimizer``
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        # Estimated parameters (random guess if None)
+        self.space = ParameterSpace.from_est(est)
+
+        self.evaluator = Evaluator(fmu_path, inp, known, ideal, self.space,
+                                   ftype=ftype, fmi_opts=fmi_opts,
+                                   cache=cache, workers=workers,
+                                   max_evals=max_evals)
+        self.optimizer = optimizer(self.space, **opts)
+        self.name = self.optimizer.NAME
+
+        self.ideal = ideal
+        self.inputs = inp
+        self.ftype = ftype
+        self.model = self.evaluator.model
+        self.err_ctx = self.evaluator.err_ctx
+        self.cache = self.evaluator.cache
+
+        # Outputs
+        self.summary = pd.DataFrame()
+        self.estimates = None
+
+        self.logger.info('{} initialized... ========================='
+                         .format(self.name))
+
+    def estimate(self):
+        """
+        Runs the strategy and returns the estimates.
+
+        :return: DataFrame
+        """
+        try:
+            self.estimates = minimize(self.optimizer, self.evaluator)
+        finally:
+            self.evaluator.close()
+
+        # Summary (parameters, error and method name)
+        summary = self.optimizer.trajectory.get_best_df()
+        # Start iterations from 1
+        summary.index += 1
+        self.summary = summary
+
+        self.logger.info('Number of evaluations: {}'
+                         .format(self.evaluator.n_evals))
+        self.logger.info('Summary:\n{}'.format(summary))
+
+        return self.space.to_df(self.estimates)
+
+    def get_error(self):
+        """
+        :return: float, last error
+        """
+        return float(self.summary[self.ERR].iloc[-1])
+
+    def get_errors(self):
+        """
+        :return: list, all errors from all iterations
+        """
+        return self.summary[self.ERR].tolist()
+
+    def get_full_solution_trajectory(self):
+        """
+        Returns all parameters and errors from all iterations.
+        The returned DataFrame contains columns with parameter names,
+        additional column '_error_' for the error and the index
+        named '_iter_'.
+
+        :return: DataFrame
+        """
+        return self.summary
+
+    def get_sim_res(self):
+        """
+        Returns simulation result of the estimates.
+
+        :return: DataFrame
+        """
+        return self.evaluator.get_result(self.estimates)
+
+    def get_plots(self):
+        """
+        Returns a list with important plots produced by this estimation method.
+        Each list element is a dictionary with keys 'name' and 'axes'. The name
+        should be given as a string, while axes as matplotlib.Axes instance.
+
+        :return: list(dict)
+        """
+        plots = list()
+        plots.append({'name': self.name, 'axes': self.plot_parameter_evo()})
+        return plots
+
+    def save_plots(self, workdir):
+        prefix = self.name.lower()
+        self.plot_comparison(os.path.join(workdir,
+                                          prefix + '_comparison.png'))
+        self.plot_error_evo(os.path.join(workdir, prefix + '_error_evo.png'))
+        self.plot_parameter_evo(os.path.join(workdir,
+                                             prefix + '_param_evo.png'))
+
+    def plot_comparison(self, file=None):
+        return plots.plot_comparison(self.get_sim_res(), self.ideal, file)
+
+    def plot_error_evo(self, file=None):
+        err_df = pd.DataFrame(self.summary[self.ERR])
+        return plots.plot_error_evo(err_df, file)
+
+    def plot_parameter_evo(self, file=None):
+        par_df = self.summary.drop([self.METHOD], axis=1)
+        par_df = par_df.rename(columns={
+            x: 'error' if x == self.ERR else x for x in par_df.columns
+            })
+
+        # Get axes
+        axes = par_df.plot(subplots=True)
+        fig = figures.get_figure(axes)
+        # x label
+        axes[-1].set_xlabel('Iteration')
+        # ylim for error
+        axes[-1].set_ylim(0, None)
+
+        if file:
+            fig.set_size_inches(self.FIG_SIZE)
+            fig.savefig(file, dpi=self.FIG_DPI)
+        return axes
+
+    def plot_inputs(self, file=None):
+        return plots.plot_inputs(self.inputs, file)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import numpy as np
+from modestpy.estim.model import Model
+from modestpy.estim.error import ErrorContext
+from modestpy.fmi.pool import ModelPool
+
+
+def _evaluate_chunk(model, err_ctx, task):
+    """
+    Evaluates a chunk of parameter vectors in the worker
+    (run by ``ModelPool``).
+
+    :param model: modestpy.fmi.model.Model, worker's model copy
+    :param ErrorContext err_ctx: Error context
+    :param task: tuple (names, rows, threshold, fraction)
+    :return: tuple (list of error dicts, list of bools - True
+             if the simulation was aborted)
+    """
+    names, rows, threshold, fraction = task
+    monitors = None
+    if fraction is not None:
+        monitors = [err_ctx.get_prefix_monitor(fraction) for _ in rows]
+    elif threshold is not None:
+        monitors = [err_ctx.get_monitor(threshold) for _ in rows]
+    out = model.simulate_batch(names, rows, monitors=monitors)
+    _, partial = err_ctx.calc_batch(out, model.get_output_grid())
+    errors = err_ctx.get_error_dicts(partial)
+    aborted = [False] * len(errors)
+    if monitors is not None:
+        for i, monitor in enumerate(monitors):
+            if monitor.aborted:
+                errors[i] = monitor.get_error()
+                aborted[i] = True
+            elif monitor.truncated:
+                errors[i] = monitor.get_prefix_error()
+    return errors, aborted
+
+
+class EvalPool(object):
+    """
+    Pool of worker processes evaluating the cost function
+    for parameter vectors. Only parameter vectors are sent
+    to the workers and only errors are sent back.
+    The workers are run by ``modestpy.fmi.pool.ModelPool``
+    (each holds a copy of the model and of the error context).
+
+    Each parameter vector is evaluated independently,
+    so the errors do not depend on the number of workers.
+    Worker processes are started on the first ``evaluate()``
+    or ``submit()`` and stopped by ``close()`` (they are restarted
+    if needed).
+    """
+
+    def __init__(self, fmu_path, inp, known, ideal, ftype='RMSE',
+                 opts=None, workers=2):
+        """
+        :param fmu_path: string, path to the FMU
+        :param inp: DataFrame, inputs
+        :param known: DataFrame, known parameters (single row)
+        :param ideal: DataFrame, ideal solution
+        :param ftype: string, cost function type
+        :param opts: dict, FMI options
+        :param workers: int, number of worker processes
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        assert workers >= 1, 'Number of workers must be at least 1'
+        self.workers = int(workers)
+        self.fmu_path = fmu_path
+        self.inputs = inp
+        self.known_pars = known
+        self.ideal = ideal
+        self.ftype = ftype
+        self.opts = opts
+        self.pool = None
+
+    def evaluate(self, names, params, threshold=None, fraction=None):
+        """
+        Returns errors for each row of ``params``.
+
+        If ``threshold`` is given, simulations which are certainly
+        worse than ``threshold`` are aborted (their errors are
+        pessimistic, see ``estim.error.ErrorMonitor``).
+        If ``fraction`` is given, the errors are calculated
+        on the prefix of the learning period (low fidelity).
+
+        :param names: tuple/list of strings, parameter names
+        :param params: 2D array [n_candidates, n_params]
+        :param threshold: float, error threshold, optional
+        :param fraction: float, prefix length (0-1), optional
+        :return: tuple (list of dicts as returned by ``calc_err()``,
+                 1D bool array [n_candidates] - True if aborted)
+        """
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        n = params.shape[0]
+        if n == 0:
+            return list(), np.zeros(0, dtype=bool)
+
+        self._start()
+
+        chunks = np.array_split(np.arange(n), min(n, self.workers))
+        tasks = [(tuple(names), params[idx], threshold, fraction)
+                 for idx in chunks]
+
+        errors = list()
+        aborted = list()
+        for chunk_errors, chunk_aborted in self.pool.map(_evaluate_chunk,
+                                                         tasks):
+            errors.extend(chunk_errors)
+            aborted.extend(chunk_aborted)
+        return errors, np.array(aborted, dtype=bool)
+
+    def submit(self, names, params, threshold=None, tag=None):
+        """
+        Submits ``params`` for evaluation in one worker and returns
+        immediately (asynchronous version of ``evaluate()``).
+        The errors are returned by ``wait()``.
+
+        :param names: tuple/list of strings, parameter names
+        :param params: 2D array [n_candidates, n_params]
+        :param threshold: float, error threshold, optional
+        :param tag: identifies the evaluation in ``wait()``
+        :return: None
+        """
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        self._start()
+        self.pool.submit(_evaluate_chunk,
+                         (tuple(names), params, threshold, None), tag)
+
+    def wait(self):
+        """
+        Waits for any evaluation submitted with ``submit()``
+        to finish (in the order of completion).
+
+        :return: tuple (tag, (list of error dicts, list of bools -
+                 True if aborted))
+        :raises modestpy.fmi.pool.WorkerError: if the evaluation failed
+        """
+        return self.pool.wait()
+
+    def close(self):
+        """
+        Stops the workers (FMU instances are freed).
+
+        :return: None
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def _start(self):
+        if self.pool is None:
+            # Model copied to the workers (the FMU is instantiated
+            # in the workers only)
+            model = Model(self.fmu_path, opts=self.opts)
+            model.set_input(self.inputs)
+            model.set_param(self.known_pars)
+            model.set_outputs(list(self.ideal.columns))
+            # Outputs at the ideal time stamps, as in the serial evaluation
+            model.set_output_grid(self.ideal.index.values)
+            self.pool = ModelPool(model.model, self.workers,
+                                  context=ErrorContext(self.ideal,
+                                                       ftype=self.ftype))
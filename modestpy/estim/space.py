@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from random import random
+import numpy as np
+import pandas as pd
+from modestpy.estim.estpar import EstPar
+
+
+class ParameterSpace(object):
+    """
+    Estimated parameters: names, bounds and initial guesses stored
+    as NumPy arrays, and the mapping between parameter values and
+    the normalized space [0, 1] used by the estimation methods.
+
+    Each parameter has a transform, 'linear' (``lo + u * (hi - lo)``)
+    or 'log' (linear in ``log(value)``, bounds must be positive).
+    Parameters with equal bounds are fixed, they are encoded as 0
+    and always decoded to their bound.
+    ``encode()`` and ``decode()`` work on single parameter vectors
+    (1D arrays) and on batches (2D arrays, one row per parameter set).
+    """
+
+    LINEAR = 'linear'
+    LOG = 'log'
+    TRANSFORMS = (LINEAR, LOG)
+
+    def __init__(self, names, lo, hi, init=None, transforms=None):
+        """
+        :param names: list of strings, parameter names
+        :param lo: 1D array-like, lower bounds
+        :param hi: 1D array-like, upper bounds
+        :param init: 1D array-like, initial guess (mid-range if None)
+        :param transforms: list of strings, 'linear' or 'log'
+                           for each parameter (all linear if None)
+        """
+        self.names = tuple(names)
+        self.lo = np.array(lo, dtype=np.float64)
+        self.hi = np.array(hi, dtype=np.float64)
+        n = len(self.names)
+        assert self.lo.shape == (n,) and self.hi.shape == (n,), \
+            'Number of bounds does not match names'
+        assert np.all(self.lo <= self.hi), \
+            'Lower bounds must not be greater than upper bounds'
+
+        if transforms is None:
+            transforms = [ParameterSpace.LINEAR] * n
+        self.transforms = tuple(transforms)
+        assert len(self.transforms) == n, \
+            'Number of transforms does not match names'
+        for name, t in zip(self.names, self.transforms):
+            if t not in ParameterSpace.TRANSFORMS:
+                raise ValueError("Unknown transform '{}' of {}, use one of {}"
+                                 .format(t, name, ParameterSpace.TRANSFORMS))
+        self.log = np.array([t == ParameterSpace.LOG
+                             for t in self.transforms])
+        assert np.all(self.lo[self.log] > 0.), \
+            'Log transform requires positive bounds'
+
+        # Bounds in the transformed space
+        self.t_lo = np.where(self.log, np.log(np.where(self.log, self.lo, 1.)),
+                             self.lo)
+        self.t_hi = np.where(self.log, np.log(np.where(self.log, self.hi, 1.)),
+                             self.hi)
+        # Fixed parameters (lo == hi) are mapped to 0
+        self.fixed = self.t_hi == self.t_lo
+        self.t_span = np.where(self.fixed, 1., self.t_hi - self.t_lo)
+
+        if init is None:
+            init = self.decode(np.full(n, 0.5))
+        self.init = np.array(init, dtype=np.float64)
+        assert self.init.shape == (n,), \
+            'Number of initial values does not match names'
+
+    @classmethod
+    def from_est(cls, est, sort=False):
+        """
+        Creates the space from the ``est`` dictionary
+        (``par_name: (guess value, lo limit, hi limit[, scale])``).
+        The optional scale is 'linear' (default) or 'log'.
+        If the guess is None, it is drawn at random.
+
+        :param dict est: Estimated parameters
+        :param bool sort: If True, parameters are sorted by name,
+                          otherwise the order of ``est`` is kept
+        :return: ParameterSpace
+        """
+        names = sorted(est.keys()) if sort else list(est.keys())
+        lo = [est[p][1] for p in names]
+        hi = [est[p][2] for p in names]
+        transforms = [est[p][3] if len(est[p]) > 3 else cls.LINEAR
+                      for p in names]
+        space = cls(names, lo, hi, transforms=transforms)
+        init = list()
+        for i, p in enumerate(names):
+            if est[p][0] is None:  # If guess is None, assume random guess
+                init.append(space.decode(np.array([random()]), i)[0])
+            else:  # Else, take the guess passed in est
+                init.append(est[p][0])
+        space.init = np.array(init, dtype=np.float64)
+        return space
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, values, index=None):
+        """
+        Maps parameter values to the normalized space.
+
+        :param values: 1D array [n_params] or 2D array [k, n_params]
+        :param index: int, if given, ``values`` are values
+                      of the parameter ``index`` only
+        :return: numpy array (same shape as ``values``)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        sel = slice(None) if index is None else index
+        log = self.log[sel]
+        t = np.where(log, np.log(np.where(log, values, 1.)), values)
+        return (t - self.t_lo[sel]) / self.t_span[sel]
+
+    def decode(self, genes, index=None):
+        """
+        Maps normalized values to parameter values.
+
+        :param genes: 1D array [n_params] or 2D array [k, n_params]
+        :param index: int, if given, ``genes`` are normalized values
+                      of the parameter ``index`` only
+        :return: numpy array (same shape as ``genes``)
+        """
+        genes = np.asarray(genes, dtype=np.float64)
+        sel = slice(None) if index is None else index
+        log = self.log[sel]
+        t = self.t_lo[sel] + genes * (self.t_hi[sel] - self.t_lo[sel])
+        values = np.where(log, np.exp(np.where(log, t, 0.)), t)
+        return np.where(self.fixed[sel], self.lo[sel], values)
+
+    def clip(self, values):
+        """
+        Clips parameter values to the bounds.
+
+        :param values: 1D array [n_params] or 2D array [k, n_params]
+        :return: numpy array
+        """
+        return np.clip(values, self.lo, self.hi)
+
+    def to_df(self, values):
+        """
+        Returns parameter values as a DataFrame (one row per set).
+
+        :param values: 1D array [n_params] or 2D array [k, n_params]
+        :return: DataFrame
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        return pd.DataFrame(values, columns=list(self.names))
+
+    def get_estpars(self, values=None):
+        """
+        Returns parameters as a list of ``EstPar`` instances.
+
+        :param values: 1D array, parameter values (``init`` if None)
+        :return: list of EstPar
+        """
+        values = self.init if values is None else values
+        return [EstPar(name=p, lo=lo, hi=hi, value=v) for p, lo, hi, v
+                in zip(self.names, self.lo, self.hi, values)]
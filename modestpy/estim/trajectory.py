@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+
+class Trajectory(object):
+    """
+    Append-only history of evaluated parameter sets, stored in
+    growable NumPy columns: iteration, individual, parameters,
+    error, method, fidelity and wall time. DataFrames are built only
+    on request (``to_df()``, ``get_best_df()``).
+
+    The best row of each iteration is tracked during appending,
+    so per-iteration best lookups are O(1). Only errors measured
+    at full fidelity (1) are considered.
+
+    If ``spill_dir`` is given, rows are moved to ``.npz`` files
+    in this directory every ``spill_rows`` rows, so the memory
+    use does not grow during very long runs.
+    """
+
+    ITER = '_iter_'
+    ERR = '_error_'
+    METHOD = '_method_'
+    INDIV = 'individual'
+    TIME = '_time_'
+    FIDEL = '_fidelity_'
+
+    def __init__(self, par_names, capacity=256, spill_dir=None,
+                 spill_rows=100000):
+        """
+        :param par_names: list of strings, parameter names
+        :param int capacity: Initial number of rows
+        :param str spill_dir: Directory for spilled rows, optional
+        :param int spill_rows: Number of rows kept in memory
+                               (used only with ``spill_dir``)
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.par_names = list(par_names)
+        self.spill_dir = spill_dir
+        self.spill_rows = int(spill_rows)
+        self.spill_files = list()
+
+        self.methods = list()  # Method names, indexed by method codes
+        self.has_fidelity = False  # True if fidelities were given
+        self.t0 = time.time()
+
+        # Rows in memory
+        self.size = 0
+        self._allocate(max(int(capacity), 1))
+
+        # Number of spilled rows
+        self.spilled = 0
+
+        # Best row per iteration
+        self.best_pos = dict()  # iteration -> position in best_* lists
+        self.best_iter = list()
+        self.best_values = list()
+        self.best_err = list()
+        self.best_method = list()
+
+    def append(self, iteration, values, errors, individuals=None,
+               method=None, fidelity=None):
+        """
+        Appends rows (one row per parameter set).
+
+        :param int iteration: Iteration (generation) number
+        :param values: 2D array [n, n_params] or 1D array [n_params]
+        :param errors: 1D array [n] or float
+        :param individuals: 1D array [n], optional (default 1...n)
+        :param str method: Method name, optional
+        :param fidelity: 1D array [n], fidelity at which the errors
+                         were measured (fraction of the learning
+                         period), optional (default 1)
+        :return: None
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values.reshape(1, -1)
+        errors = np.atleast_1d(np.asarray(errors, dtype=np.float64))
+        n = values.shape[0]
+        assert values.shape[1] == len(self.par_names), \
+            'Number of parameters does not match par_names'
+        assert errors.size == n, 'Number of errors does not match values'
+
+        if individuals is None:
+            individuals = np.arange(1, n + 1)
+        code = self._get_method_code(method)
+        if fidelity is None:
+            fidelity = np.ones(n)
+        else:
+            fidelity = np.atleast_1d(np.asarray(fidelity, dtype=np.float64))
+            assert fidelity.size == n, \
+                'Number of fidelities does not match values'
+            self.has_fidelity = True
+
+        if self.size + n > self.iter.size:
+            self._grow(self.size + n)
+
+        rows = slice(self.size, self.size + n)
+        self.iter[rows] = iteration
+        self.indiv[rows] = individuals
+        self.values[rows] = values
+        self.err[rows] = errors
+        self.method[rows] = code
+        self.fidel[rows] = fidelity
+        self.time[rows] = time.time() - self.t0
+        self.size += n
+
+        # Update best row of this iteration (full fidelity only)
+        full = fidelity >= 1.
+        if full.any():
+            i = int(np.argmin(np.where(full, errors, np.inf)))
+            pos = self.best_pos.get(iteration)
+            if pos is None:
+                self.best_pos[iteration] = len(self.best_iter)
+                self.best_iter.append(iteration)
+                self.best_values.append(values[i].copy())
+                self.best_err.append(errors[i])
+                self.best_method.append(code)
+            elif errors[i] < self.best_err[pos]:
+                self.best_values[pos] = values[i].copy()
+                self.best_err[pos] = errors[i]
+                self.best_method[pos] = code
+
+        if self.spill_dir is not None and self.size >= self.spill_rows:
+            self._spill()
+
+    def get_best(self, iteration):
+        """
+        Returns the best parameter set and error of ``iteration``.
+
+        :param int iteration: Iteration number
+        :return: tuple(1D numpy array, float)
+        """
+        pos = self.best_pos[iteration]
+        return self.best_values[pos].copy(), self.best_err[pos]
+
+    def get_best_df(self):
+        """
+        Returns the best parameter set of each iteration.
+        Columns: parameters, '_error_' and '_method_' (if methods
+        were given), index: '_iter_'.
+
+        :return: DataFrame
+        """
+        values = np.array(self.best_values).reshape(-1, len(self.par_names))
+        df = pd.DataFrame(values, columns=self.par_names,
+                          index=pd.Index(np.array(self.best_iter,
+                                                  dtype=np.int64),
+                                         name=Trajectory.ITER))
+        df[Trajectory.ERR] = np.array(self.best_err, dtype=np.float64)
+        if self.methods:
+            df[Trajectory.METHOD] = [self.methods[c] if c >= 0 else None
+                                     for c in self.best_method]
+        return df
+
+    def to_df(self):
+        """
+        Returns all rows (including spilled).
+        Columns: parameters, '_error_', 'individual', '_iter_',
+        '_method_' (if methods were given), '_fidelity_' (if
+        fidelities were given), '_time_' (seconds since
+        the trajectory was created).
+
+        :return: DataFrame
+        """
+        chunks = [dict(np.load(f)) for f in self.spill_files]
+        chunks.append(self._get_columns())
+
+        def cat(col):
+            return np.concatenate([c[col] for c in chunks])
+
+        df = pd.DataFrame(cat('values').reshape(-1, len(self.par_names)),
+                          columns=self.par_names)
+        df[Trajectory.ERR] = cat('err')
+        df[Trajectory.INDIV] = cat('indiv')
+        df[Trajectory.ITER] = cat('iter')
+        if self.methods:
+            df[Trajectory.METHOD] = [self.methods[c] if c >= 0 else None
+                                     for c in cat('method')]
+        if self.has_fidelity:
+            df[Trajectory.FIDEL] = cat('fidel')
+        df[Trajectory.TIME] = cat('time')
+        return df
+
+    def clear(self):
+        """
+        Removes all rows and spilled files.
+
+        :return: None
+        """
+        for f in self.spill_files:
+            if os.path.exists(f):
+                os.remove(f)
+        self.spill_files = list()
+        self.spilled = 0
+        self.size = 0
+        self.best_pos = dict()
+        self.best_iter = list()
+        self.best_values = list()
+        self.best_err = list()
+        self.best_method = list()
+
+    def __len__(self):
+        return self.spilled + self.size
+
+    def _get_method_code(self, method):
+        if method is None:
+            return -1
+        if method not in self.methods:
+            self.methods.append(method)
+        return self.methods.index(method)
+
+    def _allocate(self, capacity):
+        self.iter = np.zeros(capacity, dtype=np.int64)
+        self.indiv = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, len(self.par_names)))
+        self.err = np.zeros(capacity)
+        self.method = np.zeros(capacity, dtype=np.int16)
+        self.fidel = np.ones(capacity)
+        self.time = np.zeros(capacity)
+
+    def _grow(self, min_capacity):
+        """
+        Doubles the capacity (at least to ``min_capacity``).
+        """
+        old = self._get_columns()
+        self._allocate(max(2 * self.iter.size, min_capacity))
+        for col in old:
+            getattr(self, col)[:self.size] = old[col]
+
+    def _get_columns(self):
+        """
+        Returns rows in memory as a dict of arrays (views).
+        """
+        return {
+            'iter': self.iter[:self.size],
+            'indiv': self.indiv[:self.size],
+            'values': self.values[:self.size],
+            'err': self.err[:self.size],
+            'method': self.method[:self.size],
+            'fidel': self.fidel[:self.size],
+            'time': self.time[:self.size]
+        }
+
+    def _spill(self):
+        """
+        Saves rows in memory to a file and empties the buffer.
+        """
+        fd, path = tempfile.mkstemp(prefix='trajectory_', suffix='.npz',
+                                    dir=self.spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **self._get_columns())
+        self.logger.debug('{} rows saved to {}'.format(self.size, path))
+        self.spill_files.append(path)
+        self.spilled += self.size
+        self.size = 0
+
+    def __del__(self):
+        try:
+            self.clear()
+        except Exception:
+            pass  # Interpreter shutdown, nothing sensible to do
@@ -15,20 +15,38 @@ import logging
 import random
 import copy
 import os
+import json
+import multiprocessing
 import matplotlib.pyplot as plt
 import matplotlib.ticker
 import pandas as pd
 import numpy as np
 from modestpy.estim.ga.ga import GA
+from modestpy.estim.ga.islands import IslandGA
 from modestpy.estim.ps.ps import PS
 from modestpy.estim.scipy.scipy import SCIPY
+from modestpy.estim.optimizer import Optimizer, OptimizerMethod
+from modestpy.estim.space import ParameterSpace
 from modestpy.estim.model import Model
+from modestpy.estim.cache import EvalCache, DiskCache, get_context
 import modestpy.estim.error
 from modestpy.estim.plots import plot_comparison
 import modestpy.utilities.figures as figures
 from modestpy.loginit import config_logger
 
 
+def _estimate_period(args):
+    """
+    Runs a learning period in a worker process
+    (see ``Estimation.estimate()``).
+
+    :param args: tuple(Estimation, tuple(n, period, seed))
+    :return: tuple(DataFrame, dict)
+    """
+    estimation, (n, period, seed) = args
+    return estimation._estimate_period(n, period, seed, nested=True)
+
+
 class Estimation(object):
     """
     Public API of ``modestpy``.
@@ -41,11 +59,15 @@ class Estimation(object):
     FIG_DPI = 150
     FIG_SIZE = (10, 6)
 
+    # Persistent evaluation cache file (in workdir)
+    DISK_CACHE_FILE = 'modestpy_cache.sqlite'
+
     def __init__(self, workdir, fmu_path, inp, known, est, ideal,
                  lp_n=None, lp_len=None, lp_frame=None, vp=None,
                  ic_param=None, methods=('GA', 'PS'), ga_opts={}, ps_opts={},
                  scipy_opts={}, fmi_opts={}, ftype='RMSE', seed=None,
-                 default_log=True, logfile='modestpy.log'):
+                 default_log=True, logfile='modestpy.log', cache_size=100.,
+                 disk_cache=None, lp_workers=1):
         """
         Index in DataFrames ``inp`` and ``ideal`` must be named 'time'
         and given in seconds. The index name assertion check is
@@ -69,9 +91,13 @@ class Estimation(object):
             Input data, index given in seconds and named ``time``
         known: dict(str: float)
             Dictionary with known parameters (``parameter_name: value``)
-        est: dict(str: tuple(float, float, float))
+        est: dict(str: tuple(float, float, float[, str]))
             Dictionary defining estimated parameters,
-            (``par_name: (guess value, lo limit, hi limit)``)
+            (``par_name: (guess value, lo limit, hi limit[, scale])``).
+            The optional scale is 'linear' (default) or 'log'. Log-scaled
+            parameters are searched uniformly in ``log(value)``
+            (GA genes, PS steps, SCIPY variables), which is advised
+            for parameters spanning orders of magnitude (lo > 0).
         ideal: pandas.DataFrame
             Ideal solution (usually measurements),
             index in seconds and named ``time``
@@ -87,16 +113,28 @@ class Estimation(object):
             Mapping between model parameters used for IC and variables from
             ``ideal``
         methods: tuple(str, str)
-            List of methods to be used in the pipeline
+            List of methods to be used in the pipeline. Other methods
+            can be added to ``method_dict`` before ``estimate()``, as
+            ``(class, options)``. Ask/tell strategies (subclasses
+            of ``modestpy.estim.optimizer.Optimizer``) are run by the
+            common evaluator, their options can include 'fmi_opts',
+            'ftype', 'workers' and 'max_evals' (evaluation budget).
         ga_opts: dict
-            Genetic algorithm options
+            Genetic algorithm options. With 'islands' > 1, GA runs
+            as the island model (``modestpy.estim.ga.islands.IslandGA``)
         ps_opts: dict
             Pattern search options
         scipy_opts: dict
             SciPy solver options
         fmi_opts: dict
-            Additional options to be passed to the FMI model
-            (e.g. solver tolerance)
+            Solver options passed to the FMI model: 'tolerance'
+            (relative tolerance), 'solver' ('CVode' or 'Euler')
+            and 'step_size' (see ``modestpy.fmi.model.Model``).
+            Methods can override them with 'fmi_opts' in their own
+            options, e.g. a loose tolerance and a larger step in GA
+            (``ga_opts={'fmi_opts': {'tolerance': 1e-3}}``)
+            and tight tolerances in PS/SCIPY. Method options are
+            merged with ``fmi_opts``.
         ftype: string
             Cost function type. Currently 'NRMSE' (advised for multi-objective
             estimation) or 'RMSE'.
@@ -109,6 +147,23 @@ class Estimation(object):
         logfile: str
             If default_log=True, this argument can be used to specify the log
             file name
+        cache_size: float
+            Memory bound (MB) of the evaluation cache shared by all methods
+            within a learning period. Use 0 to disable caching.
+        disk_cache: bool or str
+            Persistent evaluation cache (SQLite database), reused between
+            runs and processes. Evaluations are keyed by the FMU, data
+            slice, known parameters, FMI options, cost function and
+            estimated parameters. If True, the database is created
+            in `workdir` (modestpy_cache.sqlite). A string is used as
+            the database path. None or False disables the cache.
+        lp_workers: int
+            Number of processes used to run learning periods
+            concurrently. Each period has its own random seed (drawn
+            from the main random stream), so the results are the same
+            for any number of processes, including the serial run
+            (`lp_workers=1`). Method worker pools (``workers`` in method options)
+            are disabled in this mode.
         """
         # Default logging configuration?
         if default_log:
@@ -125,6 +180,11 @@ class Estimation(object):
             assert (est[v][init] >= est[v][lo])  \
                 and (est[v][init] <= est[v][hi]), \
                 'Initial value out of limits ({})'.format(v)
+            if len(est[v]) > 3 \
+                    and est[v][3] not in ParameterSpace.TRANSFORMS:
+                raise ValueError("Unknown scale '{}' of {}, use one of {}"
+                                 .format(est[v][3], v,
+                                         ParameterSpace.TRANSFORMS))
 
         # Random seed
         if seed is not None:
@@ -141,10 +201,23 @@ class Estimation(object):
         self.ideal = ideal
         self.methods = methods
         self.ftype = ftype
+        self.cache_size = cache_size
+        self.fmi_opts = fmi_opts
+        self.lp_workers = lp_workers
+
+        # Persistent evaluation cache
+        self.disk_cache = None
+        if disk_cache:
+            db_path = disk_cache if isinstance(disk_cache, str) \
+                else os.path.join(workdir, Estimation.DISK_CACHE_FILE)
+            self.logger.info('Using persistent evaluation cache: {}'
+                             .format(db_path))
+            self.disk_cache = DiskCache(db_path)
 
         # Results placeholders
         self.best_per_run = pd.DataFrame()
         self.final = pd.DataFrame()
+        self.cache_stats = dict()
 
         # Estimation options
         # GA options
@@ -157,6 +230,16 @@ class Estimation(object):
             'uniformity':   0.5,
             'look_back':    50,
             'lhs':          False,
+            'workers':      1,
+            'engine':       'object',
+            'history_dir':  None,
+            'early_abort':  False,
+            'fidelity':     None,
+            'steady_state': False,
+            'replacement':  'worst',
+            'islands':      None,
+            'migration':    5,
+            'migrants':     1,
             'ftype':        ftype,
             'fmi_opts':     fmi_opts
         }  # Default
@@ -168,12 +251,14 @@ class Estimation(object):
 
         # PS options
         self.PS_OPTS = {
-            'maxiter':  500,
-            'rel_step': 0.02,
-            'tol':      1e-11,
-            'try_lim':  1000,
-            'ftype':    ftype,
-            'fmi_opts': fmi_opts
+            'maxiter':      500,
+            'rel_step':     0.02,
+            'tol':          1e-11,
+            'try_lim':      1000,
+            'workers':      1,
+            'early_abort':  False,
+            'ftype':        ftype,
+            'fmi_opts':     fmi_opts
         }  # Default
 
         # User options
@@ -194,9 +279,19 @@ class Estimation(object):
         self.SCIPY_OPTS = \
             self._update_opts(self.SCIPY_OPTS, scipy_opts, 'SCIPY')
 
+        # GA runs as the island model (IslandGA) if 'islands' > 1,
+        # the serial GA does not take the island options
+        if self.GA_OPTS['islands'] is not None and \
+                self.GA_OPTS['islands'] > 1:
+            ga_method = (IslandGA, self.GA_OPTS)
+        else:
+            ga_method = (GA, {key: value for key, value
+                              in self.GA_OPTS.items()
+                              if key not in IslandGA.OPTIONS})
+
         # Method dictionary
         self.method_dict = {
-            'GA': (GA, self.GA_OPTS),
+            'GA': ga_method,
             'PS': (PS, self.PS_OPTS),
             'SCIPY': (SCIPY, self.SCIPY_OPTS)
         }  # Key -> method name, value -> (method class, method options)
@@ -245,86 +340,50 @@ class Estimation(object):
         assert get in allowed_types, 'get={} is not allowed'.format(get)
 
         # (1) Initialize local variables
-        # Tuple with method names
-        # e.g. ('GA', 'PS'), ('GA', 'SCIPY') or ('GA', )
-        methods = self.methods
-
-        # List of plots to be saved
-        plots = list()
-
-        cols = ['_method_', '_error_'] + [par_name for par_name in self.est]
-
-        # Estimates and errors from all iterations from all methods
-        summary = pd.DataFrame(columns=cols)
-        summary.index.name = '_iter_'
-
         # List of DataFrames with summaries from all runs
         summary_list = list()
 
-        # (2) Double step estimation
-        n = 1  # Learning period counter
-
-        for period in self.lp:
-            # (2.1) Copy initial parameters
-            est = copy.copy(self.est)
-
-            # (2.2) Slice data
-            start, stop = period[0], period[1]
-            inp_slice = self.inp.loc[start:stop]
-            ideal_slice = self.ideal.loc[start:stop]
-
-            # (2.3) Get data for IC parameters and add to known parameters
-            if self.ic_param:
-                for par in self.ic_param:
-                    ic = ideal_slice[self.ic_param[par]].iloc[0]
-                    self.known[par] = ic
-
-            # (2.4) Iterate over estimation methods (append results from all)
-            m = 0  # Method counter
-            for m_name in methods:
-                # (2.4.1) Instantiate method class
-                m_class = self.method_dict[m_name][0]
-                m_opts = self.method_dict[m_name][1]
-
-                m_inst = m_class(self.fmu_path, inp_slice, self.known, est,
-                                 ideal_slice, **m_opts)
-
-                # (2.4.2) Estimate
-                m_estimates = m_inst.estimate()
-
-                # (2.4.3) Update current estimates
-                # (stored in self.est dictionary)
-                for key in est:
-                    new_value = m_estimates[key].iloc[0]
-                    est[key] = (new_value, est[key][1], est[key][2])
-
-                # (2.4.4) Append summary
-                full_traj = m_inst.get_full_solution_trajectory()
-                if m > 0:
-                    # Add iterations from previous methods
-                    full_traj.index += summary.index[-1]
-                summary = summary.append(full_traj, verify_integrity=True)
-                summary.index.rename('_iter_', inplace=True)
-
-                # (2.4.5) Save method's plots
-                plots = m_inst.get_plots()
-                for p in plots:
-                    fig = figures.get_figure(p['axes'])
-                    fig_file = os.path.join(self.workdir, "{}_{}.png"
-                                            .format(p['name'], n))
-                    fig.set_size_inches(Estimation.FIG_SIZE)
-                    fig.savefig(fig_file, dpi=Estimation.FIG_DPI)
-                plt.close('all')
-
-                # (2.4.6) Increase method counter
-                m += 1
-
-            # (2.5) Add summary from this run to the list of all summaries
+        # Evaluation cache statistics (sum from all learning periods)
+        cache_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+        # (2) Double step estimation (one task per learning period)
+        # Each period has its own random stream, so the results
+        # do not depend on the number of workers
+        tasks = [(n, period, random.randint(0, 2 ** 31 - 1))
+                 for n, period in enumerate(self.lp, 1)]
+
+        if self.lp_workers > 1 and len(tasks) > 1:
+            workers = min(self.lp_workers, len(tasks))
+            self.logger.info('Running {} learning periods in {} processes'
+                             .format(len(tasks), workers))
+            pool = multiprocessing.Pool(workers)
+            try:
+                outputs = pool.map(_estimate_period,
+                                   [(self, task) for task in tasks])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            # The caller's random state is restored after the periods
+            state = (random.getstate(), np.random.get_state())
+            try:
+                outputs = [self._estimate_period(*task) for task in tasks]
+            finally:
+                random.setstate(state[0])
+                np.random.set_state(state[1])
+
+        # Merge results in the period order
+        for summary, period_stats in outputs:
             summary_list.append(summary)
-            summary = pd.DataFrame(columns=cols)  # Reset
+            for key in cache_stats:
+                cache_stats[key] += period_stats[key]
 
-            # (2.6) Increase learning period counter
-            n += 1
+        # Report evaluation cache statistics
+        self.cache_stats = cache_stats
+        self.logger.info('Evaluation cache: {} hits ({} from disk), '
+                         '{} misses'.format(cache_stats['hits'],
+                                            cache_stats['disk_hits'],
+                                            cache_stats['misses']))
 
         # (3) Get and save best estimates per run and final estimates
         best_per_run = self._get_finals(summary_list)
@@ -401,22 +460,19 @@ class Estimation(object):
         ideal_slice = self.ideal.loc[start:stop]
 
         # Initialize IC parameters and add to known
-        if self.ic_param:
-            for par in self.ic_param:
-                ic = ideal_slice[self.ic_param[par]].iloc[0]
-                self.known[par] = ic
+        known = self._get_known(ideal_slice)
 
         # Initialize model
-        model = Model(self.fmu_path)
+        model = Model(self.fmu_path, self.fmi_opts)
         model.set_input(inp_slice)
         model.set_param(est)
-        model.set_param(self.known)
+        model.set_param(known)
         model.set_outputs(list(self.ideal.columns))
+        model.set_output_grid(ideal_slice.index.values)
 
         # Simulate and get error
-        com_points = len(ideal_slice) - 1
         try:
-            result = model.simulate(com_points=com_points)
+            result = model.simulate()
         except Exception as e:
             msg = 'Problem found inside FMU. Did you set all parameters? ' + \
                   'Log:\n'
@@ -438,6 +494,130 @@ class Estimation(object):
 
     # PRIVATE METHODS ====================================================
 
+    def _estimate_period(self, n, period, seed, nested=False):
+        """
+        Runs all estimation methods in the learning period ``n``.
+        The random number generators are seeded with ``seed``
+        at the start of the period.
+
+        :param int n: Learning period number (1, 2, ...)
+        :param tuple period: Start and stop time
+        :param int seed: Random number seed of the period
+        :param bool nested: True if run in a worker process (method
+                            worker pools are disabled, because worker
+                            processes cannot have children)
+        :return: tuple(DataFrame, dict) with summary and cache statistics
+        """
+        random.seed(seed)
+        np.random.seed(seed)
+
+        cols = ['_method_', '_error_'] + [par_name for par_name in self.est]
+
+        # Estimates and errors from all iterations from all methods
+        summary = pd.DataFrame(columns=cols)
+        summary.index.name = '_iter_'
+
+        # (2.1) Copy initial parameters
+        est = copy.copy(self.est)
+
+        # (2.2) Slice data
+        start, stop = period[0], period[1]
+        inp_slice = self.inp.loc[start:stop]
+        ideal_slice = self.ideal.loc[start:stop]
+
+        # (2.3) Get data for IC parameters and add to known parameters
+        known = self._get_known(ideal_slice)
+
+        # (2.4) Iterate over estimation methods (append results from all)
+        # Evaluation cache shared by all methods in this period
+        # (one per solver settings, results obtained with different
+        # tolerances are not interchangeable)
+        caches = dict()
+        m = 0  # Method counter
+        for m_name in self.methods:
+            # (2.4.1) Instantiate method class
+            m_class = self.method_dict[m_name][0]
+            m_opts = self.method_dict[m_name][1]
+            if nested and 'workers' in m_opts:
+                m_opts = dict(m_opts, workers=1)
+
+            fmi_opts = m_opts.get('fmi_opts')
+            cache_key = json.dumps(fmi_opts, sort_keys=True, default=str)
+            if cache_key not in caches:
+                context = None
+                if self.disk_cache is not None:
+                    context = get_context(self.fmu_path, inp_slice,
+                                          ideal_slice, known, fmi_opts,
+                                          self.ftype)
+                caches[cache_key] = EvalCache(max_size=self.cache_size,
+                                              store=self.disk_cache,
+                                              context=context)
+            cache = caches[cache_key]
+
+            if issubclass(m_class, Optimizer):
+                # Ask/tell strategy, run by the common evaluator
+                m_inst = OptimizerMethod(self.fmu_path, inp_slice, known,
+                                         est, ideal_slice, m_class,
+                                         cache=cache, **m_opts)
+            else:
+                m_inst = m_class(self.fmu_path, inp_slice, known, est,
+                                 ideal_slice, cache=cache, **m_opts)
+
+            # (2.4.2) Estimate
+            m_estimates = m_inst.estimate()
+
+            # (2.4.3) Update current estimates
+            # (stored in self.est dictionary)
+            for key in est:
+                new_value = m_estimates[key].iloc[0]
+                est[key] = (new_value, ) + tuple(est[key][1:])
+
+            # (2.4.4) Append summary
+            full_traj = m_inst.get_full_solution_trajectory()
+            if m > 0:
+                # Add iterations from previous methods
+                full_traj.index += summary.index[-1]
+            summary = summary.append(full_traj, verify_integrity=True)
+            summary.index.rename('_iter_', inplace=True)
+
+            # (2.4.5) Save method's plots
+            plots = m_inst.get_plots()
+            for p in plots:
+                fig = figures.get_figure(p['axes'])
+                fig_file = os.path.join(self.workdir, "{}_{}.png"
+                                        .format(p['name'], n))
+                fig.set_size_inches(Estimation.FIG_SIZE)
+                fig.savefig(fig_file, dpi=Estimation.FIG_DPI)
+            plt.close('all')
+
+            # (2.4.6) Increase method counter
+            m += 1
+
+        # (2.5) Return summary from this run
+        stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+        for cache in caches.values():
+            self.logger.info('Learning period #{}: {}'.format(n, cache))
+            stats['hits'] += cache.hits
+            stats['disk_hits'] += cache.disk_hits
+            stats['misses'] += cache.misses
+
+        return summary, stats
+
+    def _get_known(self, ideal_slice):
+        """
+        Returns known parameters with IC parameters taken
+        from the first row of ``ideal_slice`` (``self.known``
+        is not modified).
+
+        :param DataFrame ideal_slice: Ideal solution in the period
+        :return: dict
+        """
+        known = dict(self.known)
+        if self.ic_param:
+            for par in self.ic_param:
+                known[par] = ideal_slice[self.ic_param[par]].iloc[0]
+        return known
+
     def _get_finals(self, summary_list):
         """
         Returns final estimates and errors from all learning periods
@@ -474,7 +654,13 @@ class Estimation(object):
                     raise KeyError(msg)
                 self.logger.info('User defined option ({}): {} = {}'
                                  .format(method, key, new_opts[key]))
-                opts[key] = new_opts[key]
+                if key == 'fmi_opts' and new_opts[key] is not None:
+                    # Method solver options override the global ones
+                    fmi_opts = dict(opts[key]) if opts[key] else dict()
+                    fmi_opts.update(new_opts[key])
+                    opts[key] = fmi_opts
+                else:
+                    opts[key] = new_opts[key]
         return opts
 
     def _plot_error_per_run(self, summary_list, err_type):
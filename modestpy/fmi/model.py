@@ -3,7 +3,11 @@ from __future__ import division
 from __future__ import print_function
 
 import logging
+import shutil
 from fmpy import simulate_fmu
+from fmpy import extract
+from fmpy.fmi2 import FMU2Slave
+from fmpy.simulation import Input
 import numpy as np
 import pandas as pd
 import os
@@ -14,9 +18,38 @@ class Model(object):
     """
     FMU model to be simulated with inputs and parameters provided from
     files or dataframes.
+
+    If ``persistent`` is True, the FMU is extracted and instantiated
+    only once (on the first simulation). Subsequent simulations reuse
+    the same FMU 2.0 slave: ``reset`` -> ``setupExperiment`` ->
+    start values -> ``doStep`` loop. Otherwise, each simulation
+    is delegated to ``fmpy.simulate_fmu()``, which unzips, loads
+    and instantiates the FMU every time.
+
+    In the persistent mode, FMUs with ``canGetAndSetFMUstate``
+    can be checkpointed (see ``set_checkpoint()``). The state at
+    the checkpoint time is saved during the first simulation
+    and next simulations restart from this state, as long as only
+    the parameters declared as free have changed.
+
+    Solver settings are given in ``opts`` (see ``SOLVER_OPTS``):
+
+    - ``'tolerance'``: relative tolerance passed to ``setupExperiment``
+      (and to the ``_cs_rel_tol`` parameter of JModelica.org FMUs),
+    - ``'solver'``: co-simulation solver (``'CVode'`` or ``'Euler'``),
+      requires the ``_cs_solver`` parameter (JModelica.org FMUs),
+    - ``'step_size'``: internal solver step, set in ``_cs_step_size``
+      if present, otherwise the maximum ``doStep`` length
+      (communication steps are split, persistent mode only).
     """
 
-    def __init__(self, fmu_path, opts=None):
+    # Supported keys of ``opts``
+    SOLVER_OPTS = ('tolerance', 'solver', 'step_size')
+
+    # Co-simulation solvers (JModelica.org ``_cs_solver`` values)
+    CS_SOLVERS = {'CVode': 0, 'Euler': 1}
+
+    def __init__(self, fmu_path, opts=None, persistent=True):
         self.logger = logging.getLogger(type(self).__name__)
 
         try:
@@ -24,6 +57,11 @@ class Model(object):
             self.fmu_path = fmu_path
             self.model_description = read_model_description(self.fmu_path)
 
+            # Name -> ScalarVariable index, used to resolve
+            # value references only once
+            self.variables = {v.name: v for v in
+                              self.model_description.modelVariables}
+
             self.fmu_args = {
                 'guid': self.model_description.guid,
                 'modelIdentifier': self.model_description.coSimulation.modelIdentifier,
@@ -34,7 +72,14 @@ class Model(object):
         except Exception as e:
             self.logger.error(e)
 
-        self.opts = opts
+        self.opts = dict(opts) if opts else dict()
+        self.persistent = persistent
+
+        # Solver settings (see SOLVER_OPTS)
+        self.tolerance = None
+        self.max_step = None  # Maximum doStep length
+        self.solver_values = dict()  # FMU solver parameters, name -> value
+        self._configure_solver()
         self.start = None
         self.end = None
         self.timeline = None
@@ -42,20 +87,101 @@ class Model(object):
         self.input_names = list()
         self.input_values = list()
         self.output_names = list()
-        self.parameter_names = list()
+        self.output_grid = None  # Output time points (see set_output_grid)
         self.input = None
-        self.parameter_df = pd.DataFrame()
         self.res = None
 
+        # Parameter binding (names, value references and values
+        # are aligned, Real parameters are set with one setReal call)
+        self.parameter_names = list()
+        self.parameter_refs = list()
+        self.parameter_values = np.zeros(0)
+        self.parameter_index = dict()  # name -> position
+        self.other_parameters = dict()  # non-Real, name -> value
+        self.slot_cache = dict()  # tuple(names) -> positions
+
+        # Persistent FMU instance (created on first simulation)
+        self.unzipdir = None
+        self.fmu = None
+        self.fmu_input = None
+        self.output_refs = None
+        self.initialized = False
+
+        # FMU state checkpoint
+        self.checkpoint_time = None
+        self.checkpoint_pars = tuple()  # Parameters free after checkpoint
+        self.checkpoint = None  # Saved state (dict)
+
+    def __del__(self):
+        try:
+            self.free()
+        except Exception:
+            pass  # Interpreter shutdown, nothing sensible to do
+
+    def __getstate__(self):
+        # The FMU instance is process-specific, a copy of the model
+        # (e.g. in a worker process) instantiates its own
+        state = self.__dict__.copy()
+        state['unzipdir'] = None
+        state['fmu'] = None
+        state['fmu_input'] = None
+        state['output_refs'] = None
+        state['initialized'] = False
+        state['checkpoint'] = None
+        state['res'] = None
+        return state
+
     def parameters_from_csv(self, csv, sep=','):
         df = pd.read_csv(csv, sep=sep)
         self.parameters_from_df(df)
 
     def parameters_from_df(self, df):
+        """
+        Sets parameters from a single-row DataFrame (or dictionary).
+
+        :param df: DataFrame or dict(str: float)
+        :return: None
+        """
         if df is not None:
-            df = df.copy()
             for col in df:
-                self.parameter_df[col] = df[col]
+                value = np.asarray(df[col]).ravel()[0]
+                self._set_parameter(col, value)
+
+    def parameters_from_array(self, names, values):
+        """
+        Sets parameters from a sequence of names and an array of values.
+        Positions of the parameters are cached per ``names``, so
+        repeated calls with the same names (e.g. candidate vectors
+        in optimization) do not involve any name lookups.
+
+        :param names: tuple/list of strings, parameter names
+        :param values: 1D array-like, parameter values
+        :return: None
+        """
+        key = tuple(names)
+        slots = self.slot_cache.get(key)
+        if slots is None:
+            for name, value in zip(names, values):
+                self._set_parameter(name, value)
+            # Cache positions (only if all parameters are Real)
+            if all(name in self.parameter_index for name in names):
+                self.slot_cache[key] = np.array(
+                    [self.parameter_index[name] for name in names],
+                    dtype=int)
+            return
+        self.parameter_values[slots] = values
+
+    @property
+    def parameter_df(self):
+        """
+        Current parameters as a single-row DataFrame.
+        """
+        df = pd.DataFrame(index=[0])
+        for name, value in zip(self.parameter_names, self.parameter_values):
+            df[name] = value
+        for name in self.other_parameters:
+            df[name] = self.other_parameters[name]
+        return df
 
     def inputs_from_csv(self, csv, sep=',', exclude=list()):
         """
@@ -65,7 +191,6 @@ class Model(object):
         :param exclude: list of strings, columns to be excluded
         :return: None
         """
-        self.input = np.genfromtxt(csv, delimiter=sep, names=True)
         df = pd.read_csv(csv, sep=sep)
         assert 'time' in df.columns, "'time' not present in csv..."
         df = df.set_index('time')
@@ -81,6 +206,11 @@ class Model(object):
         and forgot to use ``DataFrame.set_index(column_name)``
         (it happens quite often...).
 
+        The inputs are stored in a single contiguous, read-only
+        structured array (``self.input``, fields: time + input columns),
+        which is shared by all subsequent simulations without any
+        conversion or copying. ``input_values`` are views of this array.
+
         :param df: DataFrame
         :param exclude: list of strings, names of columns to be omitted
         :return:
@@ -93,11 +223,30 @@ class Model(object):
         self.start = self.timeline[0]
         self.end = self.timeline[-1]
 
-        for col in df:
-            if col not in exclude:
-                if col not in self.input_names:
-                    self.input_names.append(col)
-                    self.input_values.append(df[col].values)
+        self.input_names = [col for col in df if col not in exclude]
+        self.input = Model._create_input_buffer(df, self.input_names)
+        self.input_values = [self.input[col] for col in self.input_names]
+
+        # Input helper of the persistent FMU must be rebuilt
+        self.fmu_input = None
+        self.clear_checkpoint()
+
+    @staticmethod
+    def _create_input_buffer(df, names):
+        """
+        Returns a read-only structured array with time and inputs.
+
+        :param df: DataFrame, index = time
+        :param names: list of strings, input columns
+        :return: numpy structured array
+        """
+        dtype = [('time', np.float64)] + [(n, np.float64) for n in names]
+        buf = np.empty(len(df.index), dtype=dtype)
+        buf['time'] = df.index.values
+        for n in names:
+            buf[n] = df[n].values
+        buf.flags.writeable = False
+        return buf
 
     def specify_outputs(self, outputs):
         """
@@ -109,22 +258,65 @@ class Model(object):
             if name not in self.output_names:
                 self.output_names.append(name)
 
-    def simulate(self, com_points=None, reset=True):
-        if com_points is None:
-            self.logger.warning('[fmi\\model] Warning! Default number '
-                                    'of communication points assumed (500)')
-            com_points = 500
-
-        if not self.parameter_df.empty:
-            self._set_all_parameters()
-
-        self.res = simulate_fmu(self.fmu_path,
-                                start_time=self.start,
-                                stop_time=self.end,
-                                output_interval=com_points,
-                                input=self.input,
-                                output=self.output_names)
-
+    def set_output_grid(self, grid):
+        """
+        Sets output time points used when no ``com_points``
+        is given in ``simulate()`` and ``simulate_batch()``,
+        e.g. the time stamps of measurements (or a decimated
+        version of them). The outputs are recorded exactly at
+        these points, so they can be compared with measurements
+        without interpolation. The first point must be equal
+        to the start time of the inputs.
+
+        In the persistent mode, communication steps end also
+        at input time stamps, so a decimated grid gives the same
+        outputs as the full one. In the non-persistent mode
+        (and with ``com_points``), inputs are sampled at the output
+        points only.
+
+        :param grid: 1D array-like, increasing time points in seconds,
+                     None to use ``com_points``
+        :return: None
+        """
+        if grid is not None:
+            grid = np.array(grid, dtype=np.float64).ravel()
+            assert grid.size > 0, 'Empty output grid'
+            assert np.all(np.diff(grid) > 0), \
+                'Output grid must be strictly increasing'
+        self.output_grid = grid
+        self.clear_checkpoint()
+
+    def simulate(self, com_points=None, reset=True, monitor=None):
+        """
+        Simulates the model and returns outputs as a DataFrame.
+
+        ``monitor`` is a callable ``monitor(grid, values, n)`` called
+        after each output sample (``values`` filled up to row ``n``).
+        If it returns True, the simulation is aborted and the
+        remaining outputs are NaN (see ``estim.error.ErrorMonitor``).
+        Requires ``persistent=True``.
+
+        :param com_points: float, output interval, optional
+                           if the output grid is set
+        :param reset: bool, not used
+        :param monitor: callable, optional
+        :return: DataFrame
+        """
+        grid = self.get_output_grid(com_points)
+
+        assert monitor is None or self.persistent, \
+            'Simulation monitor requires a persistent FMU instance'
+
+        if self.persistent:
+            grid, values = self._simulate_persistent(
+                grid, monitor=monitor, input_steps=com_points is None)
+            self.res = np.zeros(grid.size, dtype=[('time', np.float64)] +
+                                [(n, np.float64) for n in self.output_names])
+            self.res['time'] = grid
+            for j, name in enumerate(self.output_names):
+                self.res[name] = values[:, j]
+        else:
+            self.res = self._simulate_fmu(grid)
 
         df = pd.DataFrame()
         df['time'] = self.res['time']
@@ -132,28 +324,641 @@ class Model(object):
         for var in self.output_names:
             df[var] = self.res[var]
 
-        # # Reset model
-        # if reset:
-        #     try:
-        #         self.reset()
-        #     except Exception as e:
-        #         self.logger.warning(
-        #             "If you try to simulate an EnergyPlus FMU, "
-        #             "use reset=False"
-        #             )
-
         # Return
         print("Returning dataframe")
         return df
 
+    def simulate_batch(self, names, params, com_points=None, pool=None,
+                       monitors=None):
+        """
+        Simulates the model for each row of ``params`` and returns
+        outputs as a 3D array ``[n_candidates, n_times, n_outputs]``
+        (outputs ordered as in ``output_names``, times given by
+        ``get_output_grid()``). The output array is preallocated
+        and filled in place, no DataFrames are created.
+
+        Rows are simulated sequentially on this model (reusing the
+        persistent FMU instance) or distributed among the workers
+        of ``pool`` (``modestpy.fmi.pool.ModelPool``).
+        Parameters not listed in ``names`` are taken from this model.
+        After the call, the parameters of this model are set to
+        the last row.
+
+        :param names: tuple/list of strings, parameter names
+        :param params: 2D array-like [n_candidates, n_params]
+        Optional ``monitors`` (one per row, see ``simulate()``)
+        can abort simulations of individual rows (outputs of aborted
+        rows are NaN). They are not supported with ``pool``.
+
+        :param com_points: float, output interval, optional
+                           if the output grid is set
+        :param pool: ModelPool, optional
+        :param monitors: list of callables or None, optional
+        :return: 3D numpy array
+        """
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        assert params.shape[1] == len(names), \
+            'Number of columns in params must be equal to len(names)'
+
+        assert monitors is None or pool is None, \
+            'Simulation monitors are not supported with the worker pool'
+        assert monitors is None or len(monitors) == params.shape[0], \
+            'One monitor per row of params is required'
+
+        grid = self.get_output_grid(com_points)
+        out = np.empty((params.shape[0], grid.size, len(self.output_names)))
+
+        if pool is not None:
+            pool.simulate(self, names, params, com_points, out)
+        else:
+            for i in range(params.shape[0]):
+                self.parameters_from_array(names, params[i])
+                monitor = monitors[i] if monitors is not None else None
+                self._simulate_values(grid, out[i], monitor,
+                                      input_steps=com_points is None)
+
+        if pool is not None and params.shape[0] > 0:
+            self.parameters_from_array(names, params[-1])
+        return out
+
+    def get_output_grid(self, com_points=None):
+        """
+        Returns output time points of ``simulate()``
+        and ``simulate_batch()``: the grid set with ``set_output_grid()``
+        if ``com_points`` is None, otherwise time points spaced
+        by ``com_points`` between the start and end of the inputs.
+
+        :param com_points: float, output interval, optional
+        :return: 1D numpy array
+        """
+        if com_points is None:
+            if self.output_grid is not None:
+                return self.output_grid
+            self.logger.warning('[fmi\\model] Warning! Default output '
+                                'interval assumed (500 s)')
+            com_points = 500
+        return self._create_output_grid(float(self.start), float(self.end),
+                                        com_points)
+
+    def _simulate_values(self, grid, out, monitor=None, input_steps=False):
+        """
+        Simulates the model with the current parameters and writes
+        outputs to ``out`` (2D array [n_times, n_outputs]).
+
+        :param grid: 1D numpy array, output time points
+        :param out: 2D numpy array
+        :param monitor: callable, optional (see ``simulate()``)
+        :param bool input_steps: Step also at input time stamps
+                                 (see ``_simulate_persistent()``)
+        :return: None
+        """
+        if self.persistent:
+            self._simulate_persistent(grid, out=out, monitor=monitor,
+                                      input_steps=input_steps)
+        else:
+            assert monitor is None, \
+                'Simulation monitor requires a persistent FMU instance'
+
+            res = self._simulate_fmu(grid)
+            for j, name in enumerate(self.output_names):
+                out[:, j] = res[name]
+
+    def _simulate_fmu(self, grid):
+        """
+        Simulates the model with ``fmpy.simulate_fmu()``
+        (non-persistent mode) and returns its structured result.
+
+        fmpy records outputs at a fixed interval, so all steps
+        of ``grid`` except the last one (which can be shorter)
+        must be equal.
+
+        :param grid: 1D numpy array, output time points
+        :return: numpy structured array
+        """
+        self._check_output_grid(grid)
+        steps = np.diff(grid)
+        interval = steps[0] if steps.size > 0 else float(self.end) - grid[0]
+        if steps.size > 1 and \
+                not (np.allclose(steps[:-1], interval) and
+                     steps[-1] <= interval * (1. + 1e-9)):
+            raise ValueError('Output time points must be evenly spaced '
+                             'in the non-persistent mode')
+        kwargs = {
+            'start_time': grid[0],
+            'stop_time': grid[-1] if grid.size > 1 else self.end,
+            'output_interval': interval,
+            'relative_tolerance': self.tolerance,
+            'start_values': self._get_start_values(),
+            'input': self.input,
+            'output': self.output_names
+        }
+        res = self._call_simulate_fmu(kwargs)[:grid.size]
+        assert res.size == grid.size and np.allclose(res['time'], grid), \
+            'Output time points of fmpy different than the output grid'
+        return res
+
+    def _call_simulate_fmu(self, kwargs):
+        """
+        Calls ``fmpy.simulate_fmu()`` with ``kwargs``.
+
+        Solver parameters are read by the FMU in ``setupExperiment``
+        (JModelica.org), after which start values are applied,
+        so if any are given the instance is created here and
+        the parameters are set before handing it over to fmpy.
+
+        :param dict kwargs: Arguments of ``simulate_fmu()``
+        :return: numpy structured array
+        """
+        if not self.solver_values:
+            return simulate_fmu(self.fmu_path, **kwargs)
+
+        unzipdir = extract(self.fmu_path)
+        try:
+            fmu_args = dict(self.fmu_args, unzipDirectory=unzipdir)
+            fmu = FMU2Slave(**fmu_args)
+            fmu.instantiate()
+            try:
+                self._apply_solver_values(fmu)
+                return simulate_fmu(unzipdir,
+                                    model_description=self.model_description,
+                                    fmu_instance=fmu, **kwargs)
+            finally:
+                fmu.freeInstance()
+        finally:
+            shutil.rmtree(unzipdir, ignore_errors=True)
+
+    def set_checkpoint(self, time, parameters=()):
+        """
+        Enables FMU state checkpointing at ``time`` (snapped to the last
+        output point not later than ``time``). The state is saved
+        during the next simulation. Subsequent simulations start from
+        the saved state, skipping the integration up to ``time``.
+
+        The checkpoint is valid as long as only the ``parameters``
+        change between simulations. These parameters must be tunable,
+        since they are set after the FMU has been initialized.
+        Any change of other parameters, inputs, outputs or time
+        frame triggers a full simulation and a new checkpoint.
+
+        Requires ``persistent=True`` and an FMU with
+        ``canGetAndSetFMUstate``. Otherwise, a warning is logged
+        and simulations are not checkpointed.
+
+        :param time: float, checkpoint time in seconds
+        :param parameters: list of strings, parameters estimated after
+                           the checkpoint
+        :return: None
+        """
+        self.clear_checkpoint()
+
+        if not self.persistent:
+            self.logger.warning('Checkpoint requires a persistent FMU '
+                                'instance, checkpoint disabled')
+            return
+        if not self.model_description.coSimulation.canGetAndSetFMUstate:
+            self.logger.warning('FMU does not support getFMUstate/'
+                                'setFMUstate, checkpoint disabled')
+            return
+
+        for name in parameters:
+            assert name in self.variables, \
+                "Parameter '{}' not found in the FMU".format(name)
+            assert self.variables[name].variability == 'tunable', \
+                "Parameter '{}' is not tunable, it cannot be changed " \
+                "after the checkpoint".format(name)
+
+        self.checkpoint_time = float(time)
+        self.checkpoint_pars = tuple(parameters)
+
+    def clear_checkpoint(self):
+        """
+        Frees the saved FMU state (checkpoint settings are kept).
+
+        :return: None
+        """
+        if self.checkpoint is not None:
+            if self.fmu is not None:
+                self.fmu.freeFMUstate(self.checkpoint['state'])
+            self.checkpoint = None
+
+    def serialize_checkpoint(self):
+        """
+        Returns the saved checkpoint with the FMU state serialized
+        to bytes (e.g. to be sent to another process).
+        Requires ``canSerializeFMUstate``.
+
+        :return: dict or None (if no checkpoint saved)
+        """
+        if self.checkpoint is None:
+            return None
+        assert self.model_description.coSimulation.canSerializeFMUstate, \
+            'FMU does not support FMU state serialization'
+        data = dict(self.checkpoint)
+        data['state'] = self.fmu.serializeFMUstate(self.checkpoint['state'])
+        return data
+
+    def deserialize_checkpoint(self, data):
+        """
+        Loads a checkpoint returned by ``serialize_checkpoint()``
+        (possibly in another process). The checkpoint settings
+        (``set_checkpoint()``) must be the same as in the source model.
+
+        :param data: dict
+        :return: None
+        """
+        if self.fmu is None:
+            self._instantiate()
+        self.clear_checkpoint()
+        checkpoint = dict(data)
+        checkpoint['state'] = self.fmu.deSerializeFMUstate(data['state'])
+        self.checkpoint = checkpoint
+
+    def free(self):
+        """
+        Frees the persistent FMU instance and removes
+        the extracted FMU directory.
+
+        :return: None
+        """
+        self.clear_checkpoint()
+        if self.fmu is not None:
+            if self.initialized:
+                self.fmu.terminate()
+            self.fmu.freeInstance()
+            self.fmu = None
+            self.fmu_input = None
+            self.initialized = False
+        if self.unzipdir is not None:
+            shutil.rmtree(self.unzipdir, ignore_errors=True)
+            self.unzipdir = None
+
+    def _instantiate(self):
+        """
+        Extracts the FMU and instantiates the FMU 2.0 slave.
+        Called only once, on the first persistent simulation.
+
+        :return: None
+        """
+        self.logger.debug("Extracting and instantiating FMU")
+        self.unzipdir = extract(self.fmu_path)
+        self.fmu_args['unzipDirectory'] = self.unzipdir
+        self.fmu = FMU2Slave(**self.fmu_args)
+        self.fmu.instantiate()
+        self.initialized = False
+
+    def _simulate_persistent(self, grid, out=None, monitor=None,
+                             input_steps=False):
+        """
+        Simulates the model reusing the persistent FMU instance.
+        Returns output time points and a 2D array with outputs
+        [n_times, n_outputs] (``out``, if given).
+
+        If ``input_steps`` is True (output grid set with
+        ``set_output_grid()``), communication steps end also
+        at input time stamps between the output points.
+
+        :param grid: 1D numpy array, output time points
+        :param out: 2D numpy array, optional, preallocated outputs
+        :param monitor: callable, optional (see ``simulate()``)
+        :param bool input_steps: Step also at input time stamps
+        :return: tuple(1D numpy array, 2D numpy array)
+        """
+        if self.fmu is None:
+            self._instantiate()
+
+        fmu = self.fmu
+
+        # Value references resolved once per model
+        if self.output_refs is None or \
+                len(self.output_refs) != len(self.output_names):
+            self.output_refs = self._get_value_references(self.output_names)
+        if self.fmu_input is None:
+            self.fmu_input = Input(fmu, self.model_description, self.input)
+
+        self._check_output_grid(grid)
+        start = float(grid[0])
+        stop = float(self.end)
+
+        if out is None:
+            out = np.empty((grid.size, len(self.output_names)))
+        res = out
+
+        # Checkpoint
+        key = (stop, grid.tobytes(), input_steps, tuple(self.output_names))
+        checkpoint_index = self._get_checkpoint_index(grid)
+
+        if self._is_checkpoint_valid(key):
+            # Restart from the saved state
+            first = self.checkpoint['index']
+            fmu.setFMUstate(self.checkpoint['state'])
+            self._apply_free_parameters()
+            res[:first + 1] = self.checkpoint['res']
+            checkpoint_index = None  # Already saved
+        else:
+            self.clear_checkpoint()
+
+            # Reset the instance used in the previous simulation
+            if self.initialized:
+                fmu.terminate()
+                fmu.reset()
+                self.initialized = False
+
+            # Initialization (solver parameters are read
+            # by the FMU in setupExperiment)
+            self._apply_solver_values(fmu)
+            fmu.setupExperiment(tolerance=self.tolerance,
+                                startTime=start, stopTime=stop)
+            self._apply_parameters()
+            fmu.enterInitializationMode()
+            self.fmu_input.apply(start)
+            fmu.exitInitializationMode()
+            self.initialized = True
+
+            first = 0
+            self._record(res, 0)
+            if checkpoint_index == 0:
+                self._save_checkpoint(key, 0, grid, res)
+
+        # Simulation loop
+        times = self.input['time'] if input_steps else np.zeros(0)
+        for i in range(first + 1, grid.size):
+            t = grid[i - 1]
+            lo = np.searchsorted(times, t, side='right')
+            hi = np.searchsorted(times, grid[i], side='left')
+            if lo < hi or self.max_step is not None:
+                self._do_substeps(t, grid[i], times[lo:hi])
+            else:
+                self.fmu_input.apply(t, after_event=True)
+                fmu.doStep(currentCommunicationPoint=t,
+                           communicationStepSize=grid[i] - t)
+            self._record(res, i)
+            if i == checkpoint_index:
+                self._save_checkpoint(key, i, grid, res)
+            if monitor is not None and i + 1 < grid.size and \
+                    monitor(grid, res, i + 1):
+                self.logger.debug('Simulation aborted at t={}'
+                                  .format(grid[i]))
+                res[i + 1:] = np.nan
+                break
+
+        return grid, res
+
+    def _get_checkpoint_index(self, grid):
+        """
+        Returns the index of the last output point not later than
+        the checkpoint time, or None if checkpointing is disabled
+        or the checkpoint is outside the simulation period.
+
+        :param grid: 1D numpy array, output time points
+        :return: int or None
+        """
+        if self.checkpoint_time is None:
+            return None
+        if self.checkpoint_time < grid[0] or self.checkpoint_time >= grid[-1]:
+            return None
+        return int(np.searchsorted(grid, self.checkpoint_time,
+                                   side='right') - 1)
+
+    def _save_checkpoint(self, key, index, grid, res):
+        """
+        Saves the current FMU state together with the results obtained
+        so far and parameters which must not change to reuse the state.
+
+        :return: None
+        """
+        free = [self.parameter_index[name] for name in self.checkpoint_pars
+                if name in self.parameter_index]
+        fixed = np.ones(self.parameter_values.size, dtype=bool)
+        fixed[free] = False
+
+        self.checkpoint = {
+            'key': key,
+            'index': index,
+            'res': res[:index + 1].copy(),
+            'fixed': fixed,
+            'fixed_values': self.parameter_values[fixed].copy(),
+            'other': dict(self.other_parameters),
+            'state': self.fmu.getFMUstate()
+        }
+        self.logger.debug('FMU state saved at t={}'.format(grid[index]))
+
+    def _is_checkpoint_valid(self, key):
+        """
+        Checks if the saved state can be reused in the next simulation.
+
+        :return: bool
+        """
+        cp = self.checkpoint
+        if cp is None or cp['key'] != key:
+            return False
+        if cp['fixed'].size != self.parameter_values.size:
+            return False  # New parameters bound in the meantime
+        if cp['other'] != self.other_parameters:
+            return False
+        return np.array_equal(cp['fixed_values'],
+                              self.parameter_values[cp['fixed']])
+
+    def _apply_free_parameters(self):
+        """
+        Sets parameters declared as free after the checkpoint.
+
+        :return: None
+        """
+        names = [n for n in self.checkpoint_pars if n in self.parameter_index]
+        if names:
+            idx = [self.parameter_index[n] for n in names]
+            self.fmu.setReal([self.parameter_refs[i] for i in idx],
+                             self.parameter_values[idx])
+
+    def _do_substeps(self, t, t_next, samples):
+        """
+        Advances the FMU from ``t`` to ``t_next`` in substeps
+        ending at input ``samples`` between the two points
+        (inputs are not resampled if the output grid is coarser
+        than the inputs) and not longer than ``max_step``.
+        Inputs are updated at each substep.
+
+        :param float t: Current communication point
+        :param float t_next: Next communication point
+        :param samples: 1D numpy array, input time stamps
+                        in (``t``, ``t_next``)
+        :return: None
+        """
+        eps = 1e-9 * max(1., abs(t_next))
+        samples = samples[(samples - t > eps) & (t_next - samples > eps)]
+        points = np.concatenate(([t], samples, [t_next]))
+        if self.max_step is not None:
+            split = list()
+            for a, b in zip(points[:-1], points[1:]):
+                n = max(int(np.ceil((b - a) / self.max_step - 1e-9)), 1)
+                split.append(np.linspace(a, b, n + 1)[:-1])
+            points = np.append(np.concatenate(split), t_next)
+        for k in range(points.size - 1):
+            self.fmu_input.apply(points[k], after_event=True)
+            self.fmu.doStep(currentCommunicationPoint=points[k],
+                            communicationStepSize=points[k + 1] - points[k])
+
+    def _configure_solver(self):
+        """
+        Translates solver options (``opts``) into the experiment
+        tolerance, FMU solver parameters and the maximum step.
+
+        :return: None
+        """
+        unknown = [k for k in self.opts if k not in Model.SOLVER_OPTS]
+        if unknown:
+            self.logger.warning('Unsupported FMI options ignored: {}'
+                                .format(unknown))
+
+        tolerance = self.opts.get('tolerance')
+        if tolerance is not None:
+            assert tolerance > 0, 'Tolerance must be positive'
+            self.tolerance = float(tolerance)
+            if '_cs_rel_tol' in self.variables:
+                self.solver_values['_cs_rel_tol'] = self.tolerance
+
+        solver = self.opts.get('solver')
+        if solver is not None:
+            if solver not in Model.CS_SOLVERS:
+                raise ValueError('Unknown solver: {} (available: {})'
+                                 .format(solver,
+                                         sorted(Model.CS_SOLVERS.keys())))
+            if '_cs_solver' in self.variables:
+                self.solver_values['_cs_solver'] = Model.CS_SOLVERS[solver]
+            else:
+                self.logger.warning('The FMU does not allow to choose '
+                                    'the solver, option ignored')
+
+        step_size = self.opts.get('step_size')
+        if step_size is not None:
+            assert step_size > 0, 'Step size must be positive'
+            if '_cs_step_size' in self.variables:
+                self.solver_values['_cs_step_size'] = float(step_size)
+            else:
+                self.max_step = float(step_size)
+                if not self.persistent:
+                    self.logger.warning('Step size is limited only '
+                                        'in the persistent mode')
+
+    def _record(self, res, i):
+        res[i] = self.fmu.getReal(self.output_refs)
+
+    def _get_value_references(self, names):
+        """
+        Returns value references of the variables listed in ``names``.
+
+        :param names: list of strings, variable names
+        :return: list of ints
+        """
+        for name in names:
+            assert name in self.variables, \
+                "Variable '{}' not found in the FMU".format(name)
+        return [self.variables[name].valueReference for name in names]
+
+    def _check_output_grid(self, grid):
+        """
+        Asserts that ``grid`` starts at the start time of the inputs
+        and does not exceed their end time.
+
+        :param grid: 1D numpy array, output time points
+        :return: None
+        """
+        assert np.isclose(grid[0], self.start), \
+            'Output grid must start at the start time of the inputs ' \
+            '({} != {})'.format(grid[0], self.start)
+        assert grid[-1] <= self.end or np.isclose(grid[-1], self.end), \
+            'Output grid exceeds the end time of the inputs ' \
+            '({} > {})'.format(grid[-1], self.end)
+
+    @staticmethod
+    def _create_output_grid(start, stop, interval):
+        """
+        Returns output time points between ``start`` and ``stop``,
+        spaced by ``interval`` (the last step can be shorter).
+
+        :param start: float
+        :param stop: float
+        :param interval: float
+        :return: 1D numpy array
+        """
+        grid = np.arange(start, stop, interval, dtype=np.float64)
+        if grid.size == 0 or not np.isclose(grid[-1], stop):
+            grid = np.append(grid, stop)
+        return grid
+
+    def _apply_parameters(self):
+        """
+        Pushes parameter values to the persistent FMU instance.
+        All Real parameters are set in a single ``setReal`` call.
+
+        :return: None
+        """
+        if self.parameter_refs:
+            self.fmu.setReal(self.parameter_refs, self.parameter_values)
+        for name in self.other_parameters:
+            var = self.variables[name]
+            value = self.other_parameters[name]
+            if var.type == 'Boolean':
+                self.fmu.setBoolean([var.valueReference], [bool(value)])
+            else:
+                self.fmu.setInteger([var.valueReference], [int(value)])
+
+    def _apply_solver_values(self, fmu):
+        """
+        Sets solver parameters (``solver_values``) in ``fmu``.
+
+        :param fmu: FMU2Slave instance
+        :return: None
+        """
+        for name in self.solver_values:
+            var = self.variables[name]
+            value = self.solver_values[name]
+            if var.type == 'Real':
+                fmu.setReal([var.valueReference], [value])
+            else:
+                fmu.setInteger([var.valueReference], [int(value)])
+
+    def _get_start_values(self):
+        """
+        Returns parameters as a dictionary of start values
+        (used by ``fmpy.simulate_fmu()``).
+
+        :return: dict(str: float)
+        """
+        start_values = dict(zip(self.parameter_names,
+                                self.parameter_values.tolist()))
+        start_values.update(self.other_parameters)
+        return start_values
 
     def _set_parameter(self, name, value):
-        if name not in self.parameter_names:
+        """
+        Binds parameter ``name`` to its value reference (first call)
+        and updates its value.
+
+        :param name: string
+        :param value: float
+        :return: None
+        """
+        if name in self.parameter_index:
+            self.parameter_values[self.parameter_index[name]] = value
+            return
+
+        assert name in self.variables, \
+            "Parameter '{}' not found in the FMU".format(name)
+        var = self.variables[name]
+
+        if var.type == 'Real':
+            self.parameter_index[name] = len(self.parameter_names)
             self.parameter_names.append(name)
+            self.parameter_refs.append(var.valueReference)
+            self.parameter_values = np.append(self.parameter_values,
+                                              float(value))
+        else:
+            self.other_parameters[name] = value
 
     def _set_all_parameters(self):
         for var in self.parameter_df:
-            self._set_parameter(var, self.parameter_df[var])
+            self._set_parameter(var, self.parameter_df[var].iloc[0])
 
         @staticmethod
         def _merge_inputs(inputs):
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import multiprocessing
+import pickle
+import sys
+import traceback
+from multiprocessing.util import Finalize
+import numpy as np
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+# Worker state: (model copy, context) owned by the worker process
+_WORKER = None
+
+
+class WorkerError(Exception):
+    """Exception raised by a task submitted to ``ModelPool``."""
+    pass
+
+
+def _init_worker(data):
+    """
+    Worker initializer. Loads the model copy (with its own FMU
+    instance created on the first simulation) and the context.
+    """
+    global _WORKER
+    _WORKER = pickle.loads(data)
+    # Free the FMU instance and remove the extracted files on exit
+    Finalize(None, _WORKER[0].free, exitpriority=10)
+
+
+def _run(job):
+    """
+    Runs ``func(model, context, task)`` in the worker.
+
+    :param job: tuple (func, task)
+    """
+    func, task = job
+    return func(_WORKER[0], _WORKER[1], task)
+
+
+def _run_tagged(job):
+    """
+    Runs a task submitted with ``ModelPool.submit()``. Exceptions
+    are returned (as tracebacks), so the pool always reports
+    the completion of the task.
+
+    :param job: tuple (func, task, tag)
+    :return: tuple (tag, result, traceback or None)
+    """
+    func, task, tag = job
+    try:
+        return tag, _run((func, task)), None
+    except Exception:
+        return tag, None, traceback.format_exc()
+
+
+def _simulate_chunk(model, context, task):
+    """
+    Simulates a chunk of parameter rows in the worker.
+
+    :param task: tuple (base, names, rows, com_points), where base
+                 is a tuple with the parameters of the parent model
+                 (Real names, Real values, other parameters dict)
+    :return: 3D numpy array [n_rows, n_times, n_outputs]
+    """
+    base, names, rows, com_points = task
+    model.parameters_from_array(base[0], base[1])
+    for name in base[2]:
+        model._set_parameter(name, base[2][name])
+    return model.simulate_batch(names, rows, com_points)
+
+
+class ModelPool(object):
+    """
+    Pool of worker processes, each holding its own copy
+    of ``modestpy.fmi.model.Model`` (inputs, outputs,
+    parameters and a persistent FMU instance).
+
+    The copies are taken when the pool is created, so the pool
+    must be recreated if inputs or outputs of the model change.
+    Parameters are sent along with each batch.
+
+    Tasks submitted with ``submit()`` are reported by ``wait()``
+    also if they fail outside of ``func`` (e.g. the task or the
+    result cannot be pickled) or if a worker process dies.
+
+    Besides ``simulate()``, any module-level function
+    ``func(model, context, task)`` can be run in the workers
+    with ``map()`` and ``submit()``/``wait()``, where ``model``
+    is the worker's
+    copy of the model and ``context`` a copy of the object passed
+    to the constructor (e.g. ``modestpy.estim.error.ErrorContext``,
+    see ``modestpy.estim.pool.EvalPool``).
+    """
+
+    # Interval (s) of the worker liveness checks in wait()
+    CHECK_INTERVAL = 1.
+
+    def __init__(self, model, workers, context=None):
+        """
+        :param model: modestpy.fmi.model.Model
+        :param int workers: Number of worker processes
+        :param context: picklable object copied to the workers, optional
+        """
+        self.logger = logging.getLogger(type(self).__name__)
+
+        assert workers >= 1, 'Number of workers must be at least 1'
+        self.workers = int(workers)
+
+        # Model signature, used to detect stale worker copies
+        self.output_names = list(model.output_names)
+        self.timeline = np.array(model.timeline)
+
+        # Completed submitted tasks (tag, result, traceback or None)
+        self.completed = queue.Queue()
+        self.pending = 0
+
+        self.logger.debug('Starting {} worker processes'
+                          .format(self.workers))
+        self.pool = multiprocessing.Pool(
+            self.workers, initializer=_init_worker,
+            initargs=(pickle.dumps((model, context),
+                                   pickle.HIGHEST_PROTOCOL), ))
+        # Worker processes (a dead worker is replaced by the pool,
+        # but its task is lost)
+        self.procs = list(self.pool._pool)
+
+    def simulate(self, model, names, params, com_points, out):
+        """
+        Simulates rows of ``params`` in the workers and writes
+        outputs to ``out`` [n_candidates, n_times, n_outputs].
+        Called by ``Model.simulate_batch()``.
+
+        :param model: modestpy.fmi.model.Model, parent model
+        :param names: tuple/list of strings, parameter names
+        :param params: 2D numpy array [n_candidates, n_params]
+        :param com_points: float, output interval
+        :param out: 3D numpy array
+        :return: None
+        """
+        assert self.pool is not None, 'Pool is closed'
+        assert model.output_names == self.output_names and \
+            np.array_equal(model.timeline, self.timeline), \
+            'Model inputs/outputs changed after the pool was created'
+
+        n = params.shape[0]
+        if n == 0:
+            return
+
+        base = (list(model.parameter_names), model.parameter_values.copy(),
+                dict(model.other_parameters))
+        chunks = np.array_split(np.arange(n), min(n, 4 * self.workers))
+        tasks = [(base, tuple(names), params[idx], com_points)
+                 for idx in chunks]
+
+        for idx, values in zip(chunks, self.map(_simulate_chunk, tasks)):
+            out[idx] = values
+
+    def map(self, func, tasks):
+        """
+        Runs ``func(model, context, task)`` for each task
+        in the workers.
+
+        :param func: module-level function
+        :param tasks: list of picklable tasks
+        :return: list of results (in the order of ``tasks``)
+        """
+        assert self.pool is not None, 'Pool is closed'
+        return self.pool.map(_run, [(func, task) for task in tasks])
+
+    def submit(self, func, task, tag=None):
+        """
+        Runs ``func(model, context, task)`` in one worker
+        and returns immediately (asynchronous version of ``map()``).
+        The result is returned by ``wait()`` along with ``tag``.
+
+        :param func: module-level function
+        :param task: picklable task
+        :param tag: identifies the task in ``wait()``
+        :return: None
+        """
+        assert self.pool is not None, 'Pool is closed'
+        kwargs = {'callback': self.completed.put}
+        if sys.version_info[0] >= 3:  # No error callback in Python 2
+            kwargs['error_callback'] = self._get_error_callback(tag)
+        self.pool.apply_async(_run_tagged, ((func, task, tag), ), **kwargs)
+        self.pending += 1
+
+    def wait(self):
+        """
+        Waits for any task submitted with ``submit()`` to finish
+        (in the order of completion).
+
+        :return: tuple (tag, result)
+        :raises WorkerError: if the task failed or a worker died
+        """
+        assert self.pending > 0, 'No submitted tasks'
+        while True:
+            try:
+                tag, result, failure = self.completed.get(
+                    timeout=ModelPool.CHECK_INTERVAL)
+                break
+            except queue.Empty:
+                dead = [p.pid for p in self.procs if p.exitcode is not None]
+                if dead:
+                    raise WorkerError('Worker process {} terminated '
+                                      'unexpectedly'.format(dead[0]))
+        self.pending -= 1
+        if failure is not None:
+            raise WorkerError('Task {} failed:\n{}'.format(tag, failure))
+        return tag, result
+
+    def _get_error_callback(self, tag):
+        """
+        Returns a function reporting the failure of the task ``tag``
+        raised outside of ``_run_tagged()`` (called by the pool).
+        """
+        def error_callback(exc):
+            self.completed.put((tag, None, '{}: {}'.format(
+                type(exc).__name__, exc)))
+        return error_callback
+
+    def close(self):
+        """
+        Stops the workers (FMU instances are freed). Outstanding
+        submitted tasks are cancelled (the workers are terminated).
+
+        :return: None
+        """
+        if self.pool is not None:
+            if self.pending > 0:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
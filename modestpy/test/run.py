@@ -17,6 +17,10 @@ from modestpy.test import test_ps
 from modestpy.test import test_scipy
 from modestpy.test import test_estimation
 from modestpy.test import test_utilities
+from modestpy.test import test_fmi
+from modestpy.test import test_trajectory
+from modestpy.test import test_error
+from modestpy.test import test_optimizer
 
 
 def all_suites():
@@ -26,7 +30,11 @@ def all_suites():
         test_ps.suite(),
         test_scipy.suite(),
         test_estimation.suite(),
-        test_utilities.suite()
+        test_utilities.suite(),
+        test_fmi.suite(),
+        test_trajectory.suite(),
+        test_error.suite(),
+        test_optimizer.suite()
     ]
 
     all_suites = unittest.TestSuite(suites)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import pandas as pd
+from modestpy.estim.error import calc_err, calc_err_batch, ErrorContext
+
+
+class TestError(unittest.TestCase):
+
+    def setUp(self):
+        time = np.arange(0., 3600., 60.)
+        self.ideal = pd.DataFrame({'a': np.sin(time / 600.) + 2.,
+                                   'b': np.full(time.size, 4.)},
+                                  index=pd.Index(time, name='time'))
+
+    def _reference(self, result, ftype, forgetting=False):
+        # Original implementation: ideal and result rows merged,
+        # sorted by time and interpolated by row position
+        ideal = self.ideal.rename(columns=lambda x: x + '_ideal')
+        model = result.rename(columns=lambda x: x + '_model')
+        comp = pd.concat([ideal, model], sort=False)
+        comp = comp.sort_index().interpolate().bfill()
+        weights = np.linspace(0., 1., len(comp)) if forgetting \
+            else np.ones(len(comp))
+        error = dict()
+        for v in self.ideal.columns:
+            se = (comp[v + '_ideal'] - comp[v + '_model']) ** 2 * weights
+            error[v] = np.sqrt(se.mean())
+            if ftype == 'NRMSE':
+                error[v] /= comp[v + '_ideal'].abs().mean()
+        error['tot'] = sum(error[v] for v in self.ideal.columns)
+        return error
+
+    def test_aligned(self):
+        result = self.ideal * 1.1 - 0.05
+        for ftype in ('RMSE', 'NRMSE'):
+            for forgetting in (False, True):
+                error = calc_err(result, self.ideal, forgetting, ftype)
+                ref = self._reference(result, ftype, forgetting)
+                for key in ref:
+                    self.assertAlmostEqual(error[key], ref[key])
+
+    def test_interpolation(self):
+        # Result given on a coarser (and longer) grid
+        ctx = ErrorContext(self.ideal, ftype='NRMSE')
+        time = np.arange(-300., 4000., 150.)
+        result = pd.DataFrame({'a': 2. + np.cos(time / 500.),
+                               'b': 4. + time / 1000.}, index=time)
+        ref = self._reference(result, 'NRMSE')
+        for _ in range(2):  # Second call reuses the merge
+            error = ctx.calc(result)
+            for key in ref:
+                self.assertAlmostEqual(error[key], ref[key])
+
+    def test_batch(self):
+        results = [self.ideal * k + 0.1 * k for k in (0.9, 1., 1.2)]
+        values = np.stack([r.values for r in results])
+        time = self.ideal.index.values
+        for ftype in ('RMSE', 'NRMSE'):
+            for forgetting in (False, True):
+                tot, partial = calc_err_batch(values, time, self.ideal,
+                                              forgetting, ftype)
+                self.assertEqual(tot.shape, (3,))
+                self.assertEqual(partial.shape, (3, 2))
+                for i, result in enumerate(results):
+                    ref = calc_err(result, self.ideal, forgetting, ftype)
+                    self.assertAlmostEqual(tot[i], ref['tot'])
+                    self.assertAlmostEqual(partial[i, 0], ref['a'])
+                    self.assertAlmostEqual(partial[i, 1], ref['b'])
+
+        # Misaligned grid
+        ctx = ErrorContext(self.ideal)
+        coarse = time[::3]
+        tot, partial = ctx.calc_batch(values[:, ::3, :], coarse)
+        dicts = ctx.get_error_dicts(partial)
+        for i, result in enumerate(results):
+            ref = ctx.calc(result.iloc[::3])
+            self.assertAlmostEqual(dicts[i]['tot'], ref['tot'])
+            self.assertAlmostEqual(tot[i], ref['tot'])
+
+    def test_monitor(self):
+        time = np.arange(0., 3700., 100.)
+        values = np.column_stack([np.cos(time / 600.) + 2.,
+                                  np.full(time.size, 4.5)])
+        for forgetting in (False, True):
+            ctx = ErrorContext(self.ideal, forgetting=forgetting)
+            final = ctx.calc_batch(values[np.newaxis], time)[0][0]
+
+            # Bound never exceeds the final error (up to rounding)
+            monitor = ctx.get_monitor(final + 1e-12, chunk=1)
+            for n in range(1, time.size + 1):
+                self.assertFalse(monitor(time, values, n))
+                self.assertLessEqual(monitor.bound, final + 1e-12)
+            self.assertAlmostEqual(monitor.bound, final)
+
+            # Abort
+            monitor = ctx.get_monitor(0.5 * final, chunk=5)
+            for n in range(1, time.size + 1):
+                if monitor(time, values, n):
+                    break
+            self.assertTrue(monitor.aborted)
+            self.assertLess(n, time.size)
+            self.assertEqual(n % 5, 0)
+            error = monitor.get_error()
+            # Only numeric errors (abort status is monitor.aborted)
+            self.assertEqual(sorted(error.keys()),
+                             sorted(ctx.variables + ['tot']))
+            self.assertGreater(error['tot'], 0.5 * final)
+            self.assertGreaterEqual(error['tot'], monitor.bound)
+
+        # Rows not simulated yet are never used (aligned grids)
+        ctx = ErrorContext(self.ideal)
+        values = np.full((len(self.ideal), 2), np.nan)
+        values[:10] = self.ideal.values[:10] + 0.1
+        monitor = ctx.get_monitor(1e6, chunk=1)
+        self.assertFalse(monitor(self.ideal.index.values, values, 10))
+        self.assertGreater(monitor.done, 0)
+        self.assertTrue(np.isfinite(monitor.bound))
+        self.assertGreater(monitor.bound, 0.)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            ErrorContext(self.ideal, ftype='MAE')
+        zero = self.ideal.copy()
+        zero['b'] = 0.
+        for ftype in ErrorContext.FTYPES:
+            with self.assertRaises(ZeroDivisionError):
+                calc_err(zero, zero, ftype=ftype)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(TestError('test_aligned'))
+    suite.addTest(TestError('test_interpolation'))
+    suite.addTest(TestError('test_batch'))
+    suite.addTest(TestError('test_monitor'))
+    suite.addTest(TestError('test_errors'))
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main()
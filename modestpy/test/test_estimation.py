@@ -18,6 +18,9 @@ import json
 import os
 import pandas as pd
 from modestpy import Estimation
+from modestpy.estim.ga.ga import GA
+from modestpy.estim.ga.islands import IslandGA
+from modestpy.test.test_optimizer import RandomSearch
 from modestpy.utilities.sysarch import get_sys_arch
 
 
@@ -176,6 +179,62 @@ class TestEstimation(unittest.TestCase):
             "Different estimates obtained despite the same seed"
             )
 
+    def test_disk_cache(self):
+        ga_opts = {'maxiter': 2, 'pop_size': 6}
+        ps_opts = {'maxiter': 2}
+        estimates = list()
+        sessions = list()
+        for i in range(2):
+            session = Estimation(self.tmpdir, self.fmu_path, self.inp,
+                                 self.known, self.est, self.ideal,
+                                 lp_n=1, lp_len=3600, lp_frame=(0, 3600),
+                                 vp=(20000, 40000), ic_param={'Tstart': 'T'},
+                                 methods=('GA', 'PS'),
+                                 ga_opts=ga_opts, ps_opts=ps_opts,
+                                 seed=1, ftype='RMSE', disk_cache=True)
+            estimates.append(session.estimate())
+            sessions.append(session)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.tmpdir, Estimation.DISK_CACHE_FILE)))
+        # Second run is served from disk
+        self.assertEqual(sessions[0].cache_stats['disk_hits'], 0)
+        self.assertEqual(sessions[1].cache_stats['misses'], 0)
+        self.assertGreater(sessions[1].cache_stats['disk_hits'], 0)
+        for key in estimates[0]:
+            self.assertEqual(estimates[0][key], estimates[1][key])
+
+    def test_lp_workers(self):
+        ps_opts = {'maxiter': 2}
+        known = dict(self.known)
+        outputs = dict()
+        for islands in (None, 2):
+            ga_opts = {'maxiter': 2, 'pop_size': 6, 'islands': islands}
+            for lp_workers in (1, 2):
+                workdir = os.path.join(self.tmpdir,
+                                       '{}_{}'.format(islands, lp_workers))
+                os.mkdir(workdir)
+                session = Estimation(workdir, self.fmu_path, self.inp,
+                                     self.known, self.est, self.ideal,
+                                     lp_n=2, lp_len=3600,
+                                     lp_frame=(0, 7200),
+                                     vp=(20000, 40000),
+                                     ic_param={'Tstart': 'T'},
+                                     methods=('GA', 'PS'),
+                                     ga_opts=ga_opts, ps_opts=ps_opts,
+                                     seed=1, ftype='RMSE',
+                                     lp_workers=lp_workers)
+                session.estimate()
+                outputs[lp_workers] = [
+                    pd.read_csv(os.path.join(workdir, f))
+                    for f in ('best_per_run.csv', 'final.csv')]
+                # IC parameters are not added to the known parameters
+                self.assertEqual(session.known, known)
+
+            # Parallel and serial runs give the same results (each period
+            # has its own seed, islands in workers run in-process)
+            for serial, parallel in zip(outputs[1], outputs[2]):
+                pd.testing.assert_frame_equal(serial, parallel)
+
     def test_ps_only(self):
         ga_opts = {'maxiter': 0}
         ps_opts = {'maxiter': 1}
@@ -199,6 +258,64 @@ class TestEstimation(unittest.TestCase):
         ps_return = session.PS_OPTS
         self.assertDictContainsSubset(ga_opts, ga_return)
         self.assertDictContainsSubset(ps_opts, ps_return)
+        self.assertIs(session.method_dict['GA'][0], GA)
+        self.assertNotIn('islands', session.method_dict['GA'][1])
+
+        # Island model
+        session = Estimation(self.tmpdir, self.fmu_path, self.inp,
+                             self.known, self.est, self.ideal,
+                             ga_opts={'islands': 2})
+        self.assertIs(session.method_dict['GA'][0], IslandGA)
+
+    def test_fmi_opts(self):
+        # Method solver options are merged with the global ones
+        fmi_opts = {'tolerance': 1e-6, 'solver': 'CVode'}
+        ga_opts = {'maxiter': 2, 'pop_size': 6,
+                   'fmi_opts': {'tolerance': 1e-3, 'solver': 'Euler',
+                                'step_size': 10.}}
+        ps_opts = {'maxiter': 2}
+        session = Estimation(self.tmpdir, self.fmu_path, self.inp,
+                             self.known, self.est, self.ideal,
+                             lp_n=1, lp_len=3600, seed=1,
+                             ga_opts=ga_opts, ps_opts=ps_opts,
+                             fmi_opts=fmi_opts)
+        self.assertEqual(session.GA_OPTS['fmi_opts'],
+                         {'tolerance': 1e-3, 'solver': 'Euler',
+                          'step_size': 10.})
+        self.assertEqual(session.PS_OPTS['fmi_opts'], fmi_opts)
+        self.assertEqual(fmi_opts, {'tolerance': 1e-6, 'solver': 'CVode'})
+        estimates = session.estimate()
+        self.assertEqual(set(estimates.keys()), set(self.est.keys()))
+
+    def test_strategy(self):
+        # Ask/tell strategies are accepted by method_dict
+        session = Estimation(self.tmpdir, self.fmu_path, self.inp,
+                             self.known, self.est, self.ideal,
+                             lp_n=1, lp_len=3600, seed=1,
+                             methods=('RANDOM', 'PS'), ps_opts={'maxiter': 2})
+        session.method_dict['RANDOM'] = (RandomSearch, {'batch': 3})
+        estimates = session.estimate()
+        self.assertEqual(set(estimates.keys()), set(self.est.keys()))
+        summary = pd.read_csv(os.path.join(self.tmpdir, 'summary_1.csv'))
+        self.assertEqual(set(summary['_method_']), {'RS', 'PS'})
+
+    def test_log_scale(self):
+        est = {p: tuple(v) + ('log', ) for p, v in self.est.items()}
+        session = Estimation(self.tmpdir, self.fmu_path, self.inp,
+                             self.known, est, self.ideal,
+                             lp_n=1, lp_len=3600, seed=1,
+                             methods=('GA', 'PS'),
+                             ga_opts={'maxiter': 2, 'pop_size': 6},
+                             ps_opts={'maxiter': 2})
+        estimates = session.estimate()
+        for p in est:
+            self.assertGreaterEqual(estimates[p], est[p][1])
+            self.assertLessEqual(estimates[p], est[p][2])
+
+        est['C'] = (1000., 500., 10000., 'exp')
+        with self.assertRaises(ValueError):
+            Estimation(self.tmpdir, self.fmu_path, self.inp,
+                       self.known, est, self.ideal)
 
 
 def suite():
@@ -209,7 +326,12 @@ def suite():
     suite.addTest(TestEstimation('test_ga_only'))
     suite.addTest(TestEstimation('test_ps_only'))
     suite.addTest(TestEstimation('test_opts'))
+    suite.addTest(TestEstimation('test_fmi_opts'))
+    suite.addTest(TestEstimation('test_strategy'))
+    suite.addTest(TestEstimation('test_log_scale'))
     suite.addTest(TestEstimation('test_seed'))
+    suite.addTest(TestEstimation('test_disk_cache'))
+    suite.addTest(TestEstimation('test_lp_workers'))
 
     return suite
 
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import os
+import numpy as np
+import pandas as pd
+from modestpy.fmi.model import Model
+from modestpy.fmi.pool import ModelPool
+from modestpy.fmi.pool import WorkerError
+from modestpy.utilities.sysarch import get_sys_arch
+
+
+def _get_outputs(model, context, task):
+    """Task run in the workers of ModelPool (test_simulate_batch)"""
+    if task is None:
+        raise ValueError('Task failed')
+    return list(model.output_names), context, task
+
+
+def _get_unpicklable(model, context, task):
+    """Task with a result which cannot be sent back (test_simulate_batch)"""
+    return lambda: task
+
+
+def _kill_worker(model, context, task):
+    """Task terminating the worker process (test_simulate_batch)"""
+    os._exit(1)
+
+
+class TestFMI(unittest.TestCase):
+
+    def setUp(self):
+
+        # Platform (win32, win64, linux32, linux64)
+        platform = get_sys_arch()
+        assert platform, 'Unsupported platform type!'
+
+        # Parent directory
+        parent = os.path.dirname(__file__)
+
+        # Resources
+        self.fmu_path = os.path.join(parent, 'resources', 'simple2R1C',
+                                     'Simple2R1C_{}.fmu'.format(platform))
+        self.inp_path = os.path.join(parent, 'resources', 'simple2R1C',
+                                     'inputs.csv')
+        self.par_path = os.path.join(parent, 'resources', 'simple2R1C',
+                                     'parameters.csv')
+
+        # Assert there is an FMU for this platform
+        assert os.path.exists(self.fmu_path), \
+            "FMU for this platform ({}) doesn't exist.\n".format(platform) + \
+            "No such file: {}".format(self.fmu_path)
+
+    def _get_model(self, persistent, opts=None):
+        model = Model(self.fmu_path, opts=opts, persistent=persistent)
+        model.parameters_from_csv(self.par_path)
+        model.specify_outputs(['T'])
+        model.inputs_from_csv(self.inp_path)
+        return model
+
+    def test_persistent(self):
+        reference = self._get_model(persistent=False).simulate(3599)
+
+        model = self._get_model(persistent=True)
+        res1 = model.simulate(3599)
+        res2 = model.simulate(3599)  # Reused instance
+        model.free()
+
+        self.assertTrue(np.allclose(res1.index, reference.index))
+        self.assertTrue(np.allclose(res1['T'], reference['T']))
+        self.assertTrue(np.allclose(res2['T'], reference['T']))
+        self.assertIsNone(model.fmu)
+        self.assertIsNone(model.unzipdir)
+
+    def test_parameters(self):
+        model = self._get_model(persistent=True)
+        res1 = model.simulate(3599)
+
+        # Same parameters set through the array interface
+        model.parameters_from_array(('R1', 'R2', 'C'), [0.1, 0.25, 2000.])
+        res2 = model.simulate(3599)
+        self.assertTrue(np.allclose(res1['T'], res2['T']))
+
+        # Different parameters must give a different result
+        model.parameters_from_array(('R1', 'R2', 'C'), [0.2, 0.05, 8000.])
+        res3 = model.simulate(3599)
+        self.assertFalse(np.allclose(res1['T'], res3['T']))
+        self.assertEqual(model.parameter_df['C'].iloc[0], 8000.)
+        model.free()
+
+    def test_inputs(self):
+        model = self._get_model(persistent=True)
+        res1 = model.simulate(3599)
+
+        # Read-only structured buffer shared by all simulations
+        self.assertFalse(model.input.flags.writeable)
+        self.assertEqual(model.input.dtype.names, ('time', 'Ti1', 'Ti2'))
+
+        # Inputs from DataFrame
+        df = pd.read_csv(self.inp_path).set_index('time')
+        model.inputs_from_df(df)
+        res2 = model.simulate(3599)
+        self.assertTrue(np.allclose(res1['T'], res2['T']))
+        model.free()
+
+    def test_checkpoint_unsupported(self):
+        # Simple2R1C does not support getFMUstate/setFMUstate,
+        # so checkpointing must be disabled without affecting results
+        model = self._get_model(persistent=True)
+        res1 = model.simulate(3599)
+        model.set_checkpoint(100000.)
+        self.assertIsNone(model.checkpoint_time)
+        res2 = model.simulate(3599)
+        self.assertIsNone(model.checkpoint)
+        self.assertTrue(np.allclose(res1['T'], res2['T']))
+        model.free()
+
+    def test_simulate_batch(self):
+        names = ('R1', 'R2', 'C')
+        params = np.array([[0.1, 0.25, 2000.],
+                           [0.2, 0.05, 8000.],
+                           [0.15, 0.1, 4000.]])
+        model = self._get_model(persistent=True)
+        grid = model.get_output_grid(60.)
+
+        # Reference: one simulation per parameter set
+        reference = list()
+        for row in params:
+            model.parameters_from_array(names, row)
+            reference.append(model.simulate(60.)['T'].values)
+
+        out = model.simulate_batch(names, params, 60.)
+        self.assertEqual(out.shape, (3, grid.size, 1))
+        for i in range(3):
+            self.assertTrue(np.allclose(out[i, :, 0], reference[i]))
+
+        # Worker pool
+        with ModelPool(model, 2, context='ctx') as pool:
+            out_pool = model.simulate_batch(names, params, 60., pool=pool)
+
+            # Asynchronous tasks, exceptions are raised by wait()
+            pool.submit(_get_outputs, 1, tag='a')
+            self.assertEqual(pool.wait(), ('a', (['T'], 'ctx', 1)))
+            pool.submit(_get_outputs, None, tag='b')
+            with self.assertRaises(WorkerError):
+                pool.wait()
+            self.assertEqual(pool.pending, 0)
+            pool.submit(_get_unpicklable, 2, tag='c')
+            with self.assertRaises(WorkerError):
+                pool.wait()
+            self.assertEqual(pool.pending, 0)
+
+            # Dead worker (the lost task is cancelled by close())
+            pool.submit(_kill_worker, 3, tag='d')
+            with self.assertRaises(WorkerError):
+                pool.wait()
+        self.assertTrue(np.array_equal(out, out_pool))
+        model.free()
+
+    def test_output_grid(self):
+        model = self._get_model(persistent=True)
+        times = model.input['time']
+        reference = model.simulate(60.)
+
+        # Input time stamps (and a decimated version of them,
+        # giving the same outputs)
+        for grid in (times, times[::7]):
+            model.set_output_grid(grid)
+            res = model.simulate()
+            self.assertTrue(np.array_equal(res.index.values, grid))
+            self.assertTrue(np.allclose(res['T'], reference['T'].loc[grid]))
+            self.assertTrue(np.array_equal(model.get_output_grid(), grid))
+
+        # Uneven grid
+        grid = np.concatenate((times[:10], times[20::30]))
+        model.set_output_grid(grid)
+        res = model.simulate()
+        self.assertTrue(np.array_equal(res.index.values, grid))
+        self.assertTrue(np.allclose(res['T'], reference['T'].loc[grid]))
+
+        # Explicit com_points take precedence
+        res = model.simulate(600.)
+        self.assertTrue(np.array_equal(res.index.values,
+                                       model.get_output_grid(600.)))
+        model.free()
+
+        # Non-persistent mode supports only evenly spaced grids
+        model = self._get_model(persistent=False)
+        # (inputs sampled at the output points)
+        model.set_output_grid(times[::7])
+        res = model.simulate()
+        self.assertTrue(np.array_equal(res.index.values, times[::7]))
+        self.assertTrue(np.allclose(res['T'], reference['T'].loc[times[::7]],
+                                    atol=0.2))
+        model.set_output_grid(grid)
+        with self.assertRaises(ValueError):
+            model.simulate()
+
+        with self.assertRaises(AssertionError):
+            model.set_output_grid(times[::-1])
+
+    def test_solver_opts(self):
+        reference = self._get_model(persistent=True).simulate(60.)
+
+        # Solver parameters of the FMU
+        opts = {'tolerance': 1e-3, 'solver': 'Euler', 'step_size': 1.}
+        model = self._get_model(persistent=True, opts=opts)
+        self.assertEqual(model.solver_values,
+                         {'_cs_rel_tol': 1e-3, '_cs_solver': 1,
+                          '_cs_step_size': 1.})
+        res1 = model.simulate(60.)
+        self.assertFalse(np.array_equal(res1['T'], reference['T']))
+        self.assertTrue(np.allclose(res1['T'], reference['T'], atol=0.1))
+
+        # Same settings in fmpy.simulate_fmu()
+        res2 = self._get_model(persistent=False, opts=opts).simulate(60.)
+        self.assertTrue(np.allclose(res1['T'], res2['T']))
+        model.free()
+
+        # Communication steps split into substeps
+        # (inputs are updated at each substep)
+        model = self._get_model(persistent=True)
+        model.max_step = 60.
+        res3 = model.simulate(60.)
+        self.assertTrue(np.array_equal(res3['T'], reference['T']))
+        model.max_step = 25.
+        res4 = model.simulate(60.)
+        self.assertFalse(np.array_equal(res4['T'], reference['T']))
+        self.assertTrue(np.allclose(res4['T'], reference['T'], atol=0.05))
+        model.free()
+
+        with self.assertRaises(ValueError):
+            Model(self.fmu_path, opts={'solver': 'RK4'})
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(TestFMI('test_persistent'))
+    suite.addTest(TestFMI('test_parameters'))
+    suite.addTest(TestFMI('test_inputs'))
+    suite.addTest(TestFMI('test_checkpoint_unsupported'))
+    suite.addTest(TestFMI('test_simulate_batch'))
+    suite.addTest(TestFMI('test_output_grid'))
+    suite.addTest(TestFMI('test_solver_opts'))
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,6 +20,8 @@ import random
 import pandas as pd
 import numpy as np
 from modestpy.estim.ga.ga import GA
+from modestpy.estim.ga.algorithm import EvolutionConfig
+from modestpy.estim.ga.islands import IslandGA
 from modestpy.utilities.sysarch import get_sys_arch
 
 
@@ -90,6 +92,213 @@ class TestGA(unittest.TestCase):
             next_err = errors[i]
             self.assertGreaterEqual(prev_err, next_err)
 
+    def test_cache(self):
+        random.seed(1)
+        ga = GA(self.fmu_path, self.inp, self.known,
+                self.est, self.ideal, maxiter=self.gen,
+                pop_size=self.pop, trm_size=self.trm)
+        ga.estimate()
+        cache = ga.get_cache()
+
+        # The elite individual is not simulated again
+        self.assertGreaterEqual(cache.hits, self.gen - 1)
+        self.assertEqual(cache.hits + cache.misses, self.gen * self.pop)
+
+        # Cached error is the same as the error of the fittest individual
+        fittest = ga.pop.get_fittest()
+        _, err = cache.get(fittest.est_par_names, fittest.est_par_values)
+        self.assertEqual(err['tot'], ga.get_error())
+
+    def test_workers(self):
+        results = list()
+        for workers in (1, 3):
+            random.seed(1)
+            ga = GA(self.fmu_path, self.inp, self.known,
+                    self.est, self.ideal, maxiter=self.gen,
+                    pop_size=self.pop, trm_size=self.trm, workers=workers)
+            estimates = ga.estimate()
+            results.append((estimates, ga.get_errors(), ga.get_sim_res()))
+
+        # Results do not depend on the number of workers
+        pd.testing.assert_frame_equal(results[0][0], results[1][0])
+        self.assertEqual(results[0][1], results[1][1])
+        pd.testing.assert_frame_equal(results[0][2], results[1][2])
+
+    def test_array_engine(self):
+        random.seed(1)
+        ga = GA(self.fmu_path, self.inp, self.known,
+                self.est, self.ideal, maxiter=self.gen,
+                pop_size=self.pop, trm_size=self.trm)
+        ga.estimate()
+
+        runs = list()
+        for i in range(2):
+            random.seed(1)
+            np.random.seed(4)
+            ga_arr = GA(self.fmu_path, self.inp, self.known,
+                        self.est, self.ideal, maxiter=self.gen,
+                        pop_size=self.pop, trm_size=self.trm, engine='array')
+            runs.append((ga_arr.estimate(), ga_arr.get_errors()))
+
+        # Reproducible with numpy seed
+        pd.testing.assert_frame_equal(runs[0][0], runs[1][0])
+        self.assertEqual(runs[0][1], runs[1][1])
+
+        # Same outputs as the object engine
+        self.assertEqual(list(runs[0][0].columns),
+                         list(ga.get_estimates().columns))
+        traj = ga_arr.get_full_solution_trajectory()
+        self.assertEqual(list(traj.columns),
+                         list(ga.get_full_solution_trajectory().columns))
+        self.assertEqual(len(traj.index), self.gen)
+        self.assertEqual(list(ga_arr.all_estim_and_err.columns),
+                         list(ga.all_estim_and_err.columns))
+        self.assertFalse(ga_arr.get_sim_res().empty)
+
+        # Same initial population, same first generation
+        self.assertEqual(runs[0][1][0], ga.get_errors()[0])
+
+        # Errors do not increase (elitism)
+        errors = runs[0][1]
+        for i in range(1, len(errors)):
+            self.assertGreaterEqual(errors[i-1], errors[i])
+
+    def test_early_abort(self):
+        for engine in GA.ENGINES:
+            random.seed(1)
+            np.random.seed(4)
+            ga = GA(self.fmu_path, self.inp, self.known,
+                    self.est, self.ideal, maxiter=self.gen,
+                    pop_size=self.pop, trm_size=self.trm,
+                    engine=engine, early_abort=True)
+            estimates = ga.estimate()
+            self.assertEqual(len(estimates.index), 1)
+            self.assertFalse(ga.get_sim_res().empty)
+
+            # Errors do not increase (elitism)
+            errors = ga.get_errors()
+            for i in range(1, len(errors)):
+                self.assertGreaterEqual(errors[i-1], errors[i])
+
+    def test_fidelity(self):
+        rungs = [(0.25, 0.5), (0.5, 0.5)]
+        for engine in GA.ENGINES:
+            random.seed(1)
+            np.random.seed(4)
+            ga = GA(self.fmu_path, self.inp, self.known,
+                    self.est, self.ideal, maxiter=self.gen,
+                    pop_size=self.pop, trm_size=self.trm,
+                    engine=engine, fidelity=rungs)
+            ga.estimate()
+
+            # Fidelity of each error is recorded
+            history = ga.all_estim_and_err
+            self.assertTrue(set(history['_fidelity_']) <= {0.25, 0.5, 1.})
+            self.assertTrue((history['_fidelity_'] < 1.).any())
+
+            # Fittest individuals are evaluated over the full period
+            full = history[history['_fidelity_'] == 1.]
+            errors = ga.get_errors()
+            self.assertEqual(errors[-1], full['_error_'].min())
+            for i in range(1, len(errors)):
+                self.assertGreaterEqual(errors[i-1], errors[i])
+            error = ga.pop.get_fittest().error
+            self.assertTrue(np.isfinite(list(error.values())).all())
+
+    def test_steady_state(self):
+        for workers, replacement in ((1, 'worst'), (2, 'tournament')):
+            random.seed(1)
+            np.random.seed(4)
+            ga = GA(self.fmu_path, self.inp, self.known,
+                    self.est, self.ideal, maxiter=self.gen,
+                    pop_size=self.pop, trm_size=self.trm, workers=workers,
+                    steady_state=True, replacement=replacement)
+            estimates = ga.estimate()
+            self.assertEqual(len(estimates.index), 1)
+            self.assertFalse(ga.get_sim_res().empty)
+
+            # Budget of maxiter generation equivalents
+            cache = ga.get_cache()
+            self.assertEqual(cache.hits + cache.misses, self.gen * self.pop)
+            self.assertEqual(len(ga.get_full_solution_trajectory().index),
+                             self.gen)
+
+            # Errors do not increase (only worse individuals are replaced)
+            errors = ga.get_errors()
+            self.assertEqual(errors[-1], ga.all_estim_and_err['_error_'].min())
+            for i in range(1, len(errors)):
+                self.assertGreaterEqual(errors[i-1], errors[i])
+
+    def test_islands(self):
+        np.random.seed(4)
+        ga = IslandGA(self.fmu_path, self.inp, self.known,
+                      self.est, self.ideal, islands=2, migration=2,
+                      migrants=2, maxiter=self.gen, pop_size=self.pop,
+                      trm_size=self.trm)
+        estimates = ga.estimate()
+        self.assertEqual(len(estimates.index), 1)
+        self.assertFalse(ga.get_sim_res().empty)
+
+        # Fittest individual of all islands in each generation
+        traj = ga.get_full_solution_trajectory()
+        self.assertEqual(len(traj.index), self.gen)
+        self.assertEqual(traj['_error_'].tolist(), ga.get_errors())
+        self.assertEqual(ga.get_error(), ga.get_errors()[-1])
+
+        # Per-island trajectories
+        islands = ga.get_full_solution_trajectory(islands=True)
+        self.assertEqual(len(islands.index), 2 * self.gen)
+        self.assertEqual(set(islands['_island_']), {1, 2})
+        best = islands.groupby(level=0)['_error_'].min()
+        self.assertEqual(best.tolist(), ga.get_errors())
+        history = ga.all_estim_and_err
+        self.assertEqual(len(history.index), 2 * self.gen * self.pop)
+        self.assertEqual(set(history['_island_']), {1, 2})
+
+        # Errors do not increase (elitism on each island)
+        for k in (1, 2):
+            errors = islands[islands['_island_'] == k]['_error_'].tolist()
+            for i in range(1, len(errors)):
+                self.assertGreaterEqual(errors[i-1], errors[i])
+
+    def test_config(self):
+        def get_ga(mut, trm_size):
+            return GA(self.fmu_path, self.inp, self.known,
+                      self.est, self.ideal, maxiter=self.gen,
+                      pop_size=self.pop, trm_size=trm_size, mut=mut,
+                      engine='array')
+
+        random.seed(1)
+        np.random.seed(4)
+        ref = get_ga(0.5, 3)
+        ref.estimate()
+
+        # Another instance does not change the settings of the first one
+        random.seed(1)
+        np.random.seed(4)
+        ga = get_ga(0.5, 3)
+        state = (random.getstate(), np.random.get_state())
+        other = get_ga(0.01, 5)
+        random.setstate(state[0])
+        np.random.set_state(state[1])
+        self.assertEqual(ga.config.mut_rate, 0.5)
+        self.assertEqual(ga.config.tournament_size, 3)
+        self.assertEqual(other.config.mut_rate, 0.01)
+        self.assertEqual(other.config.tournament_size, 5)
+        self.assertEqual(ga.config.elitism, EvolutionConfig().elitism)
+
+        ga.estimate()
+        self.assertEqual(ga.get_errors(), ref.get_errors())
+        pd.testing.assert_frame_equal(ga.get_estimates(),
+                                      ref.get_estimates())
+
+        # Settings passed to the constructor (as by the islands)
+        config = EvolutionConfig(mut_rate=0.2, tournament_size=2)
+        ga = GA(self.fmu_path, self.inp, self.known,
+                self.est, self.ideal, maxiter=self.gen,
+                pop_size=self.pop, mut=0.5, engine='array', config=config)
+        self.assertIs(ga.config, config)
+
     def test_init_pop(self):
         random.seed(1)
         init_pop = pd.DataFrame({'R1': [0.1, 0.2, 0.3],
@@ -149,6 +358,14 @@ def suite():
     suite = unittest.TestSuite()
     suite.addTest(TestGA('test_ga'))
     suite.addTest(TestGA('test_init_pop'))
+    suite.addTest(TestGA('test_cache'))
+    suite.addTest(TestGA('test_workers'))
+    suite.addTest(TestGA('test_array_engine'))
+    suite.addTest(TestGA('test_early_abort'))
+    suite.addTest(TestGA('test_fidelity'))
+    suite.addTest(TestGA('test_steady_state'))
+    suite.addTest(TestGA('test_islands'))
+    suite.addTest(TestGA('test_config'))
 
     return suite
 
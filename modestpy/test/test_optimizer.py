@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import json
+import os
+import numpy as np
+import pandas as pd
+from modestpy.estim.cache import EvalCache
+from modestpy.estim.error import calc_err
+from modestpy.estim.evaluator import Evaluator
+from modestpy.estim.optimizer import Optimizer, OptimizerMethod
+from modestpy.estim.ps.ps import PatternSearch
+from modestpy.estim.space import ParameterSpace
+from modestpy.utilities.sysarch import get_sys_arch
+
+
+class RandomSearch(Optimizer):
+    """Asks for random batches (test strategy)."""
+
+    NAME = 'RS'
+
+    def __init__(self, space, batch=4, maxiter=2):
+        super(RandomSearch, self).__init__(space)
+        self.batch = batch
+        self.maxiter = maxiter
+        self.iteration = 0
+
+    def ask(self):
+        return self.space.decode(
+            np.random.random_sample((self.batch, len(self.names))))
+
+    def tell(self, X, errors):
+        self.iteration += 1
+        self._update_best(X, errors)
+        self.trajectory.append(self.iteration, self.best_x, self.best_err,
+                               method=self.NAME)
+
+    def done(self):
+        return self.iteration >= self.maxiter
+
+
+class TestOptimizer(unittest.TestCase):
+
+    def setUp(self):
+        # Platform (win32, win64, linux32, linix64)
+        platform = get_sys_arch()
+        assert platform, 'Unsupported platform type!'
+
+        # Resources
+        res = os.path.join(os.path.dirname(__file__), 'resources',
+                           'simple2R1C')
+        self.fmu_path = os.path.join(res,
+                                     'Simple2R1C_{}.fmu'.format(platform))
+        self.inp = pd.read_csv(os.path.join(res, 'inputs.csv')) \
+            .set_index('time')
+        self.ideal = pd.read_csv(os.path.join(res, 'result.csv')) \
+            .set_index('time')
+        with open(os.path.join(res, 'est.json')) as f:
+            self.est = json.load(f)
+        with open(os.path.join(res, 'known.json')) as f:
+            self.known = json.load(f)
+
+        self.space = ParameterSpace.from_est(self.est)
+        self.names = list(self.space.names)
+
+    def test_space(self):
+        space = ParameterSpace(['a', 'b', 'c'], [0., 1., -1.],
+                               [2., 1000., 1.], init=[1., 10., 0.],
+                               transforms=['linear', 'log', 'linear'])
+        genes = np.array([[0., 0., 0.], [0.5, 0.5, 0.5], [1., 1., 1.]])
+        values = space.decode(genes)
+        np.testing.assert_allclose(values, [[0., 1., -1.],
+                                            [1., np.sqrt(1000.), 0.],
+                                            [2., 1000., 1.]])
+        np.testing.assert_allclose(space.encode(values), genes, atol=1e-12)
+        np.testing.assert_allclose(space.encode(space.init), [0.5, 1. / 3.,
+                                                              0.5])
+        self.assertAlmostEqual(space.decode(np.array([2. / 3.]), 1)[0], 100.)
+        np.testing.assert_array_equal(space.clip([3., 0.5, 0.]),
+                                      [2., 1., 0.])
+        self.assertEqual(list(space.to_df(values).columns), ['a', 'b', 'c'])
+
+        # From est (order kept or sorted)
+        space = ParameterSpace.from_est(self.est)
+        self.assertEqual(list(space.names), list(self.est.keys()))
+        np.testing.assert_array_equal(space.init,
+                                      [self.est[p][0] for p in self.est])
+        space = ParameterSpace.from_est(self.est, sort=True)
+        self.assertEqual(list(space.names), sorted(self.est.keys()))
+
+        with self.assertRaises(ValueError):
+            ParameterSpace(['a'], [1.], [2.], transforms=['exp'])
+
+        # Fixed parameter (lo == hi)
+        space = ParameterSpace(['a', 'b'], [0., 5.], [2., 5.],
+                               transforms=['linear', 'log'])
+        np.testing.assert_array_equal(space.encode([[1., 5.], [2., 5.]]),
+                                      [[0.5, 0.], [1., 0.]])
+        np.testing.assert_array_equal(space.decode([[0.5, 0.3], [1., 1.]]),
+                                      [[1., 5.], [2., 5.]])
+        self.assertEqual(space.decode(np.array([0.7]), 1)[0], 5.)
+
+    def test_log_scale(self):
+        est = {p: tuple(v) + ('log', ) for p, v in self.est.items()}
+        space = ParameterSpace.from_est(est)
+        self.assertTrue(space.log.all())
+        np.testing.assert_allclose(space.decode(space.encode(space.init)),
+                                   space.init)
+
+        # PS steps log-scaled parameters by the same factor up and down
+        ps = PatternSearch(space, rel_step=0.1)
+        x0 = ps.ask()
+        ps.tell(x0, np.array([1.]))
+        probes = ps.ask()
+        for j in range(len(space)):
+            up, down = probes[2 * j, j], probes[2 * j + 1, j]
+            self.assertAlmostEqual(up / x0[0, j], x0[0, j] / down)
+            self.assertGreater(up, x0[0, j])
+            others = np.delete(probes[2 * j:2 * j + 2], j, axis=1)
+            np.testing.assert_array_equal(others[0], np.delete(x0[0], j))
+
+        # Random genes are uniform in log(value)
+        np.random.seed(1)
+        values = np.log(space.decode(np.random.random_sample((200,
+                                                             len(space)))))
+        mid = (np.log(space.lo) + np.log(space.hi)) / 2.
+        share = (values < mid).mean(axis=0)
+        self.assertTrue(np.all(np.abs(share - 0.5) < 0.15))
+
+    def test_evaluator(self):
+        cache = EvalCache()
+        evaluator = Evaluator(self.fmu_path, self.inp, self.known,
+                              self.ideal, self.space, cache=cache,
+                              max_evals=5)
+        x = self.space.decode(np.array([[0.2], [0.7]]))
+        X = np.vstack([x, x[:1]])  # Duplicate is simulated once
+        errors = evaluator.evaluate(X)
+        self.assertEqual(evaluator.model.sim_count, 2)
+        self.assertEqual(errors[0], errors[2])
+        self.assertEqual(evaluator.best_err, errors.min())
+        self.assertFalse(evaluator.exhausted())
+
+        # Errors match the single simulation
+        result = evaluator.get_result(x[1])
+        self.assertAlmostEqual(errors[1],
+                               calc_err(result, self.ideal)['tot'])
+
+        # Cached points are not simulated again
+        count = evaluator.model.sim_count
+        np.testing.assert_array_equal(evaluator.evaluate(x), errors[:2])
+        self.assertEqual(evaluator.model.sim_count, count)
+        self.assertTrue(evaluator.exhausted())
+        self.assertEqual(len(evaluator.get_history().index), 5)
+
+    def test_evaluate_batch(self):
+        evaluator = Evaluator(self.fmu_path, self.inp, self.known,
+                              self.ideal, self.space)
+        X = self.space.decode(np.array([[0.1], [0.4], [0.1], [0.9]]))
+        results, error_dicts, aborted, eliminated = \
+            evaluator.evaluate_batch(X, rungs=[(0.5, 0.5)])
+        self.assertFalse(aborted.any())
+
+        # One of three unique points is eliminated at the rung
+        self.assertEqual(len(eliminated), 1)
+        rows, fraction, prefix = eliminated[0]
+        self.assertEqual(fraction, 0.5)
+        # Duplicates are evaluated together
+        self.assertIn(set(rows) & {0, 2}, (set(), {0, 2}))
+        np.testing.assert_array_equal(prefix,
+                                      evaluator.evaluate_prefix(X[rows], 0.5))
+        for i in range(X.shape[0]):
+            if i in rows:
+                self.assertIsNone(error_dicts[i])
+                self.assertIsNone(results[i])
+            else:
+                self.assertFalse(results[i].empty)
+
+        # Promoted points are cached, the history is not changed
+        promoted = [i for i in range(X.shape[0]) if i not in rows]
+        count = evaluator.model.sim_count
+        errors = evaluator.evaluate(X[promoted])
+        self.assertEqual(evaluator.model.sim_count, count)
+        self.assertEqual(errors.tolist(),
+                         [error_dicts[i]['tot'] for i in promoted])
+        self.assertEqual(len(evaluator.get_history().index), len(promoted))
+
+    def test_strategy(self):
+        np.random.seed(1)
+        for optimizer, opts in ((RandomSearch, {'batch': 3}),
+                                (PatternSearch, {'maxiter': 3})):
+            method = OptimizerMethod(self.fmu_path, self.inp, self.known,
+                                     self.est, self.ideal, optimizer,
+                                     **opts)
+            estimates = method.estimate()
+            self.assertEqual(list(estimates.columns), self.names)
+            errors = method.get_errors()
+            for i in range(1, len(errors)):
+                self.assertGreaterEqual(errors[i - 1], errors[i])
+            self.assertAlmostEqual(method.get_error(),
+                                   method.evaluator.best_err)
+            self.assertTrue((method.summary['_method_'] ==
+                             optimizer.NAME).all())
+
+        # Evaluation budget
+        method = OptimizerMethod(self.fmu_path, self.inp, self.known,
+                                 self.est, self.ideal, RandomSearch,
+                                 max_evals=5, batch=3, maxiter=10)
+        method.estimate()
+        self.assertEqual(method.evaluator.n_evals, 6)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(TestOptimizer('test_space'))
+    suite.addTest(TestOptimizer('test_log_scale'))
+    suite.addTest(TestOptimizer('test_evaluator'))
+    suite.addTest(TestOptimizer('test_evaluate_batch'))
+    suite.addTest(TestOptimizer('test_strategy'))
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main()
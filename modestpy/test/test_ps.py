@@ -95,10 +95,54 @@ class TestPS(unittest.TestCase):
             next_err = errors[i]
             self.assertGreaterEqual(prev_err, next_err)
 
+    def test_workers(self):
+        results = list()
+        for workers in (1, 3):
+            ps = PS(self.fmu_path, self.inp, self.known,
+                    self.est, self.ideal, maxiter=self.max_iter,
+                    try_lim=self.try_lim, workers=workers)
+            estimates = ps.estimate()
+            results.append((estimates, ps.get_full_solution_trajectory(),
+                            ps.get_sim_res()))
+
+        # Parallel polling gives the same path as the serial search
+        pd.testing.assert_frame_equal(results[0][0], results[1][0])
+        pd.testing.assert_frame_equal(results[0][1], results[1][1])
+        pd.testing.assert_frame_equal(results[0][2], results[1][2])
+
+    def test_early_abort(self):
+        results = list()
+        for early_abort in (False, True):
+            ps = PS(self.fmu_path, self.inp, self.known,
+                    self.est, self.ideal, maxiter=self.max_iter,
+                    try_lim=self.try_lim, rel_step=0.3,
+                    early_abort=early_abort)
+
+            # Record monitors created during the search
+            monitors = list()
+            get_monitor = ps.err_ctx.get_monitor
+
+            def record(threshold):
+                monitors.append(get_monitor(threshold))
+                return monitors[-1]
+            ps.err_ctx.get_monitor = record
+
+            estimates = ps.estimate()
+            results.append((estimates, ps.get_full_solution_trajectory(),
+                            monitors))
+
+        # Aborted probes cannot be chosen, so the path is the same
+        pd.testing.assert_frame_equal(results[0][0], results[1][0])
+        pd.testing.assert_frame_equal(results[0][1], results[1][1])
+        self.assertEqual(len(results[0][2]), 0)
+        self.assertTrue(any(m.aborted for m in results[1][2]))
+
 
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(TestPS('test_ps'))
+    suite.addTest(TestPS('test_workers'))
+    suite.addTest(TestPS('test_early_abort'))
 
     return suite
 
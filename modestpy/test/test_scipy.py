@@ -18,6 +18,7 @@ import json
 import os
 import pandas as pd
 from modestpy.estim.scipy.scipy import SCIPY
+from modestpy.estim.cache import EvalCache
 from modestpy.utilities.sysarch import get_sys_arch
 
 
@@ -92,10 +93,26 @@ class TestSCIPY(unittest.TestCase):
         errors = self.scipy.get_errors()
         self.assertGreaterEqual(errors[0], errors[-1])
 
+    def test_no_resimulation(self):
+        # Without the cache, each evaluation is one simulation
+        scipy = SCIPY(self.fmu_path, self.inp, self.known,
+                      self.est, self.ideal, solver='L-BFGS-B',
+                      options={'maxiter': 3}, cache=EvalCache(max_size=0))
+        scipy.estimate()
+        self.assertEqual(scipy.model.sim_count, scipy.get_nfev())
+        self.assertEqual(len(scipy.get_evaluations().index),
+                         scipy.get_nfev())
+
+        # Summary errors are taken from the recorded evaluations
+        evaluations = scipy.get_evaluations()
+        for err in scipy.get_errors():
+            self.assertIn(err, evaluations['_error_'].values)
+
 
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(TestSCIPY('test_scipy'))
+    suite.addTest(TestSCIPY('test_no_resimulation'))
 
     return suite
 
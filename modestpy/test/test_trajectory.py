@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2017, University of Southern Denmark
+All rights reserved.
+This code is licensed under BSD 2-clause license.
+See LICENSE file in the project root for license terms.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import tempfile
+import shutil
+import os
+import numpy as np
+from modestpy.estim.trajectory import Trajectory
+
+
+class TestTrajectory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _fill(self, traj):
+        for it in range(1, 11):
+            values = np.arange(12.).reshape(4, 3) + it
+            errors = np.array([3., 1., 2., 1.]) / it
+            traj.append(it, values, errors, method='GA')
+
+    def test_best(self):
+        traj = Trajectory(['a', 'b', 'c'], capacity=2)
+        self._fill(traj)
+        self.assertEqual(len(traj), 40)
+
+        # First row with the lowest error
+        values, err = traj.get_best(5)
+        self.assertTrue(np.array_equal(values, np.array([8., 9., 10.])))
+        self.assertEqual(err, 1. / 5)
+
+        best = traj.get_best_df()
+        self.assertEqual(list(best.columns), ['a', 'b', 'c', '_error_',
+                                              '_method_'])
+        self.assertEqual(best.index.name, '_iter_')
+        self.assertEqual(list(best.index), list(range(1, 11)))
+
+    def test_fidelity(self):
+        traj = Trajectory(['a'])
+        traj.append(1, [[1.], [2.], [3.]], [0.5, 2., 1.],
+                    fidelity=[0.25, 1., 1.])
+        self.assertFalse('_fidelity_' in Trajectory(['a']).to_df().columns)
+
+        # Low-fidelity errors are recorded, but not used as the best
+        df = traj.to_df()
+        self.assertEqual(list(df['_fidelity_']), [0.25, 1., 1.])
+        self.assertEqual(list(df['_error_']), [0.5, 2., 1.])
+        values, err = traj.get_best(1)
+        self.assertEqual(values[0], 3.)
+        self.assertEqual(err, 1.)
+
+    def test_spill(self):
+        traj = Trajectory(['a', 'b', 'c'], spill_dir=self.tmpdir,
+                          spill_rows=6)
+        self._fill(traj)
+        self.assertGreater(len(os.listdir(self.tmpdir)), 0)
+        self.assertLess(traj.size, 6)
+
+        # Same content as without spilling
+        ref = Trajectory(['a', 'b', 'c'])
+        self._fill(ref)
+        df, df_ref = traj.to_df(), ref.to_df()
+        cols = ['a', 'b', 'c', '_error_', 'individual', '_iter_', '_method_']
+        self.assertTrue(df[cols].equals(df_ref[cols]))
+        self.assertTrue(traj.get_best_df().equals(ref.get_best_df()))
+
+        traj.clear()
+        self.assertEqual(len(os.listdir(self.tmpdir)), 0)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(TestTrajectory('test_best'))
+    suite.addTest(TestTrajectory('test_fidelity'))
+    suite.addTest(TestTrajectory('test_spill'))
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main()